@@ -1,4 +1,6 @@
 # app/config.py
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -9,6 +11,102 @@ class Settings(BaseSettings):
     JWT_ALG: str = "HS256"
     TOKEN_EXPIRE_MINUTES: int = 60   # <— matches .env key
 
+    # response compression (gzip / brotli)
+    COMPRESSION_MIN_SIZE: int = 1024          # bytes；小于这个不压
+    COMPRESSION_OFFLOAD_SIZE: int = 64 * 1024 # bytes；大于这个丢到 thread 压
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_BROTLI_ENABLED: bool = True
+
+    # admission control for LLM-backed routes (per worker process)
+    AI_CHAT_MAX_CONCURRENT: int = 8
+    AI_SUMMARY_MAX_CONCURRENT: int = 4
+    AI_CAPTION_MAX_CONCURRENT: int = 2
+    AI_MAX_QUEUE: int = 32                 # 排队的请求上限，满了直接 503
+    AI_QUEUE_TIMEOUT_SECONDS: float = 5.0  # 排队最多等多久
+    AI_USER_RATE_PER_MINUTE: float = 20    # 每个 user 每分钟（每个 route）
+    AI_USER_BURST: int = 5
+
+    # image caption upload
+    IMAGE_MAX_UPLOAD_BYTES: int = 8 * 1024 * 1024
+    IMAGE_READ_CHUNK_BYTES: int = 64 * 1024
+    IMAGE_MODEL_MAX_SIDE: int = 384        # BLIP 的输入大小
+    IMAGE_CAPTION_CACHE_SIZE: int = 512    # 按 sha256 缓存 caption
+
+    # user 没设时区时的默认值（和 Task.timezone 默认一样）
+    DEFAULT_TIMEZONE: str = "Asia/Kuala_Lumpur"
+
+    # events / mood_logs 存储 layout（见 app/logic/event_store.py）
+    EVENTS_STORAGE: Literal["standard", "timeseries"] = "standard"
+    EVENTS_TS_GRANULARITY: Literal["seconds", "minutes", "hours"] = "minutes"
+
+    # retention（天；0 = 永久保留）+ cold archive（见 app/logic/retention.py）
+    RETENTION_EVENTS_DAYS: int = 90
+    RETENTION_MOODS_DAYS: int = 365
+    RETENTION_SCORES_DAYS: int = 180
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_AFTER_DAYS: int = 7            # 过去多少天的数据才压成 bucket（要比 retention 小）
+    ARCHIVE_INTERVAL_MINUTES: int = 60
+    ARCHIVE_LOOKBACK_DAYS: int = 3         # 每一轮把 checkpoint 前几天重新 archive（离线晚 sync 上来的 event）
+
+    # nightly rollup scheduler（见 app/logic/scheduler.py）
+    SCHEDULER_ENABLED: bool = True
+    SCHEDULER_INTERVAL_MINUTES: int = 10   # 多久看一次「谁刚过了本地午夜」
+    SCHEDULER_CONCURRENCY: int = 8         # 同时 rollup 几个 user
+    SCHEDULER_ACTIVE_DAYS: int = 2         # 最近几天有 event 的才算 active
+    SCHEDULER_CATCHUP_DAYS: int = 7        # 停机之后最多往回补几天
+    LEASE_TTL_SECONDS: int = 600           # 多 worker 抢 lease；持有者挂了这么久之后别人接手
+
+    # reminder engine（见 app/logic/reminders.py）
+    REMINDERS_ENABLED: bool = True
+    REMINDER_LOAD_HORIZON_MINUTES: int = 60      # 每个 worker 只把这么久以内要响的放进内存
+    REMINDER_CLAIM_TIMEOUT_SECONDS: int = 300    # claim 了没发完（worker 挂了）多久之后别人重发
+
+    # WebSocket push（见 app/logic/push.py）："mongo" = 经过 change stream 跨 worker fan-out
+    PUSH_BACKEND: Literal["local", "mongo"] = "local"
+    PUSH_QUEUE_SIZE: int = 64                  # 每个 socket 最多攒几条没发出去的；满了 = client 太慢，断开
+    PUSH_SEND_TIMEOUT_SECONDS: float = 5.0     # 一条发不出去多久算卡住，断开
+
+    # /export（见 app/routers/export.py）
+    EXPORT_BATCH_SIZE: int = 500               # Motor cursor 每次拿多少条
+    EXPORT_CHECKPOINT_EVERY: int = 1000        # 每多少条写一行 checkpoint（可以从这里续传）
+    EXPORT_MAX_BYTES_PER_SEC: int = 2 * 1024 * 1024   # 每个 export 的限速；0 = 不限
+    EXPORT_MAX_CONCURRENT: int = 2             # 每个 worker 同时几个 export
+
+    # Idempotency-Key（见 app/utils/idempotency.py）：同一个 key 多久之内重试会直接回上次的 response
+    IDEMPOTENCY_TTL_HOURS: int = 48
+
+    # pet chat 记忆（见 app/logic/chat_memory.py）；turns 一问一答算两条，下面都用偶数
+    CHAT_PROMPT_TOKEN_BUDGET: int = 700    # persona + summary + history + 这句话，总共（估算 token）
+    CHAT_MEMORY_MAX_TURNS: int = 24        # 存着的原文最多几条（$slice）
+    CHAT_MEMORY_COMPACT_AT: int = 16       # 攒到这么多条就把旧的压进 summary
+    CHAT_MEMORY_KEEP_TURNS: int = 6        # 压缩之后留几条原文
+    CHAT_SUMMARY_MAX_TOKENS: int = 160
+
+    # pet chat fast path（见 app/services/quick_replies.py）
+    CHAT_FASTPATH_MAX_WORDS: int = 8             # 超过这么多词的消息不走模板 / cache
+    CHAT_REPLY_CACHE_SIZE: int = 2048
+    CHAT_REPLY_CACHE_TTL_SECONDS: int = 6 * 3600
+
+    # LLM provider routing（见 app/services/llm_router.py）
+    LLM_CHAT_DEADLINE_SECONDS: float = 8.0       # 一次 pet chat 最多等多久（之后回本地回复）
+    LLM_SUMMARY_DEADLINE_SECONDS: float = 10.0   # /ai/summary 的 LLM 部分（之后用 heuristic）
+    LLM_HEDGE_AFTER_SECONDS: float = 2.5         # 前一个 provider 这么久没回，就同时开下一个
+    LLM_BREAKER_FAILURES: int = 5                # 连续失败 / 太慢几次就 open
+    LLM_BREAKER_RESET_SECONDS: float = 30.0      # open 多久之后放一个 probe 试试
+
+    # GET /tasks/agenda（见 app/logic/agenda.py）：一次最多几天（月视图 6 周 = 42 天）
+    AGENDA_MAX_DAYS: int = 62
+
+    # coins 排行榜（见 app/logic/leaderboard.py）
+    LEADERBOARD_RANK_INDEX: bool = True           # 每个 worker 在内存里维护 rank index（关掉 = my rank 走 count）
+    LEADERBOARD_MAX_COINS: int = 1_000_000        # rank index 覆盖的 coins 范围；更多的 user 走 indexed count
+    LEADERBOARD_REBUILD_SECONDS: int = 3600       # 定期从 users 重建一次（修正漏掉的更新）
+    LEADERBOARD_CLOCK_SKEW_SECONDS: float = 30.0  # app server 跟 Mongo 的时钟最多差多少（重建时判断 scan 读没读到某次更新）
+    LEADERBOARD_TOP_K: int = 100                  # 缓存的全局 top-K
+    LEADERBOARD_TOP_TTL_SECONDS: float = 30.0
+    LEADERBOARD_GROUP_MAX_MEMBERS: int = 50
+
     # pydantic v2 config
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -8,6 +8,10 @@ import certifi
 
 from app.models.user import User
 from app.models.models import Task
+from app.logic.event_store import ensure_collections, ensure_local_time
+from app.logic.retention import ensure_retention
+from app.logic import leaderboard, pet_state, task_query
+from app.utils import idempotency
 
 load_dotenv()
 
@@ -16,7 +20,7 @@ MONGO_DB  = os.getenv("MONGO_DB", "dodotask")
 
 _client: AsyncIOMotorClient | None = None
 
-async def init_db():
+async def init_db(migrate: bool = True):
     global _client
 
     # 👇 如果是 Atlas（mongodb+srv://），启用 TLS + certifi；否则（本地）不加 TLS
@@ -49,6 +53,23 @@ async def init_db():
         database=db, 
         document_models=[User, Task]
     )
+
+    # 4. events / mood_logs（standard 或 time-series layout）+ index + TTL
+    await ensure_collections(db)
+    if migrate:
+        await ensure_local_time(db)  # 旧数据先补 local_day，rollup / archive 才不会把那些天算成 0
+    await ensure_retention(db)
+    await pet_state.ensure_indexes(db)
+
+    # 5. Idempotency-Key store + flutter_id 唯一（重试的 create_task 撞 DuplicateKeyError 而不是多插一条）
+    await idempotency.ensure_indexes(db)
+    await idempotency.ensure_unique(Task.get_motor_collection(), [("flutter_id", 1)])
+
+    # 6. GET /tasks/query 的 compound + text index
+    await task_query.ensure_indexes(db)
+
+    # 7. 排行榜：users (coins desc, _id) + friend_groups.member_ids
+    await leaderboard.ensure_indexes(db)
     return db
 
 def get_db():
@@ -5,11 +5,15 @@ from jose import jwt, JWTError
 from bson import ObjectId
 
 from app.config import settings
-from app.models.user import User
+from app.models.user import User, UserRef
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserRef:
+    return await user_from_token(token)
+
+async def user_from_token(token: str) -> UserRef:
+    """HTTP（Bearer header）和 WebSocket（?token=）共用"""
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
         uid = payload.get("sub")  # ✅ sub = user_id
@@ -31,8 +35,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid user id in token")
 
-    # ✅ Beanie: query by id
-    user = await User.find_one(User.id == oid)
+    # ✅ Beanie: query by id，只 project _id / email / coins（每个 request 都会跑）
+    user = await User.find_one(User.id == oid, projection_model=UserRef)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
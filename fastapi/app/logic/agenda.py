@@ -0,0 +1,127 @@
+# app/logic/agenda.py
+"""
+GET /tasks/agenda：日历 / today 页要的「每个本地日期有哪些 task + 各 bucket 几个」，server 算好一次回。
+
+以前 app 拉整个 task list，在手机上按 dueDateTime / startDate~dueDate 切天、分 bucket。现在：
+
+    {"from": "2025-01-01", "to": "2025-01-31",
+     "counts": {"notStarted": 3, "inProgress": 1, "completed": 5, "late": 2},     # 窗口里的 task（不重复算）
+     "days": [{"date": "2025-01-05", "counts": {...}, "task_ids": ["...", ...]}, ...],   # 只有有 task 的日子
+     "tasks": {"<flutter_id>": {title, status, bucket, type, dueDateTime, ...}}}           # 每个 task 只出现一次
+
+- Mongo：index range（(user_email, dueDateTime) / (user_email, dueDate)，见 task_query.py）+ $project 小字段
+  + $switch 算 bucket（completed / late / 过了 due 还没做完 = late / inProgress / notStarted）
+- 本地日期按每个 task 自己的 Task.timezone：UTC 窗口前后放宽 14h / 12h，精确的切天在 Python 里做
+  （时区名不合法的 task 退回 DEFAULT_TIMEZONE，不会让整个 aggregation 挂掉）
+- ranged task 在 startDate..dueDate 的每一天都出现（截到窗口里）
+- archived 不算
+"""
+from __future__ import annotations
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.logic.user_tz import zone
+
+BUCKETS = ("notStarted", "inProgress", "completed", "late")
+
+# 最东 UTC+14、最西 UTC-12：本地的一天可能落在 UTC 的这个范围里
+_TZ_AHEAD = timedelta(hours=14)
+_TZ_BEHIND = timedelta(hours=12)
+
+_FIELDS = ("flutter_id", "title", "type", "status", "priority", "important", "category",
+           "dueDateTime", "startDate", "dueDate", "timezone")
+
+
+def agenda_match(user_email: str, first: date, last: date) -> Dict[str, Any]:
+    """[first, last] 本地日期（含两端）可能碰到的 task；三支 $or 都是 user_email 开头的 index range"""
+    start = datetime.combine(first, time.min) - _TZ_AHEAD
+    end = datetime.combine(last + timedelta(days=1), time.min) + _TZ_BEHIND
+    return {
+        "user_email": user_email,
+        "status": {"$ne": "archived"},
+        "$or": [
+            {"dueDateTime": {"$gte": start, "$lt": end}},
+            {"dueDate": {"$gte": start}, "startDate": {"$lt": end}},         # ranged：跟窗口有重叠
+            {"dueDate": {"$gte": start, "$lt": end}, "startDate": None},
+        ],
+    }
+
+
+def agenda_pipeline(user_email: str, first: date, last: date, now: datetime) -> List[Dict[str, Any]]:
+    ranged = {"$eq": ["$type", "ranged"]}
+    # $match 过了之后 dueDateTime / dueDate 至少有一个，due 不会是 null
+    due = {"$cond": [ranged, {"$ifNull": ["$dueDate", "$dueDateTime"]}, {"$ifNull": ["$dueDateTime", "$dueDate"]}]}
+    return [
+        {"$match": agenda_match(user_email, first, last)},
+        {"$project": {
+            "_id": 0,
+            **{f: 1 for f in _FIELDS},
+            "bucket": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$status", "completed"]}, "then": "completed"},
+                    {"case": {"$eq": ["$status", "late"]}, "then": "late"},
+                    {"case": {"$lt": [due, now]}, "then": "late"},
+                    {"case": {"$eq": ["$status", "inProgress"]}, "then": "inProgress"},
+                ],
+                "default": "notStarted",
+            }},
+        }},
+        # 同一天里：ranged（没有 dueDateTime）在前，其余按时间
+        {"$sort": {"dueDateTime": 1, "dueDate": 1, "title": 1}},
+    ]
+
+
+def _local_date(ts: datetime, tz) -> date:
+    # Motor 回来的是 naive UTC
+    return ts.replace(tzinfo=timezone.utc).astimezone(tz).date()
+
+
+def _span(row: Dict[str, Any]):
+    if row.get("type") == "ranged":
+        lo, hi = row.get("startDate") or row.get("dueDate"), row.get("dueDate") or row.get("startDate")
+    else:
+        lo = hi = row.get("dueDateTime") or row.get("dueDate")
+    if lo is None:
+        return None
+    tz = zone(row.get("timezone"))
+    a, b = _local_date(lo, tz), _local_date(hi, tz)
+    return (a, b) if a <= b else (b, a)
+
+
+def group_days(rows: List[Dict[str, Any]], first: date, last: date) -> Dict[str, Any]:
+    """aggregation 的 rows -> agenda response（纯 CPU，方便 benchmarks/ 计时）"""
+    days: Dict[date, Dict[str, Any]] = {}
+    tasks: Dict[str, Dict[str, Any]] = {}
+    totals = dict.fromkeys(BUCKETS, 0)
+    for row in rows:
+        span = _span(row)
+        if span is None:
+            continue
+        a, b = max(span[0], first), min(span[1], last)
+        if a > b:
+            continue     # 放宽的 UTC 窗口捞进来的，本地日期其实不在范围里
+        bucket = row["bucket"]
+        tid = row["flutter_id"]
+        tasks[tid] = row
+        totals[bucket] += 1
+        d = a
+        while d <= b:
+            day = days.get(d)
+            if day is None:
+                day = days[d] = {"date": d.isoformat(), "counts": dict.fromkeys(BUCKETS, 0), "task_ids": []}
+            day["counts"][bucket] += 1
+            day["task_ids"].append(tid)
+            d += timedelta(days=1)
+    return {
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "counts": totals,
+        "days": [days[d] for d in sorted(days)],
+        "tasks": tasks,
+    }
+
+
+async def agenda(col, user_email: str, first: date, last: date, now: Optional[datetime] = None) -> Dict[str, Any]:
+    now = now or datetime.utcnow()
+    rows = await col.aggregate(agenda_pipeline(user_email, first, last, now)).to_list(length=None)
+    return group_days(rows, first, last)
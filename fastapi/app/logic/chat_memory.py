@@ -0,0 +1,200 @@
+# app/logic/chat_memory.py
+"""
+Pet chat 的对话记忆：每个 user 一个 `chat_memory` document
+
+    {_id: user_id, summary: "...", turns: [{role: "user"|"pet", text, ts}], updated_at}
+
+- turns 是滚动窗口：$push + $slice 保证最多 CHAT_MEMORY_MAX_TURNS 条，document 不会一直长
+- 攒到 CHAT_MEMORY_COMPACT_AT 条之后，后台把旧的那些压进 summary（LLM 总结；没有 key 就本地摘录），
+  只留最近 CHAT_MEMORY_KEEP_TURNS 条原文
+- 拼 prompt 的时候按 token 预算（CHAT_PROMPT_TOKEN_BUDGET）从新到旧塞 turns，塞不下就停；
+  token 用本地估算（estimate_tokens），不调 tokenizer
+- 所以不管聊了多久，prompt 大小（= provider latency）都是平的
+
+    mem = await load(db, user_id)
+    prompt = build_prompt(persona, mem, text)
+    ...
+    await remember(db, user_id, text, reply, mem)
+"""
+from __future__ import annotations
+import asyncio
+import re
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from app.config import settings
+from app.utils import metrics
+
+# 一个 match = 一个 token：CJK 一字一个；英文词每 4 个字母一个；标点一个
+_TOKEN_RE = re.compile(r"[぀-ヿ㐀-鿿가-힯]|[A-Za-z0-9_']{1,4}|[^\sA-Za-z0-9_']")
+
+_stats: Dict[str, Any] = {"prompts": 0, "prompt_tokens_last": 0, "prompt_tokens_max": 0,
+                          "turns_dropped_for_budget": 0, "compactions": 0, "compaction_errors": 0}
+_compacting: Set[str] = set()
+# event loop 对 task 只有 weak ref：不留引用的话跑到一半可能被 GC 掉
+_compact_tasks: Set[asyncio.Task] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗估 BPE token 数（不准，但够用来做预算，而且快）"""
+    return len(_TOKEN_RE.findall(text)) if text else 0
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """从开头保留到 max_tokens 为止（按估算）"""
+    if max_tokens <= 0:
+        return ""
+    end = None
+    for i, m in enumerate(_TOKEN_RE.finditer(text)):
+        if i == max_tokens:
+            return text[:end].rstrip() + " …"
+        end = m.end()
+    return text
+
+
+def _col(db):
+    return db.chat_memory
+
+
+async def load(db, user_id: str) -> Dict[str, Any]:
+    doc = await _col(db).find_one({"_id": user_id}, {"summary": 1, "turns": 1})
+    return doc or {"summary": "", "turns": []}
+
+
+def _line(turn: Dict[str, Any]) -> str:
+    return f"{'User' if turn['role'] == 'user' else 'Pet'}: {turn['text']}"
+
+
+def build_prompt(persona: str, mem: Dict[str, Any], text: str, budget: Optional[int] = None) -> str:
+    """persona + summary + 放得下的最近 turns + 这次的话，总共不超过 budget（估算）"""
+    budget = budget or settings.CHAT_PROMPT_TOKEN_BUDGET
+    current = f"User: {truncate_tokens(text, budget // 4)}\nPet:"
+    used = estimate_tokens(persona) + estimate_tokens(current)
+
+    summary = ""
+    if mem.get("summary"):
+        summary = "Earlier conversation (summary): " + truncate_tokens(mem["summary"], settings.CHAT_SUMMARY_MAX_TOKENS)
+        cost = estimate_tokens(summary)
+        if used + cost <= budget:
+            used += cost
+        else:
+            summary = ""
+
+    turns: List[str] = mem.get("turns") or []
+    picked: List[str] = []
+    for i, turn in enumerate(reversed(turns)):
+        line = _line(turn)
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            _stats["turns_dropped_for_budget"] += len(turns) - i
+            break
+        used += cost
+        picked.append(line)
+    picked.reverse()
+
+    _stats["prompts"] += 1
+    _stats["prompt_tokens_last"] = used
+    _stats["prompt_tokens_max"] = max(_stats["prompt_tokens_max"], used)
+    return "\n".join(p for p in (persona, summary, *picked, current) if p)
+
+
+def history_context(mem: Dict[str, Any], max_turns: int = 6) -> Dict[str, Any]:
+    """给 Inworld 的 context（它自己也有记忆，这里只带 summary + 最近几句）"""
+    return {
+        "summary": mem.get("summary") or "",
+        "recent": [_line(t) for t in (mem.get("turns") or [])[-max_turns:]],
+    }
+
+
+async def remember(
+    db,
+    user_id: str,
+    text: str,
+    reply: str,
+    mem: Optional[Dict[str, Any]] = None,
+    summarize: Optional[Callable[[str], Awaitable[str]]] = None,
+) -> None:
+    """一问一答 append 进窗口；满了就在后台压缩（不拖慢这次回复）"""
+    now = datetime.utcnow()
+    await _col(db).update_one(
+        {"_id": user_id},
+        {
+            "$push": {"turns": {
+                "$each": [{"role": "user", "text": text, "ts": now}, {"role": "pet", "text": reply, "ts": now}],
+                "$slice": -settings.CHAT_MEMORY_MAX_TURNS,
+            }},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"summary": ""},
+        },
+        upsert=True,
+    )
+    n = len((mem or {}).get("turns") or []) + 2
+    if n >= settings.CHAT_MEMORY_COMPACT_AT and user_id not in _compacting:
+        _compacting.add(user_id)
+        t = asyncio.create_task(_compact_bg(db, user_id, summarize))
+        _compact_tasks.add(t)
+        t.add_done_callback(_compact_tasks.discard)
+
+
+async def _compact_bg(db, user_id: str, summarize) -> None:
+    try:
+        await compact(db, user_id, summarize)
+    except Exception as e:  # 压缩失败下次再来，窗口本身有 $slice 兜底
+        _stats["compaction_errors"] += 1
+        print(f"⚠️  chat memory compaction failed for {user_id}: {e}")
+    finally:
+        _compacting.discard(user_id)
+
+
+_LOCAL_PREFIX = "User said: "
+
+
+def _local_summary(previous: str, turns: List[Dict[str, Any]]) -> str:
+    """没有 LLM 的兜底：用户说过的话（每句截短），超出预算先丢最旧的"""
+    items = previous[len(_LOCAL_PREFIX):].split("; ") if previous.startswith(_LOCAL_PREFIX) else []
+    items += [truncate_tokens(t["text"], 20) for t in turns if t["role"] == "user"]
+    items = [i for i in items if i]
+    while len(items) > 1 and estimate_tokens(_LOCAL_PREFIX + "; ".join(items)) > settings.CHAT_SUMMARY_MAX_TOKENS:
+        items.pop(0)
+    return _LOCAL_PREFIX + "; ".join(items)
+
+
+async def compact(db, user_id: str, summarize: Optional[Callable[[str], Awaitable[str]]] = None) -> bool:
+    """把窗口里除了最近 KEEP_TURNS 条之外的 turns 压进 summary"""
+    doc = await _col(db).find_one({"_id": user_id}, {"summary": 1, "turns": 1})
+    turns = (doc or {}).get("turns") or []
+    keep = settings.CHAT_MEMORY_KEEP_TURNS
+    if len(turns) <= keep:
+        return False
+    old = turns[:-keep]
+    previous = doc.get("summary") or ""
+
+    summary = ""
+    if summarize is not None:
+        prompt = (
+            "Summarize this chat between a user and their virtual pet in under "
+            f"{settings.CHAT_SUMMARY_MAX_TOKENS // 2} words. Keep facts about the user "
+            "(goals, worries, preferences, names), drop small talk.\n"
+            + (f"Previous summary: {previous}\n" if previous else "")
+            + "\n".join(_line(t) for t in old)
+        )
+        try:
+            summary = (await summarize(prompt)).strip()
+        except Exception:
+            summary = ""
+    if not summary:
+        summary = _local_summary(previous, old)
+    summary = truncate_tokens(summary, settings.CHAT_SUMMARY_MAX_TOKENS)
+
+    # 按 ts 删：压缩期间新 push 进来的 turns 不会被删掉
+    cutoff = old[-1]["ts"]
+    await _col(db).update_one(
+        {"_id": user_id},
+        {"$set": {"summary": summary, "summarized_at": datetime.utcnow()},
+         "$pull": {"turns": {"ts": {"$lte": cutoff}}}},
+    )
+    _stats["compactions"] += 1
+    return True
+
+
+metrics.register("chat_memory", lambda: {**_stats, "compacting": len(_compacting)})
@@ -0,0 +1,34 @@
+# app/logic/coins.py
+"""
+所有 coins 变化都走这里：一个原子 $inc（不再 read -> += -> save，两个 device 同时完成 task 不会丢），
+改完顺便 push 给 user 的在线 device，也通知排行榜（每个 worker 的 rank index）。
+"""
+from __future__ import annotations
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+from app.logic import leaderboard, push
+from app.models.user import User
+
+
+async def change_coins(email: str, delta: int, reason: Optional[str] = None, require_balance: bool = False) -> Optional[int]:
+    """
+    coins += delta，返回新的余额。
+    user 不存在 -> None；require_balance=True 且余额不够扣 -> None（什么都不改）
+    """
+    flt = {"email": email}
+    if require_balance and delta < 0:
+        flt["coins"] = {"$gte": -delta}
+    doc = await User.get_motor_collection().find_one_and_update(
+        flt,
+        {"$inc": {"coins": int(delta), "coins_v": 1}, "$currentDate": {"coins_at": True}},
+        projection={"coins": 1, "coins_v": 1, "coins_at": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        return None
+    coins = int(doc.get("coins") or 0)
+    await push.publish([str(doc["_id"]), email], "coins", {"coins": coins, "delta": int(delta), "reason": reason})
+    await leaderboard.coins_changed(str(doc["_id"]), coins - int(delta), coins, int(doc["coins_v"]), doc["coins_at"])
+    return coins
@@ -0,0 +1,228 @@
+# app/logic/event_store.py
+"""
+events / mood_logs 的存储 layout（settings.EVENTS_STORAGE）：
+
+- "standard"   ：普通 collection `events` / `mood_logs`，每条都是松散的 document（原来的样子）
+- "timeseries" ：MongoDB time-series collection `events_ts` / `mood_logs_ts`
+                 timeField = ts，metaField = meta = {user_id, type}（mood 是 {user_id, label}）
+
+每条 event / mood 在 ingest 时都会打上 local_day / local_hour（见 app/logic/user_tz.py）。
+local_day 之前写进去的旧数据：init_db 启动时先补一次（ensure_local_time，做完记在 migrations 里，只跑一次），
+rollup / archive 都只认 local_day，不补的话这些天会被算成 0 覆盖掉。
+
+去重：event_id / mood_id 是 app 生成的，重试会再送一次。
+standard 用 (user_id, event_id) unique index，直接 insert 撞 DuplicateKeyError 就当重复；
+time-series collection 不能建 unique index，先在 idempotency_keys 里 claim 一次 id。
+
+业务代码（risk_mongo 等）照旧写 {"user_id": ..., "type": ..., "ts": ...} 这种查询，
+只要经过 events(db) + q_events(filter)，两种 layout 都能跑：
+    await events(db).count_documents(q_events({"user_id": uid, "type": "hydrate", "ts": {...}}))
+"""
+from __future__ import annotations
+import time
+from datetime import datetime
+from typing import Any, Dict, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.config import settings
+from app.logic.user_tz import get_user_timezone, local_fields
+from app.utils.idempotency import claim, ensure_unique, release
+
+EVENTS = "events"
+MOODS = "mood_logs"
+_TS_NAMES = {EVENTS: "events_ts", MOODS: "mood_logs_ts"}
+_META_KEYS: Dict[str, Tuple[str, ...]] = {EVENTS: ("user_id", "type"), MOODS: ("user_id", "label")}
+_ID_FIELDS = {EVENTS: "event_id", MOODS: "mood_id"}
+
+
+def timeseries_enabled() -> bool:
+    return settings.EVENTS_STORAGE == "timeseries"
+
+
+def timeseries_name(kind: str) -> str:
+    return _TS_NAMES[kind]
+
+
+def collection_name(kind: str) -> str:
+    return _TS_NAMES[kind] if timeseries_enabled() else kind
+
+
+def events(db):
+    return db[collection_name(EVENTS)]
+
+
+def moods(db):
+    return db[collection_name(MOODS)]
+
+
+# ---------- query / document translation ----------
+def _rewrite(kind: str, flt: Any) -> Any:
+    if isinstance(flt, list):
+        return [_rewrite(kind, f) for f in flt]
+    if not isinstance(flt, dict):
+        return flt
+    meta = _META_KEYS[kind]
+    out = {}
+    for k, v in flt.items():
+        if k in ("$and", "$or", "$nor"):
+            out[k] = _rewrite(kind, v)
+        elif k in meta:
+            out[f"meta.{k}"] = v
+        else:
+            out[k] = v
+    return out
+
+
+def query(kind: str, flt: Dict[str, Any]) -> Dict[str, Any]:
+    """{"user_id": x, "type": y, ...} -> 当前 layout 下的 filter"""
+    return _rewrite(kind, flt) if timeseries_enabled() else flt
+
+
+def q_events(flt: Dict[str, Any]) -> Dict[str, Any]:
+    return query(EVENTS, flt)
+
+
+def q_moods(flt: Dict[str, Any]) -> Dict[str, Any]:
+    return query(MOODS, flt)
+
+
+def field(kind: str, name: str) -> str:
+    """aggregation 里引用字段用：field(EVENTS, "user_id") -> "meta.user_id" / "user_id" """
+    return f"meta.{name}" if timeseries_enabled() and name in _META_KEYS[kind] else name
+
+
+def to_timeseries(kind: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    meta_keys = _META_KEYS[kind]
+    out = {k: v for k, v in doc.items() if k not in meta_keys}
+    out["meta"] = {k: doc.get(k) for k in meta_keys}
+    return out
+
+
+def from_storage(kind: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """读出来统一成 standard 的形状（export 之类用）"""
+    if "meta" not in doc or not isinstance(doc["meta"], dict):
+        return doc
+    out = {k: v for k, v in doc.items() if k != "meta"}
+    out.update(doc["meta"])
+    return out
+
+
+async def stamp_local_time(db, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """按 user 现在的时区打上 local_day / local_hour（之后改时区不会影响这条）"""
+    tz = await get_user_timezone(db, doc["user_id"])
+    doc.update(local_fields(doc["ts"], tz))
+    return doc
+
+
+async def _insert(db, kind: str, doc: Dict[str, Any]) -> bool:
+    """insert 一条；同一个 user 的 event_id / mood_id 已经有了就返回 False（什么都不写）"""
+    await stamp_local_time(db, doc)
+    col = db[collection_name(kind)]
+    client_id = doc.get(_ID_FIELDS[kind])
+    if not timeseries_enabled():
+        try:
+            await col.insert_one(doc)
+            return True
+        except DuplicateKeyError:
+            return False
+    key = f"{kind}:{doc['user_id']}:{client_id}"
+    if client_id and not await claim(db, key):
+        return False
+    try:
+        await col.insert_one(to_timeseries(kind, doc))
+    except BaseException:
+        if client_id:
+            await release(db, key)
+        raise
+    return True
+
+
+async def insert_event(db, doc: Dict[str, Any]) -> bool:
+    return await _insert(db, EVENTS, doc)
+
+
+async def insert_mood(db, doc: Dict[str, Any]) -> bool:
+    return await _insert(db, MOODS, doc)
+
+
+# ---------- startup ----------
+async def ensure_collections(db) -> None:
+    """time-series collection 要先显式 create；两种 layout 的 index 都在这里建"""
+    if timeseries_enabled():
+        existing = set(await db.list_collection_names())
+        for kind, name in _TS_NAMES.items():
+            if name not in existing:
+                await db.create_collection(name, timeseries={
+                    "timeField": "ts",
+                    "metaField": "meta",
+                    "granularity": settings.EVENTS_TS_GRANULARITY,
+                })
+    # rollup 全部是 (user, local_day, type/label/local_hour) 的 index range
+    ev, md = db[collection_name(EVENTS)], db[collection_name(MOODS)]
+    await ev.create_index([(field(EVENTS, "user_id"), ASCENDING), ("local_day", ASCENDING), (field(EVENTS, "type"), ASCENDING)])
+    await ev.create_index([(field(EVENTS, "user_id"), ASCENDING), ("local_day", ASCENDING), ("local_hour", ASCENDING)])
+    await ev.create_index([(field(EVENTS, "user_id"), ASCENDING), ("ts", ASCENDING)])
+    await md.create_index([(field(MOODS, "user_id"), ASCENDING), ("local_day", ASCENDING), (field(MOODS, "label"), ASCENDING)])
+    if not timeseries_enabled():
+        for col, kind in ((ev, EVENTS), (md, MOODS)):
+            id_field = _ID_FIELDS[kind]
+            await ensure_unique(col, [("user_id", ASCENDING), (id_field, ASCENDING)],
+                                partialFilterExpression={id_field: {"$type": "string"}})
+
+
+# ---------- legacy local_day backfill ----------
+_LOCAL_TIME_MIGRATION = "local_time_backfill"
+
+
+def _doc_user_id(doc: Dict[str, Any]):
+    meta = doc.get("meta")
+    return meta.get("user_id") if isinstance(meta, dict) else doc.get("user_id")
+
+
+async def backfill_local_time(db, kind: str, batch: int = 1000, dry_run: bool = False) -> int:
+    """给还没有 local_day 的 document 补上 local_day / local_hour（用 user 现在的时区）；重跑是安全的"""
+    col = db[collection_name(kind)]
+    uid_field = field(kind, "user_id")
+    last_id = None
+    done = 0
+    t0 = time.perf_counter()
+
+    while True:
+        flt = {"local_day": {"$exists": False}, "ts": {"$ne": None}}
+        if last_id is not None:
+            flt["_id"] = {"$gt": last_id}
+        docs = await col.find(flt, {"_id": 1, "ts": 1, uid_field: 1}).sort("_id", 1).limit(batch).to_list(length=batch)
+        if not docs:
+            break
+        ops = []
+        for d in docs:
+            uid = _doc_user_id(d)
+            if uid is None:
+                continue
+            tz = await get_user_timezone(db, uid)   # LRU cache，同一个 user 只查一次
+            ops.append(UpdateOne({"_id": d["_id"], "local_day": {"$exists": False}},
+                                 {"$set": local_fields(d["ts"], tz)}))
+        if ops and not dry_run:
+            await col.bulk_write(ops, ordered=False)
+        last_id = docs[-1]["_id"]
+        done += len(ops)
+        rate = done / max(time.perf_counter() - t0, 1e-9)
+        print(f"  {kind}: {done} stamped ({rate:.0f}/s)")
+    return done
+
+
+async def ensure_local_time(db) -> None:
+    """启动时的 migration：旧数据补完 local_day 才开始 rollup（做完一次之后只读一个 marker）"""
+    if await db.migrations.find_one({"_id": _LOCAL_TIME_MIGRATION}):
+        return
+    try:
+        for kind in (EVENTS, MOODS):
+            n = await backfill_local_time(db, kind)
+            if n:
+                print(f"🕒 {kind}: stamped local_day on {n} legacy documents")
+    except OperationFailure as e:   # time-series 要 MongoDB 7.0+ 才能改非 meta 字段
+        print(f"⚠️  local_day backfill failed, run app.tools.backfill_local_time by hand: {e}")
+        return
+    await db.migrations.update_one({"_id": _LOCAL_TIME_MIGRATION}, {"$set": {"done_at": datetime.utcnow()}}, upsert=True)
@@ -0,0 +1,418 @@
+# app/logic/leaderboard.py
+"""
+Coins 排行榜：全局 top-K + 我的名次，还有 friend group 里的排名。
+
+request 里不 scan + sort users：
+- 全局 top-K：users 上的 (coins desc, _id) index，limit K 一次 indexed lookup；结果缓存在 worker 里，
+  有人的 coins 变化碰到 top-K（新值 >= 第 K 名，或者本来就在里面）才标 dirty，下次读再刷
+- 我的名次：RankIndex（Fenwick tree，coins 值 -> 人数），rank = 1 + coins 比我多的人数，O(log C)
+  - 启动时从 users 建一次（只读 coins），之后每 LEADERBOARD_REBUILD_SECONDS 重建，修正漏掉的更新；
+    建的过程中来的更新先记下来，建好之后补到新的 tree 上再换；每次 $inc 都带 coins_v（每个 user 自己的版本号）
+    和 coins_at（Mongo 的时间），scan 读到的版本已经包含的更新 replay 时跳过
+  - change_coins 每次 $inc 之后 broadcast 给所有 worker（push bus），每个 worker 自己 move(old, new)
+  - coins >= LEADERBOARD_MAX_COINS（tree 最后一档混着更大的）或者 index 还没建好：退回 count_documents（走 coins index）
+  - 负的 coins 跟 0 算同一档
+- friend group：`friend_groups` {name, owner_id, member_ids, invited_ids, created_at}，最多 LEADERBOARD_GROUP_MAX_MEMBERS 人；
+  成员只能邀请（invited_ids），对方 accept 才进 member_ids、才上榜；邀请的 email 有没有注册，回的都一样
+  排名 = 用 _id $in 拿成员的 coins，在内存里排（几十个人）；名字只给 display_name
+
+名次是 competition ranking：同分同名次（1, 2, 2, 4）。
+"""
+from __future__ import annotations
+import asyncio
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from app.config import settings
+from app.logic import push
+from app.utils import metrics
+from app.utils.singleflight import SingleFlight
+
+
+def _build(raw: List[int]) -> array:
+    """每个 slot 的人数 -> Fenwick tree（1-based），O(C)。
+    用 array 不用 list：一百万个 slot 的 list 每次 full GC 都要被扫一遍，array 不归 GC 管，也只占 8 bytes/slot"""
+    tree = array("q", [0])
+    tree.extend(raw)
+    n = len(raw)
+    for i in range(1, n + 1):
+        j = i + (i & -i)
+        if j <= n:
+            tree[j] += tree[i]
+    return tree
+
+
+class RankIndex:
+    """coins 值 -> 人数 的 Fenwick tree：add / move / rank 都是 O(log C)"""
+
+    def __init__(self, size: int = 1024, cap: Optional[int] = None):
+        self.cap = cap or settings.LEADERBOARD_MAX_COINS
+        self.size = max(1, min(size, self.cap + 1))
+        self._tree = array("q", bytes(8 * (self.size + 1)))
+        self.total = 0
+
+    @classmethod
+    def from_counts(cls, counts: Dict[int, int], cap: Optional[int] = None) -> "RankIndex":
+        """{coins: 人数} -> index，O(n + C)"""
+        idx = cls(cap=cap)
+        slots = {}
+        for coins, n in counts.items():
+            s = idx._slot(coins)
+            slots[s] = slots.get(s, 0) + n
+        size = idx.size
+        while slots and size <= max(slots):
+            size *= 2
+        idx.size = min(size, idx.cap + 1)
+        raw = [0] * idx.size
+        for s, n in slots.items():
+            raw[s] = n
+        idx._tree = _build(raw)
+        idx.total = sum(raw)
+        return idx
+
+    def _slot(self, coins: int) -> int:
+        return 0 if coins < 0 else min(int(coins), self.cap)
+
+    def _raw(self) -> List[int]:
+        tree = self._tree.tolist()
+        for i in range(self.size, 0, -1):
+            j = i + (i & -i)
+            if j <= self.size:
+                tree[j] -= tree[i]
+        return tree[1:]
+
+    def _grow(self, slot: int) -> None:
+        size = self.size
+        while size <= slot:
+            size *= 2
+        raw = self._raw()
+        raw.extend([0] * (min(size, self.cap + 1) - self.size))
+        self.size = len(raw)
+        self._tree = _build(raw)
+
+    def add(self, coins: int, n: int = 1) -> None:
+        i = self._slot(coins)
+        if i >= self.size:
+            self._grow(i)
+        tree, size = self._tree, self.size
+        i += 1
+        while i <= size:
+            tree[i] += n
+            i += i & -i
+        self.total += n
+
+    def move(self, old: int, new: int) -> None:
+        if self._slot(old) != self._slot(new):
+            self.add(old, -1)
+            self.add(new, 1)
+
+    def count_at_most(self, coins: int) -> int:
+        tree = self._tree
+        i = min(self._slot(coins), self.size - 1) + 1
+        s = 0
+        while i > 0:
+            s += tree[i]
+            i -= i & -i
+        return s
+
+    def rank(self, coins: int) -> int:
+        return 1 + self.total - self.count_at_most(coins)
+
+    def exact(self, coins: int) -> bool:
+        return coins < self.cap
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"users": self.total, "slots": self.size, "cap": self.cap}
+
+
+_index: Optional[RankIndex] = None          # None = 还没建好（走 count）
+_rebuild_since = 0.0                        # 重建的 scan 开始的时间（epoch 秒，已经减掉时钟误差）
+_rebuild_changes: Optional[Dict[str, Tuple[int, Optional[int], int, int]]] = None   # 重建中：user -> (最早的 v, 它的 old, 最新的 v, 它的 new)
+_top: List[Dict[str, Any]] = []
+_top_ids: Set[str] = set()
+_top_at = 0.0
+_top_dirty = True
+_stats: Dict[str, Any] = {"builds": 0, "build_ms_last": 0.0, "updates": 0, "rank_index": 0, "rank_counted": 0,
+                          "top_hits": 0, "top_refreshes": 0, "replayed_last": 0}
+TOP_FLIGHT = SingleFlight("leaderboard_top")
+
+
+async def ensure_indexes(db) -> None:
+    await db.users.create_index([("coins", DESCENDING), ("_id", ASCENDING)], name="coins_rank")
+    await db.friend_groups.create_index([("member_ids", ASCENDING)])
+    await db.friend_groups.create_index([("invited_ids", ASCENDING)])
+
+
+# ---------- coins 变化（每个 worker 都会收到） ----------
+def _epoch(at: datetime) -> float:
+    """pymongo 读回来的是 naive UTC"""
+    return (at if at.tzinfo else at.replace(tzinfo=timezone.utc)).timestamp()
+
+
+async def coins_changed(user_id: str, old: Optional[int], new: int, v: int, at: datetime) -> None:
+    """old=None = 新 user；v / at = 改完之后 user 上的 coins_v / coins_at"""
+    await push.broadcast("leaderboard", {"u": user_id, "old": old, "new": new, "v": v, "at": _epoch(at)})
+
+
+def _on_change(msg: Dict[str, Any]) -> None:
+    global _top_dirty
+    old, new = msg.get("old"), int(msg["new"])
+    changes = _rebuild_changes
+    # scan 开始之前的更新 scan 一定读到了，不用记
+    if changes is not None and msg.get("at", 0) >= _rebuild_since:
+        v = int(msg.get("v", 0))
+        c = changes.get(msg["u"])
+        if c is None:
+            changes[msg["u"]] = (v, old, v, new)
+        else:   # bus 上同一个 user 的更新不一定按顺序到
+            changes[msg["u"]] = ((v, old) if v < c[0] else c[:2]) + ((v, new) if v > c[2] else c[2:])
+    idx = _index
+    if idx is not None:
+        if old is None:
+            idx.add(new)
+        else:
+            idx.move(int(old), new)
+    _stats["updates"] += 1
+    if not _top_dirty and (len(_top) < settings.LEADERBOARD_TOP_K or new >= _top[-1]["coins"] or msg["u"] in _top_ids):
+        _top_dirty = True
+
+
+push.subscribe("leaderboard", _on_change)
+
+
+async def build_index(db, since: Optional[float] = None,
+                      scanned: Optional[Dict[str, Tuple[int, int]]] = None) -> RankIndex:
+    """since / scanned：coins_at >= since 的 user，把 scan 读到的 (coins, coins_v) 记进 scanned
+    （只有重建过程中改过的 user，不会是全部）"""
+    counts: Dict[int, int] = {}
+    proj = {"_id": 0, "coins": 1} if since is None else {"coins": 1, "coins_v": 1, "coins_at": 1}
+    async for d in db.users.find({}, proj, batch_size=10_000):
+        c = int(d.get("coins") or 0)
+        counts[c] = counts.get(c, 0) + 1
+        if since is not None and d.get("coins_at") and _epoch(d["coins_at"]) >= since:
+            scanned[str(d["_id"])] = (c, int(d.get("coins_v") or 0))
+    return RankIndex.from_counts(counts)
+
+
+def _replay(idx: RankIndex, changes: Dict[str, Tuple[int, Optional[int], int, int]],
+            scanned: Dict[str, Tuple[int, int]]) -> None:
+    """重建过程中的更新补到新的 tree 上。
+    scanned 里有：tree 里是 scan 读到的值，版本比它新才 move；
+    没有：scan 读到的是这些更新之前的版本，tree 里是最早那条的 old（None = scan 时还没有这个 user）"""
+    for u, (_, old, v, new) in changes.items():
+        if u in scanned:
+            have, seen = scanned[u]
+            if v > seen:
+                idx.move(have, new)
+        elif old is None:
+            idx.add(new)
+        else:
+            idx.move(old, new)
+    _stats["replayed_last"] = len(changes)
+
+
+async def _rebuild_loop(db) -> None:
+    global _index, _rebuild_changes, _rebuild_since
+    while True:
+        try:
+            t0 = time.perf_counter()
+            changes: Dict[str, Tuple[int, Optional[int], int, int]] = {}
+            scanned: Dict[str, Tuple[int, int]] = {}
+            _rebuild_since = time.time() - settings.LEADERBOARD_CLOCK_SKEW_SECONDS
+            _rebuild_changes = changes
+            try:
+                fresh = await build_index(db, _rebuild_since, scanned)
+            finally:
+                _rebuild_changes = None
+            # replay 跟换 index 之间没有 await：不会再漏掉更新
+            _replay(fresh, changes, scanned)
+            _index = fresh
+            _stats["builds"] += 1
+            _stats["build_ms_last"] = round((time.perf_counter() - t0) * 1000, 1)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  leaderboard rank index build failed: {e}")
+        await asyncio.sleep(settings.LEADERBOARD_REBUILD_SECONDS)
+
+
+async def start(db) -> asyncio.Task:
+    return asyncio.create_task(_rebuild_loop(db))
+
+
+# ---------- reads ----------
+def ranked(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """已经按 coins desc 排好的 users -> [{rank, user_id, name, coins}]"""
+    out: List[Dict[str, Any]] = []
+    prev: Optional[int] = None
+    rank = 1
+    for i, d in enumerate(docs, 1):
+        coins = int(d.get("coins") or 0)
+        if coins != prev:
+            rank, prev = i, coins
+        # 只给 display_name：email 不能出现在排行榜上
+        out.append({"rank": rank, "user_id": str(d["_id"]), "name": d.get("display_name"), "coins": coins})
+    return out
+
+
+async def _refresh_top(db) -> None:
+    global _top, _top_ids, _top_at, _top_dirty
+    _top_dirty = False      # 刷的过程中又有变化会再标 dirty
+    k = settings.LEADERBOARD_TOP_K
+    docs = await db.users.find({}, {"coins": 1, "display_name": 1}).sort(
+        [("coins", DESCENDING), ("_id", ASCENDING)]).limit(k).to_list(length=k)
+    _top = ranked(docs)
+    _top_ids = {e["user_id"] for e in _top}
+    _top_at = time.monotonic()
+    _stats["top_refreshes"] += 1
+
+
+async def top(db, limit: int) -> List[Dict[str, Any]]:
+    if _top_dirty or time.monotonic() - _top_at > settings.LEADERBOARD_TOP_TTL_SECONDS:
+        await TOP_FLIGHT.do("top", lambda: _refresh_top(db))
+    else:
+        _stats["top_hits"] += 1
+    return _top[:limit]
+
+
+async def rank_of(db, coins: int) -> Dict[str, int]:
+    idx = _index
+    if idx is not None and idx.exact(coins):
+        _stats["rank_index"] += 1
+        return {"rank": idx.rank(coins), "total": idx.total, "coins": coins}
+    _stats["rank_counted"] += 1
+    above = await db.users.count_documents({"coins": {"$gt": coins}})
+    return {"rank": above + 1, "total": await db.users.estimated_document_count(), "coins": coins}
+
+
+# ---------- friend groups ----------
+class GroupFull(ValueError):
+    pass
+
+
+def _full() -> GroupFull:
+    return GroupFull(f"A group can have at most {settings.LEADERBOARD_GROUP_MAX_MEMBERS} members")
+
+
+def _group_out(g: Dict[str, Any]) -> Dict[str, Any]:
+    # 不给邀请了几个人：跟请求里的 email 数一对就知道哪些没注册
+    return {"id": str(g["_id"]), "name": g["name"], "owner_id": g["owner_id"], "members": len(g["member_ids"])}
+
+
+def _clean(emails: List[str]) -> List[str]:
+    return list(dict.fromkeys(e.strip() for e in emails if e.strip()))
+
+
+async def _resolve(db, emails: List[str]) -> List[str]:
+    """emails -> 注册了的 user ids（没注册的直接丢掉，不告诉调用方）"""
+    if not emails:
+        return []
+    found = {d["email"]: str(d["_id"])
+             async for d in db.users.find({"email": {"$in": emails}}, {"email": 1})}
+    return [found[e] for e in emails if e in found]
+
+
+async def _notify(ids: List[str], g: Dict[str, Any]) -> None:
+    await push.publish(ids, "group_invite", {"group_id": str(g["_id"]), "name": g["name"]})
+
+
+async def create_group(db, owner_id: str, name: str, emails: List[str]) -> Dict[str, Any]:
+    """emails 只是邀请，对方 accept 了才进 group；有没有注册回的都一样"""
+    emails = _clean(emails)
+    if 1 + len(emails) > settings.LEADERBOARD_GROUP_MAX_MEMBERS:
+        raise _full()
+    invited = [u for u in dict.fromkeys(await _resolve(db, emails)) if u != owner_id]
+    doc = {"name": name, "owner_id": owner_id, "member_ids": [owner_id], "invited_ids": invited,
+           "created_at": datetime.utcnow()}
+    res = await db.friend_groups.insert_one(doc)
+    doc["_id"] = res.inserted_id
+    await _notify(invited, doc)
+    return _group_out(doc)
+
+
+async def invite(db, group_id: str, user_id: str, email: str) -> bool:
+    """group 里的人邀请 email；group 不存在 / 不是成员 -> False，满了 -> GroupFull。
+    email 有没有注册、是不是已经在 group 里，回的都一样"""
+    if not ObjectId.is_valid(group_id):
+        return False
+    cap = settings.LEADERBOARD_GROUP_MAX_MEMBERS
+    g = await db.friend_groups.find_one({"_id": ObjectId(group_id), "member_ids": user_id},
+                                        {"name": 1, "member_ids": 1, "invited_ids": 1})
+    if g is None:
+        return False
+    if len(g["member_ids"]) >= cap or len(g.get("invited_ids") or []) >= cap:
+        raise _full()
+    ids = await _resolve(db, _clean([email]))
+    if ids and ids[0] not in g["member_ids"]:
+        res = await db.friend_groups.update_one(
+            {"_id": g["_id"], "member_ids": {"$ne": ids[0]}, f"invited_ids.{cap - 1}": {"$exists": False}},
+            {"$addToSet": {"invited_ids": ids[0]}},
+        )
+        if res.modified_count:
+            await _notify(ids, g)
+    return True
+
+
+async def my_invites(db, user_id: str) -> List[Dict[str, Any]]:
+    cur = db.friend_groups.find({"invited_ids": user_id}, {"name": 1, "owner_id": 1, "member_ids": 1})
+    return [_group_out(g) async for g in cur]
+
+
+async def accept(db, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """没被邀请 -> None；满了 -> GroupFull（邀请留着）"""
+    if not ObjectId.is_valid(group_id):
+        return None
+    cap = settings.LEADERBOARD_GROUP_MAX_MEMBERS
+    # 满没满跟加进去在同一个原子 update 里判断
+    g = await db.friend_groups.find_one_and_update(
+        {"_id": ObjectId(group_id), "invited_ids": user_id, f"member_ids.{cap - 1}": {"$exists": False}},
+        {"$pull": {"invited_ids": user_id}, "$addToSet": {"member_ids": user_id}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if g is None:
+        if await db.friend_groups.count_documents({"_id": ObjectId(group_id), "invited_ids": user_id}, limit=1):
+            raise _full()
+        return None
+    return _group_out(g)
+
+
+async def decline(db, group_id: str, user_id: str) -> bool:
+    if not ObjectId.is_valid(group_id):
+        return False
+    res = await db.friend_groups.update_one({"_id": ObjectId(group_id), "invited_ids": user_id},
+                                            {"$pull": {"invited_ids": user_id}})
+    return res.modified_count > 0
+
+
+async def my_groups(db, user_id: str) -> List[Dict[str, Any]]:
+    cur = db.friend_groups.find({"member_ids": user_id}, {"name": 1, "owner_id": 1, "member_ids": 1})
+    return [_group_out(g) async for g in cur]
+
+
+async def group_board(db, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """只有已经 accept 的成员在榜上（被邀请但还没 accept 的不算）"""
+    if not ObjectId.is_valid(group_id):
+        return None
+    g = await db.friend_groups.find_one({"_id": ObjectId(group_id), "member_ids": user_id})
+    if g is None:
+        return None
+    docs = await db.users.find(
+        {"_id": {"$in": [ObjectId(m) for m in g["member_ids"]]}},
+        {"coins": 1, "display_name": 1},
+    ).to_list(length=None)
+    docs.sort(key=lambda d: (-int(d.get("coins") or 0), str(d["_id"])))
+    board = ranked(docs)
+    return {"group": _group_out(g), "board": board, "me": next((e for e in board if e["user_id"] == user_id), None)}
+
+
+metrics.register("leaderboard", lambda: {
+    **_stats,
+    "index": _index.snapshot() if _index is not None else None,
+    "top_cached": len(_top),
+    "top_dirty": _top_dirty,
+})
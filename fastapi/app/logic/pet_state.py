@@ -0,0 +1,169 @@
+# app/logic/pet_state.py
+"""
+每个 user 一个 `pets` document，活动进来的时候增量更新，首页直接读，不用算 stress score：
+
+    {user_id, mood 0-100, energy 0-100, reaction, stress_score, last_signal, updated_at}
+
+- user_id 统一用 users._id 的字符串（email 进来会先查一次 _id，有 cache）
+- 每个信号 = (mood 变化, energy 变化)，一个 update pipeline 原子地加上去并夹在 0-100；
+  reaction 由 mood 推出来（concern / cheer / idle，跟 choose_pet_reaction 一样的三种）
+- compute_stress_score 算完直接把 reaction / stress_score 写进来，mood 往 (100 - score) 拉一半
+- energy 不活动会慢慢回到 50（读的时候按 updated_at 算，不用后台 job；写的时候 pipeline 先把 drift
+  算进去再加 delta，drift 不会因为 updated_at 被重置而丢掉）
+- reaction 变了就 push 给在线 device（app/logic/push.py）
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from app.logic.push import publish_pet
+from app.utils.cache import LRUCache
+
+DEFAULT = {"mood": 60, "energy": 60, "reaction": "idle", "stress_score": None, "last_signal": None}
+
+# (mood, energy)
+SIGNALS: Dict[str, Tuple[int, int]] = {
+    "task_completed": (6, -3),
+    "task_uncompleted": (-4, 0),
+    "coins_spent": (4, 8),        # 买东西喂 pet
+    "coins_earned": (2, 0),
+    "mood_positive": (5, 2),
+    "mood_neutral": (0, 0),
+    "mood_negative": (-5, -2),
+    "mood_anxious": (-6, -2),
+    "mood_tired": (-3, -6),
+    "hydrate": (1, 3),
+    "break_start": (1, 4),
+    "sleep_log": (2, 10),
+    "overdue": (-6, -2),
+    "focus_start": (1, -2),
+    "task_complete": (6, -3),     # wellbeing event 的写法
+}
+
+ENERGY_DRIFT_PER_HOUR = 2         # 一直没活动：每小时往 50 靠 2 点
+
+_uid_cache: LRUCache[str] = LRUCache(maxsize=50_000, ttl=3600)
+
+
+async def ensure_indexes(db) -> None:
+    await db.pets.create_index([("user_id", ASCENDING)], unique=True)
+
+
+async def resolve_user_id(db, user_key: str) -> Optional[str]:
+    """user id 字符串直接用；email 查一次 users._id"""
+    if ObjectId.is_valid(user_key):
+        return user_key
+    uid = _uid_cache.get(user_key)
+    if uid is None:
+        u = await db.users.find_one({"email": user_key}, {"_id": 1})
+        if not u:
+            return None
+        uid = str(u["_id"])
+        _uid_cache.set(user_key, uid)
+    return uid
+
+
+def _clamp(expr) -> dict:
+    return {"$min": [100, {"$max": [0, expr]}]}
+
+
+_REACTION = {"$switch": {"branches": [
+    {"case": {"$lt": ["$mood", 35]}, "then": "concern"},
+    {"case": {"$lt": ["$mood", 60]}, "then": "cheer"},
+], "default": "idle"}}
+
+
+# _with_drift 的 pipeline 版：从 $updated_at 到 $$NOW 往 50 靠（新 document 没有 updated_at = 不 drift）
+_ENERGY = {"$ifNull": ["$energy", DEFAULT["energy"]]}
+_DRIFT = {"$floor": {"$divide": [
+    {"$multiply": [
+        {"$dateDiff": {"startDate": {"$ifNull": ["$updated_at", "$$NOW"]}, "endDate": "$$NOW", "unit": "second"}},
+        ENERGY_DRIFT_PER_HOUR,
+    ]},
+    3600,
+]}}
+_DRIFTED_ENERGY = {"$cond": [
+    {"$gt": [_ENERGY, 50]},
+    {"$max": [{"$subtract": [_ENERGY, _DRIFT]}, 50]},
+    {"$min": [{"$add": [_ENERGY, _DRIFT]}, 50]},
+]}
+
+
+async def _apply(db, uid: str, mood: Dict[str, Any], extra: Dict[str, Any], reaction: Any = _REACTION) -> dict:
+    """mood / extra["energy"] 里的 $energy 已经是 drift 过的值"""
+    doc = await db.pets.find_one_and_update(
+        {"user_id": uid},
+        [
+            {"$set": {"energy": _DRIFTED_ENERGY}},
+            {"$set": {
+                "user_id": uid,
+                "mood": mood,
+                "energy": extra.pop("energy"),
+                "updated_at": "$$NOW",
+                **extra,
+            }},
+            {"$set": {"reaction": reaction}},
+        ],
+        upsert=True,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    await publish_pet(uid, doc["reaction"], mood=doc["mood"], energy=doc["energy"])
+    return doc
+
+
+async def apply_signal(db, user_key: str, signal: str) -> Optional[dict]:
+    """一个活动信号进来：mood / energy 加上 SIGNALS[signal]；不认识的信号 / 找不到 user 就什么都不做"""
+    delta = SIGNALS.get(signal)
+    if delta is None:
+        return None
+    try:
+        uid = await resolve_user_id(db, user_key)
+        if uid is None:
+            return None
+        return await _apply(
+            db, uid,
+            mood=_clamp({"$add": [{"$ifNull": ["$mood", DEFAULT["mood"]]}, delta[0]]}),
+            extra={"energy": _clamp({"$add": ["$energy", delta[1]]}),
+                   "last_signal": signal},
+        )
+    except Exception as e:  # pet 更新失败不能影响原本的请求
+        print(f"⚠️  pet state update failed ({signal}): {e}")
+        return None
+
+
+async def apply_score(db, user_id: str, score: float, reaction: str) -> Optional[dict]:
+    """compute_stress_score 的结果：reaction 直接用，mood 往 (100 - score) 拉一半"""
+    try:
+        uid = await resolve_user_id(db, user_id)
+        if uid is None:
+            return None
+        return await _apply(
+            db, uid,
+            mood=_clamp({"$floor": {"$avg": [{"$ifNull": ["$mood", DEFAULT["mood"]]}, 100 - score]}}),
+            extra={"energy": "$energy", "stress_score": score,
+                   "last_signal": "stress_score"},
+            reaction=reaction,
+        )
+    except Exception as e:
+        print(f"⚠️  pet state update failed (stress_score): {e}")
+        return None
+
+
+def _with_drift(doc: dict, now: datetime) -> dict:
+    hours = (now - doc["updated_at"]).total_seconds() / 3600 if doc.get("updated_at") else 0
+    drift = int(hours * ENERGY_DRIFT_PER_HOUR)
+    if drift > 0:
+        e = doc["energy"]
+        doc["energy"] = max(e - drift, 50) if e > 50 else min(e + drift, 50)
+    return doc
+
+
+async def get_state(db, user_id: str) -> dict:
+    doc = await db.pets.find_one({"user_id": user_id}, {"_id": 0})
+    if doc is None:
+        return {"user_id": user_id, **DEFAULT, "updated_at": None}
+    return _with_drift(doc, datetime.utcnow())
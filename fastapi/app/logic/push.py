@@ -0,0 +1,245 @@
+# app/logic/push.py
+"""
+WebSocket push：coins / pet reaction / task 变化直接推给 user 的所有在线 device，不用再 poll。
+
+    await publish([str(user.id), user.email], "coins", {"coins": 120, "delta": 10})
+
+- PushHub：这个 worker 上的连接，key = user id 和 email（events 里两种都有人用），一个 socket 两个 key
+- 消息只 serialize 一次（dumps），然后 fan-out 到该 user 的每个 socket
+- 每个 socket 一个有上限的出站队列 + 自己的 writer task：publish 只 put_nowait，不会等网络
+  （REST handler 不会被卡住的 client 拖住）；队列满了 / send 超时 = client 太慢，直接断开、注销
+- 多个 gunicorn worker：user 的连接可能在别的 worker 上，所以 publish 要经过 bus（settings.PUSH_BACKEND）
+    - "local"：只有本进程（单 worker / 开发）
+    - "mongo"：写进 `push_bus`，每个 worker 用 change stream 收（需要 replica set，单节点的也行），
+               TTL index 清掉旧消息；change stream 用不了就退回 local
+- worker 之间的内部消息（不给 socket）：broadcast("leaderboard", {...}) -> 每个 worker 上 subscribe 的 handler
+  （key 以 "#" 开头；mongo backend 下发的那个 worker 也是从 change stream 收到，每个 worker 刚好一次）
+"""
+from __future__ import annotations
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.cache import LRUCache
+from app.utils.response_utils import dumps
+
+_timeout = getattr(asyncio, "timeout", None)   # Python 3.11+
+WS_TOO_SLOW = 1013   # "try again later"
+
+
+class _Conn:
+    __slots__ = ("ws", "keys", "queue", "writer")
+
+    def __init__(self, ws, keys: List[str]):
+        self.ws = ws
+        self.keys = keys
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.PUSH_QUEUE_SIZE)
+        self.writer: Optional[asyncio.Task] = None   # 第一条消息进来才开
+
+
+class PushHub:
+    def __init__(self):
+        self._conns: Dict[str, Set[_Conn]] = {}
+        self._by_ws: Dict[Any, _Conn] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self.stats = {"published": 0, "delivered": 0, "send_failures": 0, "overflows": 0, "bytes_out": 0,
+                      "opened": 0, "closed": 0}
+
+    def add(self, keys: Iterable[str], ws) -> None:
+        conn = _Conn(ws, list(keys))
+        self._by_ws[ws] = conn
+        for k in conn.keys:
+            self._conns.setdefault(k, set()).add(conn)
+        self.stats["opened"] += 1
+
+    def remove(self, keys: Iterable[str], ws) -> None:
+        """注销 + 停掉 writer；重复调没关系（/ws 的 finally 和 slow client 断开都会调）"""
+        conn = self._by_ws.pop(ws, None)
+        if conn is None:
+            return
+        for k in conn.keys:
+            conns = self._conns.get(k)
+            if conns is not None:
+                conns.discard(conn)
+                if not conns:
+                    del self._conns[k]
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        self.stats["closed"] += 1
+
+    def _enqueue(self, conn: _Conn, text: str) -> bool:
+        try:
+            conn.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self.stats["overflows"] += 1
+            self._kick(conn)
+            return False
+        if conn.writer is None:
+            conn.writer = asyncio.get_running_loop().create_task(self._write(conn))
+        return True
+
+    def send(self, ws, text: str) -> bool:
+        """给一个 socket 发（/ws 自己的 hello / pong）：也走队列，一个 socket 只有一个 writer 在写"""
+        conn = self._by_ws.get(ws)
+        return conn is not None and self._enqueue(conn, text)
+
+    async def _write(self, conn: _Conn) -> None:
+        while True:
+            text = await conn.queue.get()
+            try:
+                if _timeout is not None:
+                    async with _timeout(settings.PUSH_SEND_TIMEOUT_SECONDS):   # 不像 wait_for 那样每次多开一个 Task
+                        await conn.ws.send_text(text)
+                else:
+                    await asyncio.wait_for(conn.ws.send_text(text), timeout=settings.PUSH_SEND_TIMEOUT_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 超时 / 断线：这个 socket 写到一半了，不能再用，断开
+                self.stats["send_failures"] += 1
+                self._kick(conn)
+                return
+            self.stats["delivered"] += 1
+            self.stats["bytes_out"] += len(text)
+
+    def _kick(self, conn: _Conn) -> None:
+        self.remove(conn.keys, conn.ws)
+        t = asyncio.get_running_loop().create_task(self._close(conn.ws))
+        self._closing.add(t)
+        t.add_done_callback(self._closing.discard)
+
+    async def _close(self, ws) -> None:
+        try:
+            await asyncio.wait_for(ws.close(code=WS_TOO_SLOW), timeout=settings.PUSH_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            pass   # 已经断了
+
+    async def deliver(self, keys: Iterable[str], text: str) -> int:
+        """放进每个 socket 的队列就返回（不等发出去）；返回放进了几个"""
+        conns: Set[_Conn] = set()
+        for k in keys:
+            conns |= self._conns.get(k, set())
+        return sum(self._enqueue(c, text) for c in conns)
+
+    def snapshot(self) -> dict:
+        return {"connections": len(self._by_ws), "keys": len(self._conns), "backend": BUS.name,
+                "queued": sum(c.queue.qsize() for c in self._by_ws.values()), **self.stats}
+
+
+HUB = PushHub()
+
+
+class LocalBus:
+    name = "local"
+
+    async def start(self, db) -> Optional[asyncio.Task]:
+        return None
+
+    async def publish(self, keys: List[str], text: str) -> None:
+        await _route(keys, text)
+
+
+class MongoBus:
+    name = "mongo"
+
+    def __init__(self):
+        self.col = None
+        self.fallback = False
+
+    async def start(self, db) -> Optional[asyncio.Task]:
+        self.col = db.push_bus
+        await self.col.create_index([("created_at", ASCENDING)], expireAfterSeconds=60)
+        return asyncio.create_task(self._watch())
+
+    async def publish(self, keys: List[str], text: str) -> None:
+        if self.fallback or self.col is None:
+            await _route(keys, text)
+            return
+        await self.col.insert_one({"keys": keys, "msg": text, "created_at": datetime.utcnow()})
+
+    async def _watch(self) -> None:
+        resume = None
+        while True:
+            try:
+                async with self.col.watch([{"$match": {"operationType": "insert"}}], resume_after=resume) as stream:
+                    self.fallback = False
+                    async for change in stream:
+                        resume = stream.resume_token
+                        doc = change["fullDocument"]
+                        await _route(doc["keys"], doc["msg"])
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                # 不是 replica set（或者断线）：先退回本进程内推送，过一会再试
+                if not self.fallback:
+                    print(f"⚠️  push change stream unavailable, falling back to local: {e}")
+                self.fallback = True
+                resume = None
+                await asyncio.sleep(30)
+
+
+_handlers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+
+
+async def _route(keys: List[str], text: str) -> None:
+    if keys and keys[0].startswith("#"):
+        for handler in _handlers.get(keys[0][1:], ()):
+            try:
+                handler(json.loads(text))
+            except Exception as e:
+                print(f"⚠️  {keys[0]} handler failed: {e}")
+        return
+    await HUB.deliver(keys, text)
+
+
+BUS = MongoBus() if settings.PUSH_BACKEND == "mongo" else LocalBus()
+metrics.register("push", HUB.snapshot)
+
+
+def encode(kind: str, data: Dict[str, Any]) -> str:
+    return dumps({"type": kind, "data": data, "ts": datetime.utcnow()}).decode()
+
+
+async def publish(keys: Iterable[Optional[str]], kind: str, data: Dict[str, Any]) -> None:
+    """推一条消息给这些 key（user id / email）的所有连接；推送失败只 log，不影响调用方"""
+    keys = [k for k in dict.fromkeys(keys) if k]
+    if not keys:
+        return
+    HUB.stats["published"] += 1
+    try:
+        await BUS.publish(keys, encode(kind, data))
+    except Exception as e:
+        print(f"⚠️  push publish failed: {e}")
+
+
+def subscribe(channel: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+    """每个 worker 收到 broadcast(channel, ...) 都会调 handler（同步、要快）"""
+    _handlers.setdefault(channel, []).append(handler)
+
+
+async def broadcast(channel: str, data: Dict[str, Any]) -> None:
+    try:
+        await BUS.publish(["#" + channel], dumps(data).decode())
+    except Exception as e:
+        print(f"⚠️  broadcast {channel} failed: {e}")
+
+
+# pet reaction：只有变了才推（per worker 记最后一次推的）
+_last_reaction: LRUCache[str] = LRUCache(maxsize=50_000, ttl=6 * 3600)
+
+
+async def publish_pet(user_id: str, reaction: str, **data: Any) -> None:
+    if _last_reaction.get(user_id) == reaction:
+        return
+    _last_reaction.set(user_id, reaction)
+    await publish([user_id], "pet", {"reaction": reaction, **data})
+
+
+async def start(db) -> Optional[asyncio.Task]:
+    return await BUS.start(db)
@@ -0,0 +1,336 @@
+# app/logic/reminders.py
+"""
+Reminder engine：把 Task.notify（NotificationPrefs）变成真的会响的提醒。
+
+kind（一个 task 每种最多一条 pending，_id = "<flutter_id>:<kind>"）：
+- before_start / on_start    ：startDate - offset / startDate
+- before_due / on_due        ：due - offset / due（due = dueDateTime 或 dueDate）
+- daily                      ：每天 dailyHour:dailyMinute（task.timezone 本地时间），到 due 为止
+- repeat                     ：due 的那一天（本地），每 repeatInterval 个 minute/hour/day 响一次，到 due 为止
+completed / archived 的 task 没有提醒。所有时间都是 UTC naive（和其他 collection 一样）。
+
+存储 + 调度：
+- `reminders` collection（index: status+fire_at、task_id）是 source of truth，多个 worker 共用
+- 每个 worker 把未来 REMINDER_LOAD_HORIZON_MINUTES 内要响的 load 进内存 min-heap
+- task 改了就重算这个 task 的几条（incremental），version 变了，heap 里旧的 entry 自然作废（lazy delete）
+- 到点先 claim：update_one({_id, version, status: pending}) 改成 claimed，改到的那个 worker 才发 ——
+  多个 worker 同时 load 了同一条也只会发一次；claim 了但挂掉的，REMINDER_CLAIM_TIMEOUT_SECONDS 后别人重新拿
+- 发出去走 sink（可插拔，默认 print），daily / repeat 发完直接算下一次
+
+store=None 就是纯内存模式（benchmark 用）。
+"""
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DeleteMany, UpdateOne
+
+from app.config import settings
+from app.logic.user_tz import zone
+from app.utils import metrics
+
+Sink = Callable[[Dict[str, Any]], Awaitable[None]]
+
+_CLOSED = {"completed", "archived"}
+_STEP_MINUTES = {"minute": 1, "hour": 60, "day": 1440}
+
+
+def _utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _val(v):
+    return getattr(v, "value", v)
+
+
+def _local_at(day, hour: int, minute: int, tz) -> datetime:
+    """本地某天某时刻 -> UTC naive"""
+    local = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def next_fires(task, now: datetime) -> Dict[str, Dict[str, Any]]:
+    """
+    task 每种 reminder 的下一次（严格晚于 now）：{kind: {"fire_at": ..., 重复类的还有 every / tz / until}}
+    纯函数，不碰 DB。
+    """
+    if _val(task.status) in _CLOSED:
+        return {}
+    n = task.notify
+    start = _utc(task.startDate)
+    due = _utc(task.dueDateTime or task.dueDate)
+    out: Dict[str, Dict[str, Any]] = {}
+
+    def once(kind: str, at: Optional[datetime]):
+        if at is not None and at > now:
+            out[kind] = {"fire_at": at}
+
+    if start is not None:
+        if n.remindBeforeStart:
+            once("before_start", start - timedelta(minutes=n.remindBeforeStartOffsetMinutes))
+        if n.remindOnStart:
+            once("on_start", start)
+    if due is not None:
+        if n.remindBeforeDue:
+            once("before_due", due - timedelta(minutes=n.remindBeforeDueOffsetMinutes))
+        if n.remindOnDue:
+            once("on_due", due)
+
+    tz = zone(task.timezone)
+    if n.dailyHour is not None:
+        at = _next_daily(now, n.dailyHour, n.dailyMinute or 0, tz.key)
+        if due is None or at <= due:
+            out["daily"] = {"fire_at": at, "every": "daily", "hour": n.dailyHour,
+                            "minute": n.dailyMinute or 0, "tz": tz.key, "until": due}
+
+    granularity = _val(n.repeatWhenToday)
+    if due is not None and granularity in _STEP_MINUTES:
+        # 从 due 那天的本地 0 点起算；task 提前几天存的话第一次就排在 due 那天（load() 到时候会拿进 heap）
+        local_due = due.replace(tzinfo=timezone.utc).astimezone(tz)
+        step = max(1, n.repeatInterval) * _STEP_MINUTES[granularity]
+        anchor = _local_at(local_due.date(), 0, 0, tz)
+        at = _next_step(anchor, step, max(now, anchor))
+        if at < due:
+            out["repeat"] = {"fire_at": at, "every": step, "anchor": anchor, "until": due}
+    return out
+
+
+def _next_daily(after: datetime, hour: int, minute: int, tz_name: str) -> datetime:
+    tz = zone(tz_name)
+    day = after.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    at = _local_at(day, hour, minute, tz)
+    while at <= after:   # 用本地日期 +1 天重新算：DST 切换那天也对
+        day += timedelta(days=1)
+        at = _local_at(day, hour, minute, tz)
+    return at
+
+
+def _next_step(anchor: datetime, step_minutes: int, after: datetime) -> datetime:
+    step = timedelta(minutes=step_minutes)
+    k = (after - anchor) // step + 1
+    return anchor + k * step
+
+
+def _following(r: Dict[str, Any], now: datetime) -> Optional[datetime]:
+    """daily / repeat 响完之后的下一次（停机错过的不补发）；一次性的返回 None"""
+    every = r.get("every")
+    after = max(r["fire_at"], now)
+    if every == "daily":
+        at = _next_daily(after, r["hour"], r["minute"], r["tz"])
+    elif isinstance(every, int):
+        at = _next_step(r["anchor"], every, after)
+    else:
+        return None
+    until = r.get("until")
+    return at if until is None or at <= until else None
+
+
+async def log_sink(r: Dict[str, Any]) -> None:
+    print(f"⏰ reminder {r['kind']} → {r.get('user_email')}: {r.get('title')} ({r['fire_at'].isoformat()}Z)")
+
+
+class ReminderEngine:
+    def __init__(self, store=None, sink: Sink = log_sink):
+        self.store = store              # Motor collection（None = 纯内存）
+        self.sink = sink
+        self._heap: List[Tuple[datetime, int, str, int]] = []   # (fire_at, seq, _id, version)
+        self._live: Dict[str, Dict[str, Any]] = {}              # _id -> 当前有效的 reminder（含 version）
+        self._by_task: Dict[str, Set[str]] = {}                 # task_id -> 它在 _live 里的 _id
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._next_load = datetime.min
+        self.owner = f"reminders:{id(self):x}"
+        self.stats = {"scheduled": 0, "fired": 0, "claimed_elsewhere": 0, "stale": 0, "sink_errors": 0}
+
+    # ---------- schedule ----------
+    def _push(self, r: Dict[str, Any]) -> None:
+        self._live[r["_id"]] = r
+        self._by_task.setdefault(r["task_id"], set()).add(r["_id"])
+        heapq.heappush(self._heap, (r["fire_at"], next(self._seq), r["_id"], r["version"]))
+        if self._heap[0][2] == r["_id"]:
+            self._wake.set()   # 比原来最早的还早：叫醒 run loop 重新算 sleep
+
+    def _drop(self, rid: str) -> Optional[Dict[str, Any]]:
+        r = self._live.pop(rid, None)
+        if r is not None:
+            ids = self._by_task.get(r["task_id"])
+            if ids is not None:
+                ids.discard(rid)
+                if not ids:
+                    del self._by_task[r["task_id"]]
+        return r
+
+    def _in_window(self, at: datetime) -> bool:
+        # 很久以后的不放内存，等 load() 到时候再拿
+        return self.store is None or at <= self._next_load + timedelta(minutes=settings.REMINDER_LOAD_HORIZON_MINUTES)
+
+    async def schedule_task(self, task, now: Optional[datetime] = None) -> int:
+        """task 新建 / 修改：重算它的全部 reminder，换掉旧的；返回现在有几条 pending"""
+        now = now or datetime.utcnow()
+        version = time.time_ns()
+        fires = next_fires(task, now)
+        docs = []
+        for kind, f in fires.items():
+            docs.append({
+                "_id": f"{task.flutter_id}:{kind}", "task_id": task.flutter_id, "user_email": task.user_email,
+                "title": task.title, "kind": kind, "version": version, "status": "pending", **f,
+            })
+        keep = {d["_id"] for d in docs}
+        for rid in self._by_task.get(task.flutter_id, set()) - keep:
+            self._drop(rid)   # heap 里的 entry 等 pop 到的时候再丢
+        if self.store is not None:
+            ops: List[Any] = [DeleteMany({"task_id": task.flutter_id, "_id": {"$nin": list(keep)}})]
+            ops += [UpdateOne({"_id": d["_id"]}, {"$set": d, "$unset": {"claimed_by": "", "claimed_at": ""}}, upsert=True)
+                    for d in docs]
+            await self.store.bulk_write(ops, ordered=True)
+        for d in docs:
+            if self._in_window(d["fire_at"]):
+                self._push(d)
+        self.stats["scheduled"] += len(docs)
+        return len(docs)
+
+    async def unschedule_task(self, flutter_id: str) -> None:
+        for rid in list(self._by_task.get(flutter_id, ())):
+            self._drop(rid)
+        if self.store is not None:
+            await self.store.delete_many({"task_id": flutter_id})
+
+    async def load(self, now: Optional[datetime] = None) -> int:
+        """从 Mongo 把未来 horizon 内要响的（+ claim 超时的）拿进 heap"""
+        if self.store is None:
+            return 0
+        now = now or datetime.utcnow()
+        self._next_load = now + timedelta(minutes=settings.REMINDER_LOAD_HORIZON_MINUTES / 2)
+        horizon = now + timedelta(minutes=settings.REMINDER_LOAD_HORIZON_MINUTES)
+        stale = now - timedelta(seconds=settings.REMINDER_CLAIM_TIMEOUT_SECONDS)
+        cursor = self.store.find({"$or": [
+            {"status": "pending", "fire_at": {"$lte": horizon}},
+            {"status": "claimed", "claimed_at": {"$lt": stale}},
+        ]}).batch_size(5000)
+        n = 0
+        async for r in cursor:
+            cur = self._live.get(r["_id"])
+            if cur is None or cur["version"] != r["version"]:
+                self._push(r)
+                n += 1
+        return n
+
+    # ---------- dispatch ----------
+    async def _claim(self, r: Dict[str, Any], now: datetime) -> bool:
+        if self.store is None:
+            return True
+        stale = now - timedelta(seconds=settings.REMINDER_CLAIM_TIMEOUT_SECONDS)
+        res = await self.store.update_one(
+            {"_id": r["_id"], "version": r["version"],
+             "$or": [{"status": "pending"}, {"status": "claimed", "claimed_at": {"$lt": stale}}]},
+            {"$set": {"status": "claimed", "claimed_by": self.owner, "claimed_at": now}},
+        )
+        return res.modified_count == 1
+
+    async def _fire(self, r: Dict[str, Any], now: datetime) -> None:
+        if not await self._claim(r, now):
+            self.stats["claimed_elsewhere"] += 1
+            return
+        try:
+            await self.sink(r)
+            self.stats["fired"] += 1
+        except Exception as e:  # sink 挂了不影响其他 reminder
+            self.stats["sink_errors"] += 1
+            print(f"⚠️  reminder sink failed for {r['_id']}: {e}")
+
+        nxt = _following(r, now)
+        if nxt is not None:
+            r = {**r, "fire_at": nxt, "version": time.time_ns(), "status": "pending"}
+            if self.store is not None:
+                await self.store.update_one(
+                    {"_id": r["_id"], "claimed_by": self.owner},
+                    {"$set": {"fire_at": nxt, "version": r["version"], "status": "pending"},
+                     "$unset": {"claimed_by": "", "claimed_at": ""}},
+                )
+            if self._in_window(nxt):
+                self._push(r)
+        elif self.store is not None:
+            await self.store.update_one({"_id": r["_id"], "claimed_by": self.owner},
+                                        {"$set": {"status": "sent", "sent_at": now}})
+
+    async def dispatch_due(self, now: Optional[datetime] = None, limit: int = 1000) -> int:
+        """把到点的（最多 limit 条）全部发掉；返回处理了几条"""
+        now = now or datetime.utcnow()
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < limit:
+            _, _, rid, version = heapq.heappop(self._heap)
+            r = self._live.get(rid)
+            if r is None or r["version"] != version:
+                self.stats["stale"] += 1   # task 改过 / 删掉了
+                continue
+            self._drop(rid)
+            batch.append(r)
+        if batch:
+            await asyncio.gather(*(self._fire(r, now) for r in batch))
+        return len(batch)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                now = datetime.utcnow()
+                if now >= self._next_load:
+                    await self.load(now)
+                while await self.dispatch_due(now):
+                    now = datetime.utcnow()
+                delay = 60.0
+                if self._heap:
+                    delay = min(delay, (self._heap[0][0] - now).total_seconds())
+                if self.store is not None:
+                    delay = min(delay, (self._next_load - now).total_seconds())
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, delay))
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # 下一轮再试，不要把 app 搞挂
+                print(f"⚠️  reminder engine failed: {e}")
+                await asyncio.sleep(5)
+
+    def snapshot(self) -> dict:
+        return {"pending_in_memory": len(self._live), "heap_size": len(self._heap), **self.stats}
+
+
+async def ensure_indexes(db) -> None:
+    await db.reminders.create_index([("status", ASCENDING), ("fire_at", ASCENDING)])
+    await db.reminders.create_index([("task_id", ASCENDING)])
+
+
+# 进程内唯一的 engine：startup 的时候 start(db) 接上 Mongo
+ENGINE = ReminderEngine()
+metrics.register("reminders", lambda: ENGINE.snapshot())
+
+
+async def start(db, sink: Optional[Sink] = None) -> asyncio.Task:
+    await ensure_indexes(db)
+    ENGINE.store = db.reminders
+    if sink is not None:
+        ENGINE.sink = sink
+    return asyncio.create_task(ENGINE.run())
+
+
+# ---------- hooks（tasks router 调；出错只 log，不影响 task 本身的 CRUD）----------
+async def on_task_saved(task) -> None:
+    try:
+        await ENGINE.schedule_task(task)
+    except Exception as e:
+        print(f"⚠️  reminder schedule failed for {task.flutter_id}: {e}")
+
+
+async def on_task_deleted(flutter_id: str) -> None:
+    try:
+        await ENGINE.unschedule_task(flutter_id)
+    except Exception as e:
+        print(f"⚠️  reminder unschedule failed for {flutter_id}: {e}")
@@ -0,0 +1,237 @@
+# app/logic/retention.py
+"""
+Retention + cold archive（settings.RETENTION_* / ARCHIVE_*）
+
+- TTL：raw events / mood_logs / stress_risk_scores 过了 retention 天数由 MongoDB 自己删
+  （standard layout = TTL index；time-series = collMod expireAfterSeconds）。0 = 永久保留。
+  TTL 不能删到 archive 还没做的日子：实际的 expiry = max(retention, checkpoint 往前 lookback 的那天 + 余量)，
+  每轮 archive 之后重新算（sync_retention）；还没 archive 过（旧库刚升级）就先暂停，不删
+- Archiver（后台 loop）：在过期之前，把「已经过去 ARCHIVE_AFTER_DAYS 天」的 raw 数据
+  压成 per-user per-day 的 summary bucket，写进 `events_archive`（zstd block compression）。
+  同一天重跑是幂等的（按 user_id + date upsert）。多个 worker 用 MongoLease 只让一个跑。
+  第一次从 events / mood_logs 里最早的那天开始；之后每轮 checkpoint 前 ARCHIVE_LOOKBACK_DAYS 天重做一次，
+  离线晚 sync 上来的 event 也会进 bucket
+- rollup_from_archive：raw 已经过期的日子，rollup 改从 bucket 算（长期分析照样能用）。
+"""
+from __future__ import annotations
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from app.config import settings
+from app.logic.event_store import EVENTS, MOODS, events, field, moods, q_events, q_moods, timeseries_enabled
+from app.utils.lease import MongoLease
+
+ARCHIVE = "events_archive"
+_STATE_ID = "events_archive"
+_TTL_PAUSED = 2**31 - 1     # TTL index expireAfterSeconds 的上限（~68 年）：index 留着，等于不删
+_TTL_MARGIN_DAYS = 2        # local_day 跟 UTC 差到 ±14h，再留一天
+NEGATIVE_MOODS = ["negative", "anxious", "tired"]
+
+
+def _day_range(day: date):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def raw_expired(day: date, today: Optional[date] = None) -> bool:
+    """这一天的 raw events 是不是已经（或马上）被 TTL 删掉了"""
+    days = settings.RETENTION_EVENTS_DAYS
+    if days <= 0:
+        return False
+    today = today or datetime.utcnow().date()
+    return (today - day).days >= days
+
+
+# ---------- TTL ----------
+def ttl_days(days: int, last_day: Optional[date], today: date) -> Optional[int]:
+    """实际给 TTL 的天数；None = 先别删（retention 关了 / archive 还没开始）"""
+    if days <= 0:
+        return None
+    if not settings.ARCHIVE_ENABLED:
+        return days
+    if last_day is None:
+        return None
+    # 还要 re-archive 的 lookback 那几天也不能删
+    return max(days, (today - last_day).days + settings.ARCHIVE_LOOKBACK_DAYS + _TTL_MARGIN_DAYS)
+
+
+async def _ensure_ttl_index(col, field_name: str, days: int, expire_days: Optional[int]) -> None:
+    name = f"ttl_{field_name}"
+    info = await col.index_information()
+    if days <= 0:
+        if name in info:
+            await col.drop_index(name)
+        return
+    if expire_days is None:
+        # 暂停：已经有的 index 改成「不会过期」，不 drop（重建 TTL index 要扫整个 collection）
+        if name in info and info[name].get("expireAfterSeconds") != _TTL_PAUSED:
+            await col.database.command({"collMod": col.name, "index": {"name": name, "expireAfterSeconds": _TTL_PAUSED}})
+        return
+    seconds = expire_days * 86400
+    if name not in info:
+        await col.create_index([(field_name, ASCENDING)], name=name, expireAfterSeconds=seconds)
+    elif info[name].get("expireAfterSeconds") != seconds:
+        await col.database.command({"collMod": col.name, "index": {"name": name, "expireAfterSeconds": seconds}})
+
+
+async def _ensure_ts_expiry(col, expire_days: Optional[int]) -> None:
+    await col.database.command({"collMod": col.name, "expireAfterSeconds": expire_days * 86400 if expire_days else "off"})
+
+
+async def sync_retention(db, today: Optional[date] = None) -> None:
+    """按 archive checkpoint 设 TTL；启动时 + 每轮 archive 之后跑"""
+    today = today or datetime.utcnow().date()
+    state = await db.archive_state.find_one({"_id": _STATE_ID})
+    last_day = date.fromisoformat(state["last_day"]) if state and state.get("last_day") else None
+    ev_days, md_days, sc_days = (settings.RETENTION_EVENTS_DAYS, settings.RETENTION_MOODS_DAYS,
+                                 settings.RETENTION_SCORES_DAYS)
+    if timeseries_enabled():
+        await _ensure_ts_expiry(events(db), ttl_days(ev_days, last_day, today))
+        await _ensure_ts_expiry(moods(db), ttl_days(md_days, last_day, today))
+    else:
+        await _ensure_ttl_index(events(db), "ts", ev_days, ttl_days(ev_days, last_day, today))
+        await _ensure_ttl_index(moods(db), "ts", md_days, ttl_days(md_days, last_day, today))
+    # stress_risk_scores.ts 是 ISO string，TTL 用 created_at（Date）
+    await _ensure_ttl_index(db.stress_risk_scores, "created_at", sc_days, ttl_days(sc_days, last_day, today))
+
+
+async def ensure_retention(db) -> None:
+    await sync_retention(db)
+
+    try:
+        await db.create_collection(ARCHIVE, storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}})
+    except CollectionInvalid:
+        pass  # 已经有了
+    await db[ARCHIVE].create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True)
+
+
+# ---------- archive ----------
+async def archive_day(db, day: date) -> int:
+    """把某一天（各 user 的 local_day）所有 user 的 raw 数据压成 bucket；返回写了多少个 bucket"""
+    start, end = _day_range(day)
+    # 时区是 UTC-12 ~ UTC+14：ts 放宽前后一天走 ts index，再用 local_day 精确切
+    wide = {"$gte": start - timedelta(days=1), "$lt": end + timedelta(days=1)}
+    local_day = day.isoformat()
+    uid, etype = "$" + field(EVENTS, "user_id"), "$" + field(EVENTS, "type")
+    buckets: Dict[str, Dict[str, Any]] = {}
+
+    def bucket(user_id: str) -> Dict[str, Any]:
+        return buckets.setdefault(user_id, {
+            "user_id": user_id, "date": day.isoformat(), "events": {}, "late_night": 0,
+            "moods": {}, "stress": None,
+        })
+
+    ev = events(db).aggregate([
+        {"$match": q_events({"ts": wide, "local_day": local_day})},
+        {"$group": {
+            "_id": {"u": uid, "t": etype},
+            "n": {"$sum": 1},
+            "minutes": {"$sum": {"$ifNull": ["$context.minutes", 0]}},
+            "late": {"$sum": {"$cond": [{"$lte": ["$local_hour", 5]}, 1, 0]}},
+        }},
+    ])
+    async for r in ev:
+        b = bucket(r["_id"]["u"])
+        b["events"][r["_id"]["t"]] = {"n": r["n"], "minutes": r["minutes"]}
+        b["late_night"] += r["late"]
+
+    md = moods(db).aggregate([
+        {"$match": q_moods({"ts": wide, "local_day": local_day})},
+        {"$group": {"_id": {"u": "$" + field(MOODS, "user_id"), "l": "$" + field(MOODS, "label")}, "n": {"$sum": 1}}},
+    ])
+    async for r in md:
+        bucket(r["_id"]["u"])["moods"][r["_id"]["l"]] = r["n"]
+
+    # stress_risk_scores.ts 是 ISO string：字符串 range 一样能按天切（这个还是按 UTC 天）
+    sc = db.stress_risk_scores.aggregate([
+        {"$match": {"ts": {"$gte": start.isoformat(), "$lt": end.isoformat()}}},
+        {"$group": {"_id": "$user_id", "n": {"$sum": 1}, "avg": {"$avg": "$score"},
+                    "max": {"$max": "$score"}, "min": {"$min": "$score"}}},
+    ])
+    async for r in sc:
+        bucket(r["_id"])["stress"] = {"n": r["n"], "avg": round(r["avg"], 1), "max": r["max"], "min": r["min"]}
+
+    if not buckets:
+        return 0
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne({"user_id": u, "date": b["date"]}, {"$set": {**b, "archived_at": now}}, upsert=True)
+        for u, b in buckets.items()
+    ]
+    await db[ARCHIVE].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+async def _first_day(db) -> Optional[date]:
+    """events / mood_logs 里最早的那天（只有 mood 的 user、比第一条 event 早的 mood 也要 archive）"""
+    days = []
+    for col in (events(db), moods(db)):
+        first = await col.find({}, {"ts": 1}).sort("ts", 1).limit(1).to_list(1)
+        if first:
+            days.append(first[0]["ts"].date())
+    return min(days) if days else None
+
+
+async def archive_pending(db, today: Optional[date] = None) -> int:
+    """checkpoint 前 ARCHIVE_LOOKBACK_DAYS 天（重做）一直 archive 到 today - ARCHIVE_AFTER_DAYS"""
+    today = today or datetime.utcnow().date()
+    until = today - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+    state = await db.archive_state.find_one({"_id": _STATE_ID})
+    if state and state.get("last_day"):
+        last = date.fromisoformat(state["last_day"])
+        day = last + timedelta(days=1) - timedelta(days=settings.ARCHIVE_LOOKBACK_DAYS)
+    else:
+        last, day = None, await _first_day(db)
+        if day is None:
+            return 0
+
+    total = 0
+    while day <= until:
+        # raw 已经过期的日子不能重做：会用不完整的 raw 盖掉原来的 bucket
+        if last is None or day > last or not raw_expired(day, today):
+            total += await archive_day(db, day)
+            await db.archive_state.update_one(
+                {"_id": _STATE_ID}, {"$max": {"last_day": day.isoformat()}}, upsert=True
+            )
+        day += timedelta(days=1)
+    return total
+
+
+async def archiver_loop(db) -> None:
+    lease = MongoLease(db, "events_archive")   # 多个 worker 只让一个 archive
+    while True:
+        try:
+            if await lease.acquire():
+                n = await archive_pending(db)
+                if n:
+                    print(f"🗄️  archived {n} user-day buckets")
+                await sync_retention(db)
+        except asyncio.CancelledError:
+            await lease.release()
+            raise
+        except Exception as e:  # 下一轮再试，不要把 app 搞挂
+            print(f"⚠️  archiver failed: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_MINUTES * 60)
+
+
+# ---------- read side ----------
+async def rollup_from_archive(db, user_id: str, day: date) -> Optional[Dict[str, Any]]:
+    """raw 已过期：用 bucket 拼出 rollup_daily 里 events / moods 那部分字段"""
+    b = await db[ARCHIVE].find_one({"user_id": user_id, "date": day.isoformat()})
+    return archive_stats(b) if b else None
+
+
+def archive_stats(b: Dict[str, Any]) -> Dict[str, Any]:
+    ev = b.get("events", {})
+    return {
+        "overdue_count": ev.get("overdue", {}).get("n", 0),
+        "breaks_taken": ev.get("break_start", {}).get("n", 0),
+        "hydration_count": ev.get("hydrate", {}).get("n", 0),
+        "sleep_minutes": int(ev.get("sleep_log", {}).get("minutes", 0)),
+        "mood_negative_count": sum(b.get("moods", {}).get(l, 0) for l in NEGATIVE_MOODS),
+        "late_night_usage": b.get("late_night", 0),
+    }
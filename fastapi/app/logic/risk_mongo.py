@@ -1,21 +1,36 @@
 # app/logic/risk_mongo.py
 from datetime import datetime, timedelta, date
 from statistics import median
+from typing import List, Optional
 from bson.son import SON
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
 
-def _dt_range(day: date):
-    start = datetime.combine(day, datetime.min.time())
-    end = datetime.combine(day, datetime.max.time())
-    return start, end
+from app.logic.event_store import EVENTS, MOODS, collection_name, events, field, moods, q_events, q_moods
+from app.logic.pet_state import apply_score
+from app.logic.retention import ARCHIVE, NEGATIVE_MOODS, archive_stats, raw_expired, rollup_from_archive
+from app.logic.user_tz import get_user_timezone, local_day_bounds, local_today
+from app.utils.singleflight import SingleFlight
+
+# 同一个 user 同一天同时来的 rollup / risk 只算一次
+_ROLLUP_FLIGHT = SingleFlight("rollup_daily")
+_RISK_FLIGHT = SingleFlight("stress_score")
 
 async def rollup_daily(db, user_id: str, day: date):
-    start, end = _dt_range(day)
+    """day 是 user 的本地日期（local_day）"""
+    return await _ROLLUP_FLIGHT.do((user_id, day.isoformat()), lambda: _rollup_daily(db, user_id, day))
+
+async def _rollup_daily(db, user_id: str, day: date):
+    tz = await get_user_timezone(db, user_id)
+    # tasks / focus_sessions 还是按 UTC 时间存：本地一天换算成 UTC [start, end)
+    start, end = local_day_bounds(day, tz)
+    local_day = day.isoformat()
 
     # tasks completed + avg priority
     pipe_tasks = [
         {"$match": {
             "user_id": user_id,
-            "completed_at": {"$gte": start, "$lte": end}
+            "completed_at": {"$gte": start, "$lt": end}
         }},
         {"$group": {
             "_id": None,
@@ -27,51 +42,56 @@ async def rollup_daily(db, user_id: str, day: date):
     tasks_completed = (t[0]["count"] if t else 0)
     avg_priority = (t[0]["avg_prio"] if t else None)
 
-    # overdue_count (from events)
-    overdue_count = await db.events.count_documents({
-        "user_id": user_id, "type": "overdue", "ts": {"$gte": start, "$lte": end}
-    })
-
     # focus minutes
     f = await db.focus_sessions.aggregate([
-        {"$match": {"user_id": user_id, "started_at": {"$gte": start, "$lte": end}}},
+        {"$match": {"user_id": user_id, "started_at": {"$gte": start, "$lt": end}}},
         {"$group": {"_id": None, "m": {"$sum": {"$ifNull": ["$actual_minutes", 0]}}}}
     ]).to_list(1)
     focus_minutes = int(f[0]["m"]) if f else 0
 
+    # raw events / moods 已经过了 retention：改从 archive bucket 拿
+    archived = await rollup_from_archive(db, user_id, day) if raw_expired(day) else None
+    if archived is not None:
+        return await _save_rollup(db, user_id, day, {
+            "tasks_completed": tasks_completed,
+            "avg_priority_completed": avg_priority,
+            "total_focus_minutes": focus_minutes,
+            **archived,
+        })
+
+    # events / moods：ingest 时已经打好 local_day / local_hour，全部是 (user_id, local_day, ...) 的 index range
+    # overdue_count (from events)
+    overdue_count = await events(db).count_documents(q_events({
+        "user_id": user_id, "local_day": local_day, "type": "overdue"
+    }))
+
     # breaks, hydration
-    breaks_taken = await db.events.count_documents({
-        "user_id": user_id, "type": "break_start", "ts": {"$gte": start, "$lte": end}
-    })
-    hydration_count = await db.events.count_documents({
-        "user_id": user_id, "type": "hydrate", "ts": {"$gte": start, "$lte": end}
-    })
+    breaks_taken = await events(db).count_documents(q_events({
+        "user_id": user_id, "local_day": local_day, "type": "break_start"
+    }))
+    hydration_count = await events(db).count_documents(q_events({
+        "user_id": user_id, "local_day": local_day, "type": "hydrate"
+    }))
 
     # sleep minutes from events.context.minutes
-    s = await db.events.aggregate([
-        {"$match": {"user_id": user_id, "type": "sleep_log", "ts": {"$gte": start, "$lte": end}}},
+    s = await events(db).aggregate([
+        {"$match": q_events({"user_id": user_id, "local_day": local_day, "type": "sleep_log"})},
         {"$group": {"_id": None, "mins": {"$sum": {"$ifNull": ["$context.minutes", 0]}}}}
     ]).to_list(1)
     sleep_minutes = int(s[0]["mins"]) if s else 0
 
     # negative/anxious/tired mood count
-    mood_negative_count = await db.mood_logs.count_documents({
-        "user_id": user_id, "ts": {"$gte": start, "$lte": end},
+    mood_negative_count = await moods(db).count_documents(q_moods({
+        "user_id": user_id, "local_day": local_day,
         "label": {"$in": ["negative", "anxious", "tired"]}
-    })
+    }))
 
-    # late-night usage (events 00:00–05:59)
-    ln = await db.events.aggregate([
-        {"$match": {"user_id": user_id, "ts": {"$gte": start, "$lte": end}}},
-        {"$project": {"hour": {"$hour": "$ts"}}},
-        {"$match": {"hour": {"$gte": 0, "$lte": 5}}},
-        {"$count": "n"}
-    ]).to_list(1)
-    late_night_usage = (ln[0]["n"] if ln else 0)
+    # late-night usage (本地时间 00:00–05:59)
+    late_night_usage = await events(db).count_documents(q_events({
+        "user_id": user_id, "local_day": local_day, "local_hour": {"$lte": 5}
+    }))
 
-    doc = {
-        "user_id": user_id,
-        "date": day.isoformat(),
+    return await _save_rollup(db, user_id, day, {
         "tasks_completed": tasks_completed,
         "overdue_count": int(overdue_count),
         "avg_priority_completed": avg_priority,
@@ -81,7 +101,10 @@ async def rollup_daily(db, user_id: str, day: date):
         "sleep_minutes": sleep_minutes,
         "mood_negative_count": int(mood_negative_count),
         "late_night_usage": int(late_night_usage)
-    }
+    })
+
+async def _save_rollup(db, user_id: str, day: date, stats: dict):
+    doc = {"user_id": user_id, "date": day.isoformat(), **stats}
     await db.usage_stats_daily.update_one(
         {"user_id": user_id, "date": day.isoformat()},
         {"$set": doc},
@@ -89,16 +112,120 @@ async def rollup_daily(db, user_id: str, day: date):
     )
     return doc
 
+# ---------- range rollup ----------
+# 计数类字段：range pipeline 里每条 row 贡献 0/1（或分钟数），$group 时直接 $sum
+_SUM_FIELDS = (
+    "tasks_completed", "overdue_count", "total_focus_minutes", "breaks_taken",
+    "hydration_count", "sleep_minutes", "mood_negative_count", "late_night_usage",
+)
+
+def _range_branches(user_id: str, first: date, last: date, tz) -> dict:
+    """
+    每个 source 一段 pipeline，都 project 成 {d: local_day, <计数字段>...}
+    events / moods 直接用 ingest 时打好的 local_day；tasks / focus 存的是 UTC，用 $dateToString + timezone 换算
+    """
+    lo, hi = first.isoformat(), last.isoformat()
+    start, end = local_day_bounds(first, tz)[0], local_day_bounds(last, tz)[1]
+    etype = "$" + field(EVENTS, "type")
+
+    def is_type(t: str):
+        return {"$cond": [{"$eq": [etype, t]}, 1, 0]}
+
+    def local_day_of(path: str):
+        return {"$dateToString": {"format": "%Y-%m-%d", "date": path, "timezone": tz.key}}
+
+    return {
+        EVENTS: [
+            {"$match": q_events({"user_id": user_id, "local_day": {"$gte": lo, "$lte": hi}})},
+            {"$project": {
+                "_id": 0, "d": "$local_day",
+                "overdue_count": is_type("overdue"),
+                "breaks_taken": is_type("break_start"),
+                "hydration_count": is_type("hydrate"),
+                "sleep_minutes": {"$cond": [{"$eq": [etype, "sleep_log"]}, {"$ifNull": ["$context.minutes", 0]}, 0]},
+                "late_night_usage": {"$cond": [{"$lte": ["$local_hour", 5]}, 1, 0]},
+            }},
+        ],
+        MOODS: [
+            {"$match": q_moods({"user_id": user_id, "local_day": {"$gte": lo, "$lte": hi},
+                                "label": {"$in": NEGATIVE_MOODS}})},
+            {"$project": {"_id": 0, "d": "$local_day", "mood_negative_count": {"$literal": 1}}},
+        ],
+        "tasks": [
+            {"$match": {"user_id": user_id, "completed_at": {"$gte": start, "$lt": end}}},
+            {"$project": {"_id": 0, "d": local_day_of("$completed_at"),
+                          "tasks_completed": {"$literal": 1}, "priority": 1}},
+        ],
+        "focus_sessions": [
+            {"$match": {"user_id": user_id, "started_at": {"$gte": start, "$lt": end}}},
+            {"$project": {"_id": 0, "d": local_day_of("$started_at"),
+                          "total_focus_minutes": {"$ifNull": ["$actual_minutes", 0]}}},
+        ],
+    }
+
+def _range_pipeline(user_id: str, first: date, last: date, tz) -> list:
+    """events 为主，$unionWith moods / tasks / focus_sessions，最后按 local day 一次 $group（MongoDB 4.4+）"""
+    b = _range_branches(user_id, first, last, tz)
+    return [
+        *b[EVENTS],
+        {"$unionWith": {"coll": collection_name(MOODS), "pipeline": b[MOODS]}},
+        {"$unionWith": {"coll": "tasks", "pipeline": b["tasks"]}},
+        {"$unionWith": {"coll": "focus_sessions", "pipeline": b["focus_sessions"]}},
+        {"$group": {
+            "_id": "$d",
+            **{f: {"$sum": "$" + f} for f in _SUM_FIELDS},
+            "avg_priority_completed": {"$avg": "$priority"},   # 只有 task row 有 priority
+        }},
+    ]
+
+async def rollup_range(db, user_id: str, first: date, last: date) -> List[dict]:
+    """
+    [first, last]（user 的本地日期，含两端）每天一条 rollup：一个 aggregation 算完，一次 bulk_write upsert。
+    没数据的日子也会写一条全 0 的，这样 usage_stats_daily 里不会有空洞。
+    """
+    if last < first:
+        first, last = last, first
+    tz = await get_user_timezone(db, user_id)
+    rows = {r["_id"]: r async for r in events(db).aggregate(_range_pipeline(user_id, first, last, tz))}
+
+    days = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    # raw events / moods 已经过了 retention 的日子：那部分字段从 archive bucket 拿
+    expired = [d.isoformat() for d in days if raw_expired(d)]
+    archived = {}
+    if expired:
+        async for b in db[ARCHIVE].find({"user_id": user_id, "date": {"$in": expired}}):
+            archived[b["date"]] = archive_stats(b)
+
+    out = []
+    for d in days:
+        r = rows.get(d.isoformat(), {})
+        stats = {f: int(r.get(f) or 0) for f in _SUM_FIELDS}
+        stats["avg_priority_completed"] = r.get("avg_priority_completed")
+        stats.update(archived.get(d.isoformat(), {}))
+        out.append({"user_id": user_id, "date": d.isoformat(), **stats})
+
+    await db.usage_stats_daily.bulk_write([
+        UpdateOne({"user_id": user_id, "date": doc["date"]}, {"$set": doc}, upsert=True)
+        for doc in out
+    ], ordered=False)
+    return out
+
 async def _overdue_streak(db, user_id: str, until_day: date, max_days=7):
     # get last 7 days rollups
     days = [(until_day - timedelta(days=i)).isoformat() for i in range(max_days)]
-    rows = await db.usage_stats_daily.find(
+    rows = {r["date"]: r for r in await db.usage_stats_daily.find(
         {"user_id": user_id, "date": {"$in": days}}
-    ).sort("date", -1).to_list(length=max_days)
+    ).to_list(length=max_days)}
+
+    # 没 rollup 过的日子先一次补齐，不然空洞会被当成「没 overdue」或者直接跳过
+    missing = [d for d in days if d not in rows]
+    if missing:
+        filled = await rollup_range(db, user_id, date.fromisoformat(min(missing)), date.fromisoformat(max(missing)))
+        rows.update({r["date"]: r for r in filled})
 
     streak = 0
-    for r in rows:
-        if r.get("overdue_count",0) > 0:
+    for d in days:   # 从 until_day 往回数
+        if rows.get(d, {}).get("overdue_count", 0) > 0:
             streak += 1
         else:
             break
@@ -110,8 +237,13 @@ def choose_pet_reaction(score: float) -> str:
     return "idle"
 
 async def compute_stress_score(db, user_id: str, window: str = "daily"):
+    day = local_today(await get_user_timezone(db, user_id))
+    return await _RISK_FLIGHT.do(
+        (user_id, day.isoformat(), window), lambda: _compute_stress_score(db, user_id, day, window)
+    )
+
+async def _compute_stress_score(db, user_id: str, day: date, window: str = "daily"):
     now = datetime.utcnow()
-    day = now.date()
     today = await rollup_daily(db, user_id, day)
 
     signals = {}
@@ -145,6 +277,7 @@ async def compute_stress_score(db, user_id: str, window: str = "daily"):
     doc = {
         "user_id": user_id,
         "ts": now.isoformat(),
+        "created_at": now,          # Date 类型，给 TTL index 用
         "window": window,
         "score": score,
         "signals": signals,
@@ -157,58 +290,99 @@ async def compute_stress_score(db, user_id: str, window: str = "daily"):
         )
     }
     res = await db.stress_risk_scores.insert_one(doc)
+    # pets 里的 reaction / mood 跟着更新（reaction 变了会 push）
+    await apply_score(db, user_id, score, reaction)
     return {
         "score": score,
         "signals": signals,
         "id": str(res.inserted_id),   # 可选
         # 不返回 "_id"
     }
-    # (optional) also update pet mood/energy
-    #await db.pets.update_one({"user_id": user_id}, {"$set": {"mood": "concerned" if score>=70 else ("happy" if score<40 else "idle")}}, upsert=True)
-    #return doc
 
 
 
-async def recommend_new_due_date(db, user_id: str, task_id: str):
-    task = await db.tasks.find_one({"task_id": task_id, "user_id": user_id})
-    if not task or not task.get("due_date"):
-        return None
+# ---------- due-date recommendation ----------
+def _as_dt(v):
+    return datetime.fromisoformat(v.replace("Z", "")) if isinstance(v, str) else v
 
-    # look at user's completed tasks in same (category, priority)
-    cursor = db.tasks.find({
-        "user_id": user_id,
-        "category": task.get("category"),
-        "priority": task.get("priority"),
-        "completed_at": {"$ne": None},
-        "due_date": {"$ne": None}
-    }, {"completed_at": 1, "due_date": 1}).limit(200)
-
-    delays = []
-    async for t in cursor:
-        try:
-            completed = t["completed_at"]
-            if isinstance(completed, str): completed = datetime.fromisoformat(completed.replace("Z",""))
-            due = t["due_date"]
-            if isinstance(due, str): due = datetime.fromisoformat(due)
-            d = (completed.date() - due.date()).days
-            if d > 0:
-                delays.append(d)
-        except Exception:
-            continue
-
-    if not delays:
-        return None
+def _lateness_pipeline(user_id: str, groups: Optional[List[dict]] = None, exact: bool = False) -> list:
+    """
+    完成的 task 按 (category, priority) 分组，server-side 算「迟了几天」的 median。
+    due_date / completed_at 有 Date 也有 ISO string：$convert 统一成 Date，解析不了的当 null 丢掉。
+    exact=True 给不支持 $median（< 7.0）的 server：只 $push，median 在 Python 算；
+    迟了几天也不用 $dateDiff（5.0+），用 $toLong 的 ms 算（4.0 就有）。
+    """
+    match = {"user_id": user_id, "completed_at": {"$ne": None}, "due_date": {"$ne": None}}
+    if groups:
+        match["$or"] = groups
+    to_date = lambda f: {"$convert": {"input": f, "to": "date", "onError": None, "onNull": None}}
+    if exact:
+        # $dateDiff 也要 5.0：fallback 用 ms 算，每边先 floor 到 UTC 的天，跟 $dateDiff unit=day 一样数跨了几个午夜
+        utc_day = lambda f: {"$floor": {"$divide": [{"$toLong": to_date(f)}, 86_400_000]}}
+        late_days = {"$subtract": [utc_day("$completed_at"), utc_day("$due_date")]}
+        late = {"$push": "$late"}
+    else:
+        late_days = {"$dateDiff": {"startDate": to_date("$due_date"), "endDate": to_date("$completed_at"), "unit": "day"}}
+        late = {"$median": {"input": "$late", "method": "approximate"}}
+    return [
+        {"$match": match},
+        {"$project": {"category": 1, "priority": 1, "late": late_days}},
+        {"$match": {"late": {"$gt": 0}}},
+        {"$group": {"_id": {"category": "$category", "priority": "$priority"}, "late": late}},
+    ]
+
+async def _median_lateness(db, user_id: str, groups: Optional[List[dict]] = None) -> dict:
+    """{(category, priority): median 迟交天数}，只有真的迟交过的组才在里面"""
+    try:
+        rows = await db.tasks.aggregate(_lateness_pipeline(user_id, groups)).to_list(None)
+    except OperationFailure:
+        rows = await db.tasks.aggregate(_lateness_pipeline(user_id, groups, exact=True)).to_list(None)
+        rows = [{**r, "late": median(r["late"])} for r in rows]
+    return {(r["_id"].get("category"), r["_id"].get("priority")): r["late"] for r in rows if r["late"] is not None}
 
-    med_delay = int(median(delays))
+def _suggest(task: dict, med_delay) -> Optional[dict]:
+    med_delay = int(med_delay)
     pull_forward = min(3, max(1, med_delay))
     # task['due_date'] might be string date
-    due = task["due_date"]
-    if isinstance(due, str): due = datetime.fromisoformat(due)
+    try:
+        due = _as_dt(task["due_date"])
+    except (TypeError, ValueError):
+        return None
     suggested = (due - timedelta(days=pull_forward)).date().isoformat()
-
     return {
-        "task_id": task_id,
+        "task_id": task.get("task_id"),
         "current_due": task["due_date"],
         "suggested_due": suggested,
         "reason": f"median lateness {med_delay}d → pulling {pull_forward}d earlier"
     }
+
+async def recommend_new_due_date(db, user_id: str, task_id: str):
+    task = await db.tasks.find_one({"task_id": task_id, "user_id": user_id})
+    if not task or not task.get("due_date"):
+        return None
+
+    # look at user's completed tasks in same (category, priority)
+    key = (task.get("category"), task.get("priority"))
+    lateness = await _median_lateness(db, user_id, [{"category": key[0], "priority": key[1]}])
+    if key not in lateness:
+        return None
+    return _suggest(task, lateness[key])
+
+async def recommend_due_dates(db, user_id: str) -> List[dict]:
+    """所有还没完成、有 due_date 的 task 一次出建议：一个 find + 一个 aggregation"""
+    open_tasks = await db.tasks.find(
+        {"user_id": user_id, "completed_at": None, "due_date": {"$ne": None}},
+        {"task_id": 1, "category": 1, "priority": 1, "due_date": 1},
+    ).to_list(None)
+    if not open_tasks:
+        return []
+    groups = {(t.get("category"), t.get("priority")) for t in open_tasks}
+    lateness = await _median_lateness(db, user_id, [{"category": c, "priority": p} for c, p in groups])
+
+    out = []
+    for t in open_tasks:
+        med = lateness.get((t.get("category"), t.get("priority")))
+        s = _suggest(t, med) if med is not None else None
+        if s:
+            out.append(s)
+    return out
@@ -0,0 +1,101 @@
+# app/logic/scheduler.py
+"""
+Nightly rollup scheduler（settings.SCHEDULER_*）
+
+原本 rollup 只在 user 打 /wellbeing/rollup 或 /wellbeing/risk 的时候才算，
+当天第一个 request 要付全部的钱。现在后台每 SCHEDULER_INTERVAL_MINUTES 看一次：
+
+- active users = 最近 SCHEDULER_ACTIVE_DAYS 天有 event / 完成过 task 的 user_id
+- 每个 user 的目标 = 他本地的「昨天」（本地午夜一过就轮到他）
+- checkpoint 在 `rollup_checkpoints`（_id = user_id, last_day）：重启之后从断点继续，
+  停机太久最多往回补 SCHEDULER_CATCHUP_DAYS 天（rollup_range 一次 aggregation 补完）
+- SCHEDULER_CONCURRENCY 个 user 同时跑
+- 多个 gunicorn worker 都会起这个 loop，但只有拿到 MongoLease("nightly_rollup") 的那个会真的跑
+"""
+from __future__ import annotations
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Optional, Set
+
+from app.config import settings
+from app.logic.event_store import EVENTS, events, field, q_events
+from app.logic.risk_mongo import rollup_range
+from app.logic.user_tz import get_user_timezone, local_today
+from app.utils import metrics
+from app.utils.lease import MongoLease
+
+_stats = {"runs": 0, "users_rolled": 0, "days_rolled": 0, "errors": 0, "last_run": None, "last_duration_s": None}
+metrics.register("scheduler", lambda: dict(_stats))
+
+
+async def active_users(db, now: Optional[datetime] = None) -> Set[str]:
+    since = (now or datetime.utcnow()) - timedelta(days=settings.SCHEDULER_ACTIVE_DAYS)
+    users = set(await events(db).distinct(field(EVENTS, "user_id"), q_events({"ts": {"$gte": since}})))
+    users |= set(await db.tasks.distinct("user_id", {"completed_at": {"$gte": since}}))
+    return {u for u in users if u}
+
+
+async def _roll_user(db, user_id: str) -> int:
+    """把这个 user 补到本地昨天；返回 rollup 了几天（0 = 已经是最新）"""
+    target = local_today(await get_user_timezone(db, user_id)) - timedelta(days=1)
+    ckpt = await db.rollup_checkpoints.find_one({"_id": user_id})
+    earliest = target - timedelta(days=settings.SCHEDULER_CATCHUP_DAYS - 1)
+    first = max(date.fromisoformat(ckpt["last_day"]) + timedelta(days=1), earliest) if ckpt else target
+    if first > target:
+        return 0
+    await rollup_range(db, user_id, first, target)
+    await db.rollup_checkpoints.update_one(
+        {"_id": user_id},
+        {"$set": {"last_day": target.isoformat(), "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    return (target - first).days + 1
+
+
+async def run_once(db, lease: Optional[MongoLease] = None) -> int:
+    """跑一轮：所有到点的 active user；返回处理了几个 user"""
+    started = datetime.utcnow()
+    sem = asyncio.Semaphore(settings.SCHEDULER_CONCURRENCY)
+    stop = asyncio.Event()
+    rolled = 0
+
+    async def one(user_id: str):
+        nonlocal rolled
+        async with sem:
+            if stop.is_set():
+                return
+            if lease is not None and not await lease.keep_alive():
+                stop.set()   # lease 被别的 worker 拿走了：剩下的交给它
+                return
+            try:
+                n = await _roll_user(db, user_id)
+            except Exception as e:  # 一个 user 出错不影响其他人，下一轮再试
+                _stats["errors"] += 1
+                print(f"⚠️  nightly rollup failed for {user_id}: {e}")
+                return
+            if n:
+                rolled += 1
+                _stats["days_rolled"] += n
+
+    await asyncio.gather(*(one(u) for u in await active_users(db, started)))
+    _stats["runs"] += 1
+    _stats["users_rolled"] += rolled
+    _stats["last_run"] = started.isoformat()
+    _stats["last_duration_s"] = round((datetime.utcnow() - started).total_seconds(), 3)
+    return rolled
+
+
+async def scheduler_loop(db) -> None:
+    lease = MongoLease(db, "nightly_rollup")
+    while True:
+        try:
+            if await lease.acquire():
+                n = await run_once(db, lease)
+                if n:
+                    print(f"🌙 nightly rollup: {n} users")
+        except asyncio.CancelledError:
+            await lease.release()
+            raise
+        except Exception as e:  # 下一轮再试，不要把 app 搞挂
+            print(f"⚠️  scheduler failed: {e}")
+        await asyncio.sleep(settings.SCHEDULER_INTERVAL_MINUTES * 60)
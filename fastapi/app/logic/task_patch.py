@@ -0,0 +1,116 @@
+# app/logic/task_patch.py
+"""
+JSON merge patch（RFC 7396）-> 最小的 Mongo update。
+
+PUT /tasks/{id} 要整个 Task 再 $set 整份 model_dump；勾一个 subtask 也要重送 / 重写全部字段。
+PATCH 只送改了的：
+
+    {"status": "completed", "notify": {"remindOnDue": false}, "description": null}
+    -> {"$set": {"status": "completed", "notify.remindOnDue": false, "updatedAt": ...},
+        "$unset": {"description": ""}}
+
+- 嵌套 object（notify / focusPrefs）递归成 dotted path，只动送来的 key
+- list（tags / subtasks）整个替换；单个 subtask 用 subtask_set / subtask_inc_focus（positional $）
+- null = 删掉这个字段（RFC 7396）；有 default 的字段删掉之后读回来就是 default
+- 每个值都按 Task 的字段类型 validate（TypeAdapter），不认识 / 不能改的字段 -> PatchError
+"""
+from __future__ import annotations
+from datetime import datetime
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from app.models.models import SubTask, Task
+
+IMMUTABLE = frozenset({"id", "flutter_id", "user_email", "createdAt", "updatedAt", "revision_id"})
+# 改了这些要重算 reminder（见 app/logic/reminders.py）
+SCHEDULE_FIELDS = frozenset({"dueDateTime", "startDate", "dueDate", "timezone", "notify", "status"})
+
+
+class PatchError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _adapter(model: Type[BaseModel], name: str) -> TypeAdapter:
+    return TypeAdapter(model.model_fields[name].annotation)
+
+
+def _nested_model(model: Type[BaseModel], name: str) -> Optional[Type[BaseModel]]:
+    ann = model.model_fields[name].annotation
+    return ann if isinstance(ann, type) and issubclass(ann, BaseModel) else None
+
+
+def to_mongo(v: Any) -> Any:
+    """validate 完的值 -> Motor 能存的（Enum -> value，model -> dict）"""
+    if isinstance(v, Enum):
+        return v.value
+    if isinstance(v, BaseModel):
+        return {k: to_mongo(x) for k, x in v.model_dump().items()}
+    if isinstance(v, list):
+        return [to_mongo(x) for x in v]
+    if isinstance(v, dict):
+        return {k: to_mongo(x) for k, x in v.items()}
+    return v
+
+
+def _walk(model: Type[BaseModel], patch: Dict[str, Any], prefix: str,
+          sets: Dict[str, Any], unsets: Dict[str, str], immutable=frozenset()) -> None:
+    for key, value in patch.items():
+        if key in immutable:
+            raise PatchError(f"'{prefix}{key}' cannot be changed")
+        if key not in model.model_fields:
+            raise PatchError(f"Unknown field '{prefix}{key}'")
+        path = prefix + key
+        if value is None:
+            if model.model_fields[key].is_required():
+                raise PatchError(f"'{path}' is required and cannot be removed")
+            unsets[path] = ""
+            continue
+        nested = _nested_model(model, key)
+        if nested is not None and isinstance(value, dict):
+            _walk(nested, value, path + ".", sets, unsets)
+            continue
+        try:
+            sets[path] = to_mongo(_adapter(model, key).validate_python(value))
+        except ValidationError as e:
+            raise PatchError(f"Invalid value for '{path}': {e.errors()[0]['msg']}") from None
+
+
+def merge_patch(patch: Dict[str, Any], now: Optional[datetime] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """回 (update document, 摊平之后改到的字段)；update 里一定带 updatedAt"""
+    if not isinstance(patch, dict) or not patch:
+        raise PatchError("Patch must be a non-empty JSON object")
+    sets: Dict[str, Any] = {}
+    unsets: Dict[str, str] = {}
+    _walk(Task, patch, "", sets, unsets, IMMUTABLE)
+    changed = {**sets, **unsets}
+    sets["updatedAt"] = now or datetime.now()
+    update: Dict[str, Any] = {"$set": sets}
+    if unsets:
+        update["$unset"] = unsets
+    return update, changed
+
+
+def touches_schedule(changed: Dict[str, Any]) -> bool:
+    return any(path.split(".", 1)[0] in SCHEDULE_FIELDS for path in changed)
+
+
+# ---------- subtask（positional $：filter 里要有 "subtasks.id"） ----------
+def subtask_set(patch: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    if not isinstance(patch, dict) or not patch:
+        raise PatchError("Patch must be a non-empty JSON object")
+    sets: Dict[str, Any] = {}
+    unsets: Dict[str, str] = {}
+    _walk(SubTask, patch, "subtasks.$.", sets, unsets, frozenset({"id"}))
+    sets["updatedAt"] = now or datetime.now()
+    update: Dict[str, Any] = {"$set": sets}
+    if unsets:
+        update["$unset"] = unsets
+    return update
+
+
+def subtask_inc_focus(minutes: int, now: Optional[datetime] = None) -> Dict[str, Any]:
+    return {"$inc": {"subtasks.$.focusMinutesSpent": int(minutes)}, "$set": {"updatedAt": now or datetime.now()}}
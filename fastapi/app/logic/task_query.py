@@ -0,0 +1,147 @@
+# app/logic/task_query.py
+"""
+GET /tasks/query 的 filter / sort / index。
+
+以前只有 GET /tasks/{email} 整包拉下来，app 自己在手机上按 status / category / tags / due 过滤。
+现在过滤、排序、分页都在 Mongo 做，而且每一种 filter 组合都要走 index（不能 COLLSCAN）：
+
+    flt, sort = build_query(user_email, status=["notStarted", "inProgress"], tags=["school"],
+                            due_from=..., due_to=..., sort="due")
+
+index 按 ESR（Equality -> Sort -> Range）挑的，每条都以 user_email 开头：
+- (user_email, dueDateTime)                只有 user / due 范围 / 按 due 排
+- (user_email, status, dueDateTime)        status 集合（$in 在 index 上做 SORT_MERGE，不用内存排序）
+- (user_email, category, dueDateTime)
+- (user_email, tags, dueDateTime)          multikey；多个 tag 是 $all，index 扫第一个
+- (user_email, dueDate)                    ranged task 的 due 在 dueDate（$or 的第二支）
+- (user_email, title: text)                ?q= 标题搜索（$text 的 equality prefix）
+priority 只有 4 个值，不单独建 index：在上面任何一条的 IXSCAN 之后 FETCH 时过滤。
+
+改了 filter / index 之后跑一遍（要连真的 Mongo）：
+
+    python -m app.tools.explain_task_queries
+"""
+from __future__ import annotations
+from datetime import datetime
+from itertools import combinations
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+
+from app.models.models import PriorityLevel, TaskStatus
+
+TASK_QUERY_INDEXES = [
+    IndexModel([("user_email", ASCENDING), ("dueDateTime", ASCENDING)], name="q_user_due"),
+    IndexModel([("user_email", ASCENDING), ("status", ASCENDING), ("dueDateTime", ASCENDING)], name="q_user_status_due"),
+    IndexModel([("user_email", ASCENDING), ("category", ASCENDING), ("dueDateTime", ASCENDING)], name="q_user_category_due"),
+    IndexModel([("user_email", ASCENDING), ("tags", ASCENDING), ("dueDateTime", ASCENDING)], name="q_user_tags_due"),
+    IndexModel([("user_email", ASCENDING), ("dueDate", ASCENDING)], name="q_user_rangedue"),
+    IndexModel([("user_email", ASCENDING), ("title", TEXT)], name="q_user_title_text", default_language="none"),
+]
+
+# ?sort= -> Mongo sort（最后都带 _id，分页才稳定）
+SORTS: Dict[str, List[Tuple[str, int]]] = {
+    "due": [("dueDateTime", ASCENDING), ("_id", ASCENDING)],
+    "-due": [("dueDateTime", DESCENDING), ("_id", DESCENDING)],
+    "created": [("createdAt", ASCENDING), ("_id", ASCENDING)],
+    "-created": [("createdAt", DESCENDING), ("_id", DESCENDING)],
+    "updated": [("updatedAt", ASCENDING), ("_id", ASCENDING)],
+    "-updated": [("updatedAt", DESCENDING), ("_id", DESCENDING)],
+}
+MAX_LIMIT = 200
+
+_STATUSES = frozenset(s.value for s in TaskStatus)
+_PRIORITIES = frozenset(p.value for p in PriorityLevel)
+
+
+class QueryError(ValueError):
+    pass
+
+
+async def ensure_indexes(db) -> None:
+    await db.tasks.create_indexes(TASK_QUERY_INDEXES)
+
+
+def split_csv(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+def _one_of(name: str, values: Sequence[str], allowed: frozenset) -> List[str]:
+    bad = [v for v in values if v not in allowed]
+    if bad:
+        raise QueryError(f"Unknown {name}: {', '.join(bad)} (expected one of {', '.join(sorted(allowed))})")
+    return list(dict.fromkeys(values))
+
+
+def _in(values: List[str]) -> Any:
+    return values[0] if len(values) == 1 else {"$in": values}
+
+
+def build_query(
+    user_email: str,
+    *,
+    status: Sequence[str] = (),
+    category: Optional[str] = None,
+    tags: Sequence[str] = (),
+    priority: Sequence[str] = (),
+    due_from: Optional[datetime] = None,
+    due_to: Optional[datetime] = None,
+    q: Optional[str] = None,
+    sort: str = "due",
+) -> Tuple[Dict[str, Any], List[Tuple[str, Any]]]:
+    """回 (filter, sort)；参数不对 -> QueryError"""
+    if sort not in SORTS:
+        raise QueryError(f"Unknown sort '{sort}' (expected one of {', '.join(SORTS)})")
+    if due_from and due_to and due_from > due_to:
+        raise QueryError("due_from must be before due_to")
+
+    flt: Dict[str, Any] = {"user_email": user_email}
+    if status:
+        flt["status"] = _in(_one_of("status", status, _STATUSES))
+    if category:
+        flt["category"] = category
+    if tags:
+        tags = list(dict.fromkeys(tags))
+        flt["tags"] = tags[0] if len(tags) == 1 else {"$all": tags}
+    if priority:
+        flt["priority"] = _in(_one_of("priority", priority, _PRIORITIES))
+    if due_from or due_to:
+        rng: Dict[str, datetime] = {}
+        if due_from:
+            rng["$gte"] = due_from
+        if due_to:
+            rng["$lt"] = due_to
+        # singleDay 的 due 在 dueDateTime，ranged 的在 dueDate：两支各自有 (user_email, ...) index
+        flt["$or"] = [{"dueDateTime": rng}, {"dueDate": rng}]
+
+    order: List[Tuple[str, Any]] = list(SORTS[sort])
+    if q and q.strip():
+        flt["$text"] = {"$search": q.strip()}
+    return flt, order
+
+
+# ---------- explain 用：所有支持的 filter 组合 ----------
+_SAMPLE = {
+    "status": ["notStarted", "inProgress"],
+    "category": "study",
+    "tags": ["school"],
+    "priority": ["high", "urgent"],
+    "due_from": datetime(2025, 1, 1),
+    "due_to": datetime(2025, 2, 1),
+    "q": "report",
+}
+_FILTERS = ("status", "category", "tags", "priority", "due", "q")
+
+
+def filter_combinations() -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(名字, build_query 的 kwargs)：6 种 filter 的每个子集 x 每种 sort"""
+    for n in range(len(_FILTERS) + 1):
+        for combo in combinations(_FILTERS, n):
+            kwargs: Dict[str, Any] = {}
+            for f in combo:
+                if f == "due":
+                    kwargs["due_from"], kwargs["due_to"] = _SAMPLE["due_from"], _SAMPLE["due_to"]
+                else:
+                    kwargs[f] = _SAMPLE[f]
+            for sort in SORTS:
+                yield f"{'+'.join(combo) or 'user only'} sort={sort}", {**kwargs, "sort": sort}
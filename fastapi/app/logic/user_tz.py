@@ -0,0 +1,73 @@
+# app/logic/user_tz.py
+"""
+User timezone + local day/hour。
+
+- 时区存在 users.preferences.timezone（IANA 名字，比如 "Asia/Kuala_Lumpur"），没有就用 DEFAULT_TIMEZONE
+- events / moods 在 ingest 的时候按「当时」的时区打上 local_day / local_hour，
+  以后改时区不用改历史：旧数据还是按当时的本地时间算
+- rollup 用 local_day 等值查询（index range），不再按 UTC 切天；没有 local_day 的旧数据
+  启动时先补（event_store.ensure_local_time）
+"""
+from __future__ import annotations
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from bson import ObjectId
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.cache import LRUCache
+
+_tz_cache: LRUCache[ZoneInfo] = LRUCache(maxsize=10_000, ttl=600)
+metrics.register("user_tz_cache", _tz_cache.snapshot)
+
+
+def zone(name: str | None) -> ZoneInfo:
+    try:
+        return ZoneInfo(name or settings.DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.DEFAULT_TIMEZONE)
+
+
+def user_filter(user_id: str) -> dict:
+    """events 里的 user_id 可能是 users._id 的字符串，也可能是 email"""
+    return {"_id": ObjectId(user_id)} if ObjectId.is_valid(user_id) else {"email": user_id}
+
+
+async def get_user_timezone(db, user_id: str) -> ZoneInfo:
+    tz = _tz_cache.get(user_id)
+    if tz is None:
+        u = await db.users.find_one(user_filter(user_id), {"preferences.timezone": 1})
+        tz = zone(((u or {}).get("preferences") or {}).get("timezone"))
+        _tz_cache.set(user_id, tz)
+    return tz
+
+
+async def set_user_timezone(db, user_id: str, name: str) -> ZoneInfo:
+    tz = ZoneInfo(name)  # 不合法直接抛 ZoneInfoNotFoundError，route 转成 422
+    await db.users.update_one(user_filter(user_id), {"$set": {"preferences.timezone": name}})
+    _tz_cache.set(user_id, tz)
+    return tz
+
+
+def _as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def local_fields(ts: datetime, tz: ZoneInfo) -> Dict[str, object]:
+    """ts（naive 当作 UTC）-> {"local_day": "YYYY-MM-DD", "local_hour": 0-23}"""
+    local = _as_utc(ts).astimezone(tz)
+    return {"local_day": local.date().isoformat(), "local_hour": local.hour}
+
+
+def local_today(tz: ZoneInfo) -> date:
+    return datetime.now(tz).date()
+
+
+def local_day_bounds(day: date, tz: ZoneInfo) -> Tuple[datetime, datetime]:
+    """本地的一天 -> UTC naive [start, end)，给还是按 ts 查询的 collection 用（tasks / focus_sessions）"""
+    start = datetime.combine(day, datetime.min.time(), tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), datetime.min.time(), tzinfo=tz)
+    return (start.astimezone(timezone.utc).replace(tzinfo=None),
+            end.astimezone(timezone.utc).replace(tzinfo=None))
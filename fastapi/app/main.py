@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -6,11 +8,16 @@ from dotenv import load_dotenv
 load_dotenv(override=True)
 
 
+from .config import settings
 from .db import init_db
+from .logic.retention import archiver_loop
+from .logic.scheduler import scheduler_loop
+from .logic import leaderboard, push as push_bus, reminders
 from app.routers.pet_ai import router as pet_ai_router
 from .routers import tasks, wellbeing, ai, auth, health_productivity
 from .schemas.response import Envelope
-from app.routers import balance
+from app.routers import balance, export, leaderboard as leaderboard_router, metrics, pet, push
+from app.utils.compression import CompressionMiddleware
 
 app = FastAPI(
     title="DoDoTask Backend", 
@@ -25,6 +32,7 @@ async def http_exc_handler(_: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
         content=Envelope(status=exc.status_code, message=str(exc.detail), data=None).model_dump(),
+        headers=getattr(exc, "headers", None),  # e.g. Retry-After / WWW-Authenticate
     )
 
 @app.exception_handler(RequestValidationError)
@@ -34,6 +42,16 @@ async def validation_exc_handler(_: Request, exc: RequestValidationError):
         content=Envelope(status=422, message="Validation error", data=exc.errors()).model_dump(),
     )
 
+# ---Compression (gzip / brotli by Accept-Encoding)---
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    offload_size=settings.COMPRESSION_OFFLOAD_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    brotli_enabled=settings.COMPRESSION_BROTLI_ENABLED,
+)
+
 # ---CORS---
 app.add_middleware(
     CORSMiddleware,
@@ -43,9 +61,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+_background: list[asyncio.Task] = []
+
 @app.on_event("startup")
 async def _startup():
-    await init_db()
+    db = await init_db()
+    if settings.ARCHIVE_ENABLED:
+        _background.append(asyncio.create_task(archiver_loop(db)))
+    if settings.SCHEDULER_ENABLED:
+        _background.append(asyncio.create_task(scheduler_loop(db)))
+    if settings.REMINDERS_ENABLED:
+        _background.append(await reminders.start(db))
+    if settings.LEADERBOARD_RANK_INDEX:
+        _background.append(await leaderboard.start(db))
+    bus = await push_bus.start(db)
+    if bus is not None:
+        _background.append(bus)
+
+@app.on_event("shutdown")
+async def _shutdown():
+    for t in _background:
+        t.cancel()
 
 app.include_router(pet_ai_router)
 app.include_router(tasks.router)      # NEW: create/complete tasks (+event logs)
@@ -54,6 +90,11 @@ app.include_router(ai.router)         # chat with AI
 app.include_router(auth.router)         # chat with AI
 app.include_router(health_productivity.router)  # health and productivity endpoints
 app.include_router(balance.router)    # balance and spend coins endpoints
+app.include_router(metrics.router)    # in-process counters (admission, single-flight, ...)
+app.include_router(export.router)     # NDJSON export of a user's data
+app.include_router(push.router)       # WebSocket /ws: coins / pet / task push
+app.include_router(pet.router)        # GET /pet/state
+app.include_router(leaderboard_router.router)  # coins leaderboard: global + friend groups
 @app.get("/")
 async def root():
     return {"message": "Backend is alive 🎉"}
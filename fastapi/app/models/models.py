@@ -97,4 +97,19 @@ class Task(Document):
         
     class Config:
         # 允许把 Enum 存为 string
-        use_enum_values = True
\ No newline at end of file
+        use_enum_values = True
+
+
+# --- 轻量 projection（内部查找用：不拉 subtasks / focusPrefs / notify 那些） ---
+class TaskRef(BaseModel):
+    flutter_id: str
+    user_email: str
+    title: str
+    status: TaskStatus
+
+    class Config:
+        use_enum_values = True
+
+
+# GET /tasks?fields= 可以选的字段（"id" 对应 Mongo 的 _id）
+TASK_FIELDS = frozenset(Task.model_fields)
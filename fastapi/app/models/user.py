@@ -1,5 +1,5 @@
-from beanie import Document, Indexed
-from pydantic import EmailStr, Field
+from beanie import Document, Indexed, PydanticObjectId
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 
 class User(Document):
@@ -16,4 +16,11 @@ class User(Document):
     coins: int = Field(default=0)
 
     class Settings:
-        name = "users"
\ No newline at end of file
+        name = "users"
+
+
+class UserRef(BaseModel):
+    """get_current_user 用的 projection：每个 request 只要 _id / email / coins，不拉 preferences 那些"""
+    id: PydanticObjectId = Field(alias="_id")
+    email: str
+    coins: int = 0
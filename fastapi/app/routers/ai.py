@@ -3,13 +3,30 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-import os
+import hashlib
 
+from app.config import settings
 from app.schemas.response import Envelope
-from app.utils.response_utils import ok
+from app.utils.admission import AdmissionGate
+from app.utils.singleflight import SingleFlight
+from app.utils.response_utils import FastJSONResponse, fast_ok
+from app.services import llm_router
+from app.services.pet_service_ai import GROQ_API_KEY, groq_chat
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
+# summary 可能要等 LLM 30s：限制并发 + 每个 user 限速
+SUMMARY_GATE = AdmissionGate(
+    "ai_summary",
+    max_concurrent=settings.AI_SUMMARY_MAX_CONCURRENT,
+    max_queue=settings.AI_MAX_QUEUE,
+    queue_timeout=settings.AI_QUEUE_TIMEOUT_SECONDS,
+    user_rate_per_min=settings.AI_USER_RATE_PER_MINUTE,
+    user_burst=settings.AI_USER_BURST,
+)
+# 同一个 payload 同时来多次（app 打开时重复请求）只算一次 / 只打一次 LLM
+SUMMARY_FLIGHT = SingleFlight("ai_summary")
+
 # ---------- (原有的 /ai/chat 如果你有就保留；这里略) ----------
 # @router.post("/chat")
 # async def chat(...):
@@ -77,43 +94,32 @@ def _heuristic_summarize(metrics: Dict[str, Any]) -> str:
 async def _maybe_llm_enhance(metrics: Dict[str, Any]) -> Optional[str]:
     """
     如果有 GROQ_API_KEY，就用 LLM 生成更自然的总结；否则返回 None
+    经过 llm_router：Groq breaker open 的时候直接 None（不用等满 deadline），最多等 LLM_SUMMARY_DEADLINE_SECONDS
     """
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
+    if not GROQ_API_KEY:
         return None
 
-    import httpx
     prompt = f"""
 You are an expert productivity coach. Based on the user's task metrics below,
 write a friendly 100-word summary with 3 actionable recommendations.
 Metrics: {metrics}
     """.strip()
 
-    url = "https://api.groq.ai/v1/chat/completions"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    body = {
-        "model": "llama3-8b-8192",   # 或 "mixtral-8x7b"
-        "messages": [
-            {"role": "system", "content": "You help users improve productivity with clear, kind guidance."},
-            {"role": "user",   "content": prompt},
-        ],
-        "temperature": 0.6,          # 注意拼写：temperature
-    }
-
+    messages = [
+        {"role": "system", "content": "You help users improve productivity with clear, kind guidance."},
+        {"role": "user",   "content": prompt},
+    ]
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            r = await client.post(url, headers=headers, json=body)
-            r.raise_for_status()
-            data = r.json()
-            return data["choices"][0]["message"]["content"].strip()
+        return await llm_router.call(
+            "groq",
+            lambda: groq_chat(messages, temperature=0.6),
+            deadline=settings.LLM_SUMMARY_DEADLINE_SECONDS,
+        )
     except Exception:
         return None
 
-# ---------- /ai/summary ----------
-@router.post("/summary", response_model=Envelope[SummaryOut])
-async def summarize_tasks(payload: SummaryIn):
-    tasks = payload.tasks
-
+def _summary_metrics(user_id: str, tasks: List[TaskIn]) -> Dict[str, Any]:
+    """纯 CPU 统计（无 IO），方便 benchmarks/ 直接计时"""
     # --- 1) 统计 ---
     total = len(tasks)
     per_cat: Dict[str, Dict[str, Any]] = {}
@@ -193,8 +199,8 @@ async def summarize_tasks(payload: SummaryIn):
     top_late  = sorted(cat_out.items(), key=lambda x: x[1]["late_rate"],  reverse=True)
     top_early = sorted(cat_out.items(), key=lambda x: x[1]["early_rate"], reverse=True)
 
-    metrics = {
-        "user_id": payload.user_id,
+    return {
+        "user_id": user_id,
         "total_tasks": total,
         "overall": overall_out,
         "by_category": cat_out,
@@ -202,7 +208,19 @@ async def summarize_tasks(payload: SummaryIn):
         "top_early_categories": [k for k, v in top_early if v["early_rate"] > 0][:5],
     }
 
+# ---------- /ai/summary ----------
+@router.post("/summary", response_model=Envelope[SummaryOut], response_class=FastJSONResponse)
+async def summarize_tasks(payload: SummaryIn):
+    digest = hashlib.sha1(payload.model_dump_json().encode()).hexdigest()
+    key = (payload.user_id, datetime.utcnow().date().isoformat(), digest)
+    out = await SUMMARY_FLIGHT.do(key, lambda: _summarize(payload))
+    return fast_ok(out)
+
+async def _summarize(payload: SummaryIn) -> SummaryOut:
+    metrics = _summary_metrics(payload.user_id, payload.tasks)
+
     # --- 2) 生成 summary 文本 ---
-    llm_text = await _maybe_llm_enhance(metrics)
+    async with SUMMARY_GATE.slot(payload.user_id):
+        llm_text = await _maybe_llm_enhance(metrics)
     summary = llm_text or _heuristic_summarize(metrics)
-    return ok(SummaryOut(summary=summary, metrics=metrics))
+    return SummaryOut(summary=summary, metrics=metrics)
@@ -6,7 +6,7 @@ from datetime import datetime, time
 import os
 
 from app.schemas.response import Envelope
-from fastapi.app.utils.response_utils import ok
+from app.utils.response_utils import ok
 
 router = APIRouter(prefix="/ai", tags=["ai"])
 
@@ -132,11 +132,8 @@ Metrics JSON:
     except Exception:
         return None
 
-# ---------- Routes ----------
-@router.post("/summary", response_model=Envelope[SummaryOut])
-async def summarize_tasks(payload: SummaryIn):
-    tasks = payload.tasks
-
+def _summary_metrics(user_id: str, tasks: List[TaskIn]) -> Dict[str, Any]:
+    """纯 CPU 统计（无 IO），方便 benchmarks/ 直接计时"""
     # --- 1) Basic Metrics ---
     total = len(tasks)
     per_cat: Dict[str, Dict[str, Any]] = {}  # {cat: {...}}
@@ -212,8 +209,8 @@ async def summarize_tasks(payload: SummaryIn):
     top_late = sorted(cat_out.items(), key=lambda x: x[1]["late_rate"], reverse=True)
     top_early = sorted(cat_out.items(), key=lambda x: x[1]["early_rate"], reverse=True)
 
-    metrics = {
-        "user_id": payload.user_id,
+    return {
+        "user_id": user_id,
         "total_tasks": total,
         "overall": overall_out,
         "by_category": cat_out,
@@ -221,6 +218,11 @@ async def summarize_tasks(payload: SummaryIn):
         "top_early_categories": [k for k, _v in top_early if _v["early_rate"] > 0][:5],
     }
 
+# ---------- Routes ----------
+@router.post("/summary", response_model=Envelope[SummaryOut])
+async def summarize_tasks(payload: SummaryIn):
+    metrics = _summary_metrics(payload.user_id, payload.tasks)
+
     # --- 2) 生成 summary 文本 ---
     llm_text = await _maybe_llm_enhance(metrics)
     summary = llm_text or _heuristic_summarize(metrics)
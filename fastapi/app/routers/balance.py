@@ -1,8 +1,12 @@
 # app/routers/balance.py
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
-from app.models.user import User
+from app.models.user import UserRef
 from app.deps import get_current_user 
+from app.db import get_db
+from app.logic.coins import change_coins
+from app.logic.pet_state import apply_signal
+from app.utils.idempotency import idempotent
 
 router = APIRouter()
 
@@ -14,7 +18,7 @@ class SpendRequest(BaseModel):
 
 # 💰 1. 查余额
 @router.get("/balance", tags=["Gamification"])
-async def get_balance(user: User = Depends(get_current_user)):
+async def get_balance(user: UserRef = Depends(get_current_user)):
     print("🧾 BALANCE CHECK:", user.email, user.coins)
     return {
         "email": user.email,
@@ -27,28 +31,35 @@ class EarnRequest(BaseModel):
     reason: str | None = None
 
 @router.post("/balance/earn", tags=["Gamification"])
-async def earn_coins(req: EarnRequest, user: User = Depends(get_current_user)):
-    user.coins = int(user.coins or 0) + int(req.amount)
-    await user.save()
-    return {"coins": int(user.coins or 0), "earned": int(req.amount)}
+async def earn_coins(req: EarnRequest, request: Request, user: UserRef = Depends(get_current_user)):
+    # 手机重试同一个 Idempotency-Key 不会再加一次钱
+    return await idempotent(get_db(), request, "balance.earn", user.email, lambda: _earn(req, user))
+
+async def _earn(req: EarnRequest, user: UserRef):
+    coins = await change_coins(user.email, int(req.amount), reason=req.reason or "earn")
+    await apply_signal(get_db(), str(user.id), "coins_earned")
+    return {"coins": int(coins or 0), "earned": int(req.amount)}
 
 # 💸 2. 花钱
 @router.post("/balance/spend", tags=["Gamification"])
 async def spend_coins(
     request: SpendRequest, 
-    user: User = Depends(get_current_user) # 👈 直接拿到 User
+    http_request: Request,
+    user: UserRef = Depends(get_current_user) # 👈 直接拿到 User
 ):
-    # 🛑 检查钱够不够
-    if user.coins < request.amount:
-        raise HTTPException(status_code=400, detail="Not enough coins! Your pet is hungry🥺")
+    return await idempotent(get_db(), http_request, "balance.spend", user.email, lambda: _spend(request, user))
 
-    # ✅ 扣钱
-    user.coins -= request.amount
-    await user.save()
+async def _spend(request: SpendRequest, user: UserRef):
+    # ✅ 扣钱（检查钱够不够 + 扣，在同一个原子 update 里）
+    coins = await change_coins(user.email, -int(request.amount), reason=f"spend:{request.item_name}", require_balance=True)
+    # 🛑 钱不够
+    if coins is None:
+        raise HTTPException(status_code=400, detail="Not enough coins! Your pet is hungry🥺")
 
     print(f"User {user.email} spent {request.amount} coins on {request.item_name}")
+    await apply_signal(get_db(), str(user.id), "coins_spent")
 
     return {
         "message": f"Successfully bought {request.item_name}",
-        "coins": user.coins
+        "coins": coins
     }
\ No newline at end of file
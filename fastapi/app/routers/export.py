@@ -0,0 +1,173 @@
+# app/routers/export.py
+"""
+GET /export/{user_id} —— 一个 user 的全部数据，NDJSON 一行一条，直接从 Motor cursor 流出去。
+
+    {"type": "export", "user_id": ..., "generated_at": ...}
+    {"type": "task", "data": {...}}
+    {"type": "event", "data": {...}}
+    {"type": "checkpoint", "cursor": "..."}       # 每 EXPORT_CHECKPOINT_EVERY 条一行
+    ...
+    {"type": "end", "counts": {"task": 12, ...}}
+
+- 内存是常数：cursor batch_size = EXPORT_BATCH_SIZE，攒到 ~64KB 就 yield，不 to_list()
+- 断了可以续：带上最后收到的 checkpoint cursor 再请求一次（?cursor=...），从那之后接着出
+- ?gzip=true：整个 body 是 .ndjson.gz 文件（Content-Type application/gzip）
+- 限速 EXPORT_MAX_BYTES_PER_SEC + 每个 worker 最多 EXPORT_MAX_CONCURRENT 个 export（满了 503）
+"""
+from __future__ import annotations
+import asyncio
+import base64
+import json
+import time
+import zlib
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.config import settings
+from app.db import get_db
+from app.deps import get_current_user
+from app.logic.event_store import EVENTS, MOODS, events, from_storage, moods, q_events, q_moods, timeseries_enabled
+from app.models.user import UserRef
+from app.utils.admission import AdmissionGate
+from app.utils.response_utils import dumps
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+EXPORT_GATE = AdmissionGate(
+    "export",
+    max_concurrent=settings.EXPORT_MAX_CONCURRENT,
+    max_queue=0,              # 不排队：满了直接 503 + Retry-After
+    user_rate_per_min=6,
+    user_burst=3,
+)
+
+_CHUNK_BYTES = 64 * 1024
+# 导出顺序；checkpoint 里存的是 section 的 index
+SECTIONS = ("task", "event", "mood", "stress_score")
+
+
+def encode_cursor(section: int, last_id: ObjectId) -> str:
+    raw = json.dumps({"s": section, "id": str(last_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[int, ObjectId]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        section, last_id = int(raw["s"]), ObjectId(raw["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid export cursor")
+    if not 0 <= section < len(SECTIONS):
+        raise HTTPException(status_code=400, detail="Invalid export cursor")
+    return section, last_id
+
+
+def _sources(db, user: UserRef):
+    """(section, collection, filter, doc 转换)；events / moods 里的 user_id 可能是 _id 字符串也可能是 email"""
+    ids = {"$in": [str(user.id), user.email]}
+    return [
+        ("task", db.tasks, {"user_email": user.email}, None),
+        ("event", events(db), q_events({"user_id": ids}), lambda d: from_storage(EVENTS, d)),
+        ("mood", moods(db), q_moods({"user_id": ids}), lambda d: from_storage(MOODS, d)),
+        ("stress_score", db.stress_risk_scores, {"user_id": ids}, None),
+    ]
+
+
+class _Throttle:
+    """每个 export 自己的 byte-rate 限速：发得比 rate 快就 sleep 补回来"""
+    def __init__(self, bytes_per_sec: int):
+        self.rate = bytes_per_sec
+        self.sent = 0
+        self.t0 = time.monotonic()
+
+    async def wait(self, n: int) -> None:
+        self.sent += n
+        if self.rate <= 0:
+            return
+        ahead = self.sent / self.rate - (time.monotonic() - self.t0)
+        if ahead > 0:
+            await asyncio.sleep(ahead)
+
+
+async def _lines(db, user: UserRef, start: Optional[Tuple[int, ObjectId]]) -> AsyncIterator[bytes]:
+    yield dumps({"type": "export", "user_id": str(user.id), "email": user.email,
+                 "generated_at": datetime.utcnow(), "sections": list(SECTIONS)}) + b"\n"
+    counts = {name: 0 for name in SECTIONS}
+    since_ckpt = 0
+    for i, (name, col, flt, convert) in enumerate(_sources(db, user)):
+        if start and i < start[0]:
+            continue
+        if start and i == start[0]:
+            flt = {**flt, "_id": {"$gt": start[1]}}
+        # 按 _id 顺序读，checkpoint 才能续传；time-series 没有 _id index，允许落盘排序
+        kw = {"allow_disk_use": True} if name in ("event", "mood") and timeseries_enabled() else {}
+        cursor = col.find(flt, **kw).sort("_id", 1).batch_size(settings.EXPORT_BATCH_SIZE)
+        async for doc in cursor:
+            yield dumps({"type": name, "data": convert(doc) if convert else doc}) + b"\n"
+            counts[name] += 1
+            since_ckpt += 1
+            if since_ckpt >= settings.EXPORT_CHECKPOINT_EVERY:
+                since_ckpt = 0
+                yield dumps({"type": "checkpoint", "cursor": encode_cursor(i, doc["_id"])}) + b"\n"
+    yield dumps({"type": "end", "counts": counts}) + b"\n"
+
+
+async def _stream(lines: AsyncIterator[bytes], gzip: bool, slot: AsyncExitStack) -> AsyncIterator[bytes]:
+    gz = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if gzip else None
+    throttle = _Throttle(settings.EXPORT_MAX_BYTES_PER_SEC)
+    buf: List[bytes] = []
+    size = 0
+    try:
+        async for line in lines:
+            buf.append(line)
+            size += len(line)
+            if size < _CHUNK_BYTES:
+                continue
+            chunk = b"".join(buf)
+            buf, size = [], 0
+            if gz is not None:
+                chunk = gz.compress(chunk)
+                if not chunk:
+                    continue
+            yield chunk
+            await throttle.wait(len(chunk))
+        tail = b"".join(buf)
+        if gz is not None:
+            tail = gz.compress(tail) + gz.flush()
+        if tail:
+            yield tail
+    finally:
+        await slot.aclose()
+
+
+@router.get("/{user_id}")
+async def export_user_data(
+    user_id: str,
+    cursor: Optional[str] = Query(None, description="resume after this checkpoint"),
+    gzip: bool = False,
+    user: UserRef = Depends(get_current_user),
+    db=Depends(get_db),
+):
+    if user_id not in (str(user.id), user.email):
+        raise HTTPException(status_code=403, detail="You can only export your own data")
+    start = decode_cursor(cursor) if cursor else None
+
+    # 先拿 slot 再回 response：429 / 503 要在 header 发出去之前
+    slot = AsyncExitStack()
+    await slot.enter_async_context(EXPORT_GATE.slot(str(user.id)))
+
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    filename = f"dodo-export-{user.id}-{stamp}.ndjson" + (".gz" if gzip else "")
+    return StreamingResponse(
+        _stream(_lines(db, user, start), gzip, slot),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+        # client 中途断线时 generator 不一定会被 close：background 保证 slot 一定释放（aclose 可以重复调）
+        background=BackgroundTask(slot.aclose),
+    )
@@ -6,6 +6,8 @@ from app.db import get_db
 from app.schemas.response import Envelope
 from app.utils.response_utils import ok, created
 from app.logic.risk_mongo import compute_stress_score, recommend_new_due_date, choose_pet_reaction
+from app.logic.event_store import insert_event, insert_mood
+from app.logic.pet_state import apply_signal
 
 router = APIRouter(prefix="/wellbeing", tags=["wellbeing"])
 
@@ -21,7 +23,9 @@ class EventIn(BaseModel):
 async def ingest_event(body: EventIn, db=Depends(get_db)):
     doc = body.model_dump()
     doc["ts"] = doc["ts"] or datetime.utcnow()
-    await db.events.insert_one(doc)
+    if not await insert_event(db, doc):  # 同一个 event_id 重送：不再写、不再加 pet 信号
+        return ok({"inserted": False, "event_id": body.event_id}, message="Duplicate event ignored")
+    await apply_signal(db, body.user_id, body.type)
     return created({"inserted": True, "event_id": body.event_id}, message="Event ingested")
 
 # ---------- Mood ----------
@@ -38,7 +42,10 @@ class MoodIn(BaseModel):
 async def log_mood(body: MoodIn, db=Depends(get_db)):
     doc = body.model_dump()
     doc["ts"] = doc["ts"] or datetime.utcnow()
-    await db.mood.insert_one(doc)
+    # 以前写到 db.mood，rollup 读的是 mood_logs
+    if not await insert_mood(db, doc):
+        return ok({"inserted": False, "mood_id": body.mood_id}, message="Duplicate mood ignored")
+    await apply_signal(db, body.user_id, f"mood_{body.label}")
     return created({"inserted": True, "mood_id": body.mood_id}, message="Mood logged")
 
 # ---------- Stress Risk ----------
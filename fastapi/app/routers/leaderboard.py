@@ -0,0 +1,93 @@
+# app/routers/leaderboard.py
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+
+from app.config import settings
+from app.db import get_db
+from app.deps import get_current_user
+from app.logic import leaderboard
+from app.models.user import UserRef
+from app.schemas.response import Envelope
+from app.utils.response_utils import created, ok
+
+router = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
+
+
+class GroupIn(BaseModel):
+    name: str = Field(min_length=1, max_length=60)
+    member_emails: List[str] = []     # 只是邀请，对方 accept 了才进 group
+
+
+class InviteIn(BaseModel):
+    email: str
+
+
+# 全局：缓存的 top-K（indexed lookup）+ 我的名次（rank index，O(log C)）
+@router.get("", response_model=Envelope[dict])
+async def global_leaderboard(
+    limit: int = Query(10, ge=1, le=settings.LEADERBOARD_TOP_K),
+    user: UserRef = Depends(get_current_user),
+    db=Depends(get_db),
+):
+    top = await leaderboard.top(db, limit)
+    me = await leaderboard.rank_of(db, int(user.coins or 0))
+    return ok({"top": top, "me": {"user_id": str(user.id), **me}}, message="Leaderboard")
+
+
+@router.get("/groups", response_model=Envelope[list])
+async def list_groups(user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    return ok(await leaderboard.my_groups(db, str(user.id)), message="Groups")
+
+
+@router.post("/groups", response_model=Envelope[dict])
+async def create_group(body: GroupIn, user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    try:
+        group = await leaderboard.create_group(db, str(user.id), body.name, body.member_emails)
+    except leaderboard.GroupFull as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return created(group, message="Group created")
+
+
+# email 有没有注册都回一样的 response（不能拿来试 email）
+@router.post("/groups/{group_id}/invites", response_model=Envelope[dict])
+async def invite_member(group_id: str, body: InviteIn, user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    try:
+        found = await leaderboard.invite(db, group_id, str(user.id), body.email)
+    except leaderboard.GroupFull as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not found:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return ok({"group_id": group_id}, message="Invite sent if the email is registered")
+
+
+@router.get("/invites", response_model=Envelope[list])
+async def list_invites(user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    return ok(await leaderboard.my_invites(db, str(user.id)), message="Invites")
+
+
+@router.post("/groups/{group_id}/accept", response_model=Envelope[dict])
+async def accept_invite(group_id: str, user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    try:
+        group = await leaderboard.accept(db, group_id, str(user.id))
+    except leaderboard.GroupFull as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if group is None:
+        raise HTTPException(status_code=404, detail="Invite not found")
+    return ok(group, message="Joined group")
+
+
+@router.post("/groups/{group_id}/decline", response_model=Envelope[dict])
+async def decline_invite(group_id: str, user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    if not await leaderboard.decline(db, group_id, str(user.id)):
+        raise HTTPException(status_code=404, detail="Invite not found")
+    return ok({"group_id": group_id}, message="Invite declined")
+
+
+@router.get("/groups/{group_id}", response_model=Envelope[dict])
+async def group_leaderboard(group_id: str, user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    board = await leaderboard.group_board(db, group_id, str(user.id))
+    if board is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return ok(board, message="Group leaderboard")
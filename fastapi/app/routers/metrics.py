@@ -0,0 +1,14 @@
+# app/routers/metrics.py
+from fastapi import APIRouter
+
+from app.schemas.response import Envelope
+from app.utils import metrics
+from app.utils.response_utils import ok
+
+router = APIRouter(tags=["metrics"])
+
+
+# 进程内计数（admission / single-flight ...），每个 gunicorn worker 各自一份
+@router.get("/metrics", response_model=Envelope[dict])
+async def get_metrics():
+    return ok(metrics.snapshot(), message="Metrics")
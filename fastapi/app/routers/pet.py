@@ -0,0 +1,17 @@
+# app/routers/pet.py
+from fastapi import APIRouter, Depends
+
+from app.db import get_db
+from app.deps import get_current_user
+from app.logic.pet_state import get_state
+from app.models.user import UserRef
+from app.schemas.response import Envelope
+from app.utils.response_utils import ok
+
+router = APIRouter(prefix="/pet", tags=["pet"])
+
+
+# 首页用：pets 里存好的 state，一次 indexed lookup（user_id unique index），不跑 stress scoring
+@router.get("/state", response_model=Envelope[dict])
+async def pet_state(user: UserRef = Depends(get_current_user), db=Depends(get_db)):
+    return ok(await get_state(db, str(user.id)), message="Pet state")
@@ -1,21 +1,46 @@
 # app/routers/pet_ai.py
 from __future__ import annotations
 import os
+import time
 from datetime import datetime
 from typing import Optional, Literal, Dict, Any
 
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel, Field
 
+from app.config import settings
 from app.db import get_db
 from app.schemas.response import Envelope
 # 👇👇👇 之前这里写错了，把 fastapi. 去掉！ 👇👇👇
 from app.utils.response_utils import ok, created 
 from app.logic.risk_mongo import compute_stress_score
-from app.services.pet_service_ai import HuggingFaceClient, InworldClient
+from app.logic.event_store import insert_event
+from app.logic import chat_memory
+from app.services.pet_service_ai import GROQ_API_KEY, HuggingFaceClient, InworldClient, local_reply
+from app.services import llm_router, quick_replies
+from app.services.image_pipeline import caption_upload, read_image_upload
+from app.utils.admission import AdmissionGate
 
 router = APIRouter(prefix="/ai/pet", tags=["ai-pet"])
 
+# 外部 LLM 可能卡 30-40s：限制并发 + 每个 user 限速
+CHAT_GATE = AdmissionGate(
+    "ai_pet_chat",
+    max_concurrent=settings.AI_CHAT_MAX_CONCURRENT,
+    max_queue=settings.AI_MAX_QUEUE,
+    queue_timeout=settings.AI_QUEUE_TIMEOUT_SECONDS,
+    user_rate_per_min=settings.AI_USER_RATE_PER_MINUTE,
+    user_burst=settings.AI_USER_BURST,
+)
+CAPTION_GATE = AdmissionGate(
+    "ai_pet_image_caption",
+    max_concurrent=settings.AI_CAPTION_MAX_CONCURRENT,
+    max_queue=settings.AI_MAX_QUEUE,
+    queue_timeout=settings.AI_QUEUE_TIMEOUT_SECONDS,
+    user_rate_per_min=settings.AI_USER_RATE_PER_MINUTE,
+    user_burst=settings.AI_USER_BURST,
+)
+
 # ... 下面的代码保持不变 ...
 # 为了保险，你可以把下面的也复制进去，或者只改上面那行 import
 
@@ -28,56 +53,40 @@ class ChatIn(BaseModel):
 
 class ChatOut(BaseModel):
     reply: str
-    provider: Literal["inworld", "huggingface", "groq"]
+    provider: Literal["inworld", "huggingface", "groq", "local", "intent", "cache"]
     sentiment: Dict[str, Any] | None = None
     risk: Dict[str, Any] | None = None
     ts: datetime
 
 
 @router.post("/chat", response_model=Envelope[ChatOut])
-async def chat(body: ChatIn, db=Depends(get_db)):
+async def chat(body: ChatIn, request: Request, db=Depends(get_db)):
+    # 限速按 client IP：body.user_id 是 client 自己填的，换一个就能绕过
+    async with CHAT_GATE.slot(request.client.host if request.client else None):
+        return await _chat(body, db)
+
+
+async def _chat(body: ChatIn, db):
     hf = HuggingFaceClient()
 
-    # 1) 本地情绪 + 风险
+    # 1) 本地情绪 + 风险 + 对话记忆
     senti = await hf.analyze_sentiment(body.text)
     risk = await compute_stress_score(db, body.user_id) or {"score": 0, "signals": []}
+    mem = await chat_memory.load(db, body.user_id)
 
-    # 2) Persona
-    persona = (
-        "You are 'DoDo', a gentle, playful virtual pet companion. "
-        "Speak in short, warm sentences with emojis occasionally. "
-        "Use positive reinforcement, tiny-steps coaching, and never shame. "
-        f"User mood: {senti['label']} (p={senti['score']:.2f}). "
-        f"Stress score: {risk['score']} with signals {risk['signals']}. "
-        "If stress >=70: suggest micro-break & reschedule. "
-        "If 40-69: suggest 25-min focus + water. "
-        "Otherwise: celebrate consistency."
-    )
-    prompt = f"{persona}\nUser: {body.text}\nPet:"
-
-    # 3) 优先 Inworld，否则 Groq
-    reply = ""
-    provider: Literal["inworld", "huggingface", "groq"] = "groq"
-
-    if body.use_inworld:
-        iw = InworldClient()
-        try:
-            reply = await iw.chat(
-                character_id=body.character_id or "",
-                user_id=body.user_id,
-                text=body.text,
-                context={"mood": senti, "risk": {"score": risk["score"], "signals": risk["signals"]}},
-            )
-            provider = "inworld"
-        except Exception:
-            reply = await hf.generate_reply(prompt)
-            provider = "groq"
+    # 2) "hi" / "thanks" / "done!" 这种短消息：模板或最近的 LLM 回复，不打 LLM
+    quick = quick_replies.lookup(body.user_id, body.text, senti["label"], risk["score"])
+    if quick is not None:
+        provider, reply = quick
     else:
-        reply = await hf.generate_reply(prompt)
-        provider = "groq"
-
-    # 4) 日志
-    await db.events.insert_one(
+        provider, reply = await _llm_reply(body, hf, senti, risk, mem)
+
+    # 3) 记忆 + 日志
+    # 没有 Groq key 时 generate_reply 只会回固定句子，不能拿来当 summary
+    await chat_memory.remember(db, body.user_id, body.text, reply, mem,
+                               summarize=_summarize if GROQ_API_KEY else None)
+    await insert_event(
+        db,
         {
             "event_id": os.urandom(8).hex(),
             "user_id": body.user_id,
@@ -96,6 +105,46 @@ async def chat(body: ChatIn, db=Depends(get_db)):
     return ok(ChatOut(reply=reply, provider=provider, sentiment=senti, risk=risk, ts=datetime.utcnow()))
 
 
+async def _llm_reply(body: ChatIn, hf: HuggingFaceClient, senti, risk, mem):
+    # Persona（fast path 命中的话这些都不用拼）
+    persona = (
+        "You are 'DoDo', a gentle, playful virtual pet companion. "
+        "Speak in short, warm sentences with emojis occasionally. "
+        "Use positive reinforcement, tiny-steps coaching, and never shame. "
+        f"User mood: {senti['label']} (p={senti['score']:.2f}). "
+        f"Stress score: {risk['score']} with signals {risk['signals']}. "
+        "If stress >=70: suggest micro-break & reschedule. "
+        "If 40-69: suggest 25-min focus + water. "
+        "Otherwise: celebrate consistency."
+    )
+    # summary + 最近几轮，按 token 预算裁（聊多久 prompt 都一样大）
+    prompt = chat_memory.build_prompt(persona, mem, body.text)
+
+    # 优先 Inworld，慢了 / 挂了就 hedge 到 Groq，再不行本地回复（见 llm_router）
+    calls = []
+    iw = InworldClient()
+    if body.use_inworld and iw.base_url:
+        calls.append(("inworld", lambda: iw.chat(
+            character_id=body.character_id or "",
+            user_id=body.user_id,
+            text=body.text,
+            context={"mood": senti, "risk": {"score": risk["score"], "signals": risk["signals"]},
+                     "memory": chat_memory.history_context(mem)},
+        )))
+    if GROQ_API_KEY:
+        calls.append(("groq", lambda: hf.generate_reply(prompt)))
+    t0 = time.monotonic()
+    provider, reply = await llm_router.first_answer(calls, fallback=("local", lambda: local_reply(risk["score"])))
+    if provider != "local":
+        quick_replies.remember(body.user_id, body.text, senti["label"], risk["score"], reply, time.monotonic() - t0)
+    return provider, reply
+
+
+async def _summarize(prompt: str) -> str:
+    return await llm_router.call("groq", lambda: HuggingFaceClient().generate_reply(prompt),
+                                 deadline=settings.LLM_SUMMARY_DEADLINE_SECONDS)
+
+
 class SentimentIn(BaseModel):
     text: str
 
@@ -107,11 +156,27 @@ async def analyze_sentiment(body: SentimentIn):
     return ok(out)
 
 
-@router.post("/analyze/image-caption", response_model=Envelope[Dict[str, Any]])
-async def image_caption(file: UploadFile = File(...)):
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(415, "Please upload an image file.")
-    image_bytes = await file.read()
-    hf = HuggingFaceClient()
-    caption = await hf.caption_image(image_bytes)
-    return ok({"caption": caption, "filename": file.filename})
\ No newline at end of file
+# multipart 自己 parse（read_image_upload），不用 File(...)：FastAPI 会在进 route 之前就把整个 body spool 完
+_IMAGE_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+
+@router.post("/analyze/image-caption", response_model=Envelope[Dict[str, Any]], openapi_extra=_IMAGE_FORM)
+async def image_caption(request: Request):
+    file = await read_image_upload(request, "file", settings.IMAGE_MAX_UPLOAD_BYTES)
+    try:
+        if not file.content_type or not file.content_type.startswith("image/"):
+            raise HTTPException(415, "Please upload an image file.")
+        async with CAPTION_GATE.slot(request.client.host if request.client else None):
+            out = await caption_upload(file, HuggingFaceClient())
+    finally:
+        await file.close()
+    return ok({**out, "filename": file.filename})
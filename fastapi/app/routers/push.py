@@ -0,0 +1,42 @@
+# app/routers/push.py
+"""
+WebSocket /ws?token=<JWT>：登录后的 device 连上来，之后 coins / pet / task 变化由 server 推（见 app/logic/push.py）。
+
+server -> client：{"type": "coins" | "pet" | "task", "data": {...}, "ts": "..."}
+client -> server：只需要偶尔发 "ping"（回 "pong"），保持连接；其他消息（包括 binary）都忽略
+"""
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+
+from app.deps import user_from_token
+from app.logic.push import HUB
+
+router = APIRouter(tags=["push"])
+
+WS_UNAUTHORIZED = 4401   # 4000-4999 = app 自定义 close code
+
+
+@router.websocket("/ws")
+async def push_socket(ws: WebSocket, token: str = Query(...)):
+    try:
+        user = await user_from_token(token)
+    except HTTPException:
+        await ws.close(code=WS_UNAUTHORIZED)
+        return
+
+    await ws.accept()
+    keys = [str(user.id), user.email]
+    HUB.add(keys, ws)
+    try:
+        # 自己的回复也经过 HUB 的队列：同一个 socket 只有它的 writer 在写
+        HUB.send(ws, '{"type":"hello","data":{"coins":%d}}' % int(user.coins or 0))
+        while True:
+            # receive() 不用 receive_text()：binary frame 没有 "text"，receive_text 会 KeyError 掉连接
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            if msg.get("text") == "ping":
+                HUB.send(ws, "pong")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        HUB.remove(keys, ws)
@@ -1,30 +1,134 @@
-from fastapi import APIRouter, HTTPException, Body
-from typing import List
-from app.models.user import User
-from app.models.models import Task
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+from pydantic import BaseModel, Field
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.models.models import SubTask, Task, TaskRef, TASK_FIELDS
+from app.utils.response_utils import FastJSONResponse
+from app.db import get_db
+from app.logic.agenda import agenda
+from app.logic.coins import change_coins
+from app.logic.pet_state import apply_signal
+from app.logic.push import publish
+from app.logic.reminders import on_task_deleted, on_task_saved
+from app.logic.task_patch import PatchError, merge_patch, subtask_inc_focus, subtask_set, to_mongo, touches_schedule
+from app.logic.task_query import MAX_LIMIT, QueryError, build_query, split_csv
+from app.utils.idempotency import idempotent
 
 router = APIRouter()
 
 # 1. 创建任务 (Sync from Flutter)
 @router.post("/tasks", tags=["Tasks"], response_model=Task)
-async def create_task(task: Task):
+async def create_task(task: Task, request: Request):
     # 前端传来的 JSON 会自动映射成 Task 对象
-    # 如果数据库里已经有了这个 flutter_id，我们可以选择更新或者忽略
-    # 这里演示直接插入
-    await task.insert()
+    # Idempotency-Key 重试直接回上次的结果；没带 key 的重试靠 flutter_id unique index 挡住
+    return await idempotent(get_db(), request, "tasks.create", task.user_email, lambda: _create_task(task))
+
+async def _create_task(task: Task):
+    try:
+        await task.insert()
+    except DuplicateKeyError:
+        # 这个 flutter_id 已经有了（重试）：回已经存的那个，不再重算 reminder / push
+        existing = await Task.find_one(Task.flutter_id == task.flutter_id)
+        if existing is None:
+            raise
+        if existing.user_email != task.user_email:
+            # 别人的 task 撞了 id：不能把它回给这个 user
+            raise HTTPException(status_code=409, detail="flutter_id already in use")
+        return existing
+    await on_task_saved(task)
+    await publish([task.user_email], "task", {"op": "created", "task": task})
     return task
 
 # 2. 获取用户的所有任务
-@router.get("/tasks/{user_email}", tags=["Tasks"], response_model=List[Task])
-async def get_user_tasks(user_email: str):
+def task_projection(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """?fields=title,status,dueDateTime -> Mongo projection（flutter_id 一定带上，前端靠它对应）"""
+    if not fields:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - TASK_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown task fields: {', '.join(sorted(unknown))}")
+    proj = {("_id" if f == "id" else f): 1 for f in wanted | {"flutter_id"}}
+    if "_id" not in proj:
+        proj["_id"] = 0
+    return proj
+
+# 2a. server-side 查询：filter / sort / 分页都在 Mongo（每种组合都有 index，见 app/logic/task_query.py）
+# 要在 /tasks/{user_email} 前面注册，不然 "query" 会被当成 email
+@router.get("/tasks/query", tags=["Tasks"], response_class=FastJSONResponse)
+async def query_tasks(
+    user_email: str = Query(...),
+    status: Optional[str] = Query(None, description="逗号分隔，比如 notStarted,inProgress"),
+    category: Optional[str] = None,
+    tags: Optional[str] = Query(None, description="逗号分隔；多个 = 全部都要有"),
+    priority: Optional[str] = Query(None, description="逗号分隔，比如 high,urgent"),
+    due_from: Optional[datetime] = Query(None, description="due >= due_from（dueDateTime，ranged task 看 dueDate）"),
+    due_to: Optional[datetime] = Query(None, description="due < due_to"),
+    q: Optional[str] = Query(None, max_length=100, description="标题搜索（整词）"),
+    sort: str = Query("due", description="due / -due / created / -created / updated / -updated"),
+    limit: int = Query(50, ge=1, le=MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description="同 GET /tasks/{email}?fields="),
+):
+    try:
+        flt, order = build_query(
+            user_email, status=split_csv(status), category=category, tags=split_csv(tags),
+            priority=split_csv(priority), due_from=due_from, due_to=due_to, q=q, sort=sort,
+        )
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # 多拿一条判断还有没有下一页
+    cursor = Task.get_motor_collection().find(flt, task_projection(fields)).sort(order).skip(offset).limit(limit + 1)
+    items = await cursor.to_list(length=limit + 1)
+    has_more = len(items) > limit
+    return FastJSONResponse({
+        "items": items[:limit],
+        "next_offset": offset + limit if has_more else None,
+    })
+
+# 2b. 日历 / today：按每个 task 的本地日期分好天 + bucket 数，一个小 response（见 app/logic/agenda.py）
+@router.get("/tasks/agenda", tags=["Tasks"], response_class=FastJSONResponse)
+async def get_agenda(
+    user_email: str = Query(...),
+    first: date = Query(..., alias="from", description="本地日期 YYYY-MM-DD（含）"),
+    last: date = Query(..., alias="to", description="本地日期 YYYY-MM-DD（含）"),
+):
+    if last < first:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (last - first).days + 1 > settings.AGENDA_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.AGENDA_MAX_DAYS} days per request")
+    return FastJSONResponse(await agenda(Task.get_motor_collection(), user_email, first, last))
+
+@router.get("/tasks/{user_email}", tags=["Tasks"], response_model=List[Task], response_class=FastJSONResponse)
+async def get_user_tasks(
+    user_email: str,
+    fields: Optional[str] = Query(None, description="逗号分隔的字段，比如 title,status,dueDateTime；不给 = 整个 Task"),
+):
+    proj = task_projection(fields)
+    if proj is not None:
+        # 列表页：projection 推到 Mongo，不拉 subtasks / prefs，也不过 Pydantic
+        cursor = Task.get_motor_collection().find({"user_email": user_email}, proj)
+        return FastJSONResponse(await cursor.to_list(length=None))
     tasks = await Task.find(Task.user_email == user_email).to_list()
-    return tasks
+    # DB 读出来的已经是 Task，直接一次序列化，不用再 validate 一遍
+    return FastJSONResponse(tasks)
 
 # 3. 更新任务 (当你在 Flutter 修改了任务)
 @router.put("/tasks/{flutter_id}", tags=["Tasks"])
-async def update_task(flutter_id: str, task_data: Task):
-    # 1) 找任务
-    existing_task = await Task.find_one(Task.flutter_id == flutter_id)
+async def update_task(flutter_id: str, task_data: Task, request: Request):
+    return await idempotent(get_db(), request, "tasks.update", flutter_id,
+                            lambda: _update_task(flutter_id, task_data))
+
+async def _update_task(flutter_id: str, task_data: Task):
+    # body 的 flutter_id 要跟 path 一样：不然 $set 会把 task 改成另一个 id，reminder 也排到错的 id 上
+    if task_data.flutter_id != flutter_id:
+        raise HTTPException(status_code=400, detail="flutter_id in body does not match the URL")
+
+    # 1) 找任务（只要判断 coins 的几个字段）
+    existing_task = await Task.find_one(Task.flutter_id == flutter_id, projection_model=TaskRef)
     if not existing_task:
         raise HTTPException(status_code=404, detail="Task not found")
 
@@ -33,43 +137,141 @@ async def update_task(flutter_id: str, task_data: Task):
     print(f"   --- Old Status: {existing_task.status}")
     print(f"   --- New Status: {task_data.status}")
 
-    # 2) 判断 coins 变化
-    is_just_completed = (task_data.status == "completed" and existing_task.status != "completed")
-    is_just_uncompleted = (existing_task.status == "completed" and task_data.status != "completed")
+    # 2) 更新任务本身（先更新任务）
+    await Task.find_one(Task.flutter_id == flutter_id).update({"$set": task_data.model_dump(exclude={"id"})})
+    await on_task_saved(task_data)   # 时间 / NotificationPrefs / status 改了都要重算 reminder
+    await publish([existing_task.user_email], "task", {"op": "updated", "task": task_data})
+
+    # 3) 若需要，更新用户 coins（原子 $inc + push 给在线 device）
+    coins_change, new_coins = await _settle_coins(flutter_id, existing_task.user_email,
+                                                  existing_task.status, task_data.status)
+
+    # 4) 回传给 Flutter（关键：回 coins）
+    return {
+        "message": "Updated",
+        "coins_change": coins_change,
+        "coins": new_coins,   # 前端用这个直接更新 UI
+    }
+
+async def _settle_coins(flutter_id: str, user_email: str, old_status: str, new_status: str):
+    """status 变成 / 不再是 completed：+10 / -10 coins + pet 信号；回 (coins_change, 现在的 coins 或 None)"""
+    is_just_completed = (new_status == "completed" and old_status != "completed")
+    is_just_uncompleted = (old_status == "completed" and new_status != "completed")
 
     coins_change = 10 if is_just_completed else (-10 if is_just_uncompleted else 0)
 
     print(f"   --- Is Just Completed? {is_just_completed}")
     print(f"   --- Coins Change: {coins_change}")
-    print(f"   --- Looking for user email: {existing_task.user_email}")
+    print(f"   --- Looking for user email: {user_email}")
 
-    # 3) 更新任务本身（先更新任务）
-    await existing_task.update({"$set": task_data.model_dump(exclude={"id"})})
-
-    # 4) 若需要，更新用户 coins
     new_coins = None
     if coins_change != 0:
-        user = await User.find_one(User.email == existing_task.user_email)
-        if not user:
+        new_coins = await change_coins(user_email, coins_change, reason=f"task:{flutter_id}")
+        if new_coins is None:
             raise HTTPException(status_code=404, detail="User not found for coin update")
+        print("✅ COIN UPDATE:", user_email, "change=", coins_change, "now=", new_coins)
+        await apply_signal(get_db(), user_email,
+                           "task_completed" if is_just_completed else "task_uncompleted")
+    return coins_change, new_coins
 
-        user.coins = int(user.coins or 0) + int(coins_change)
-        await user.save()
-        new_coins = user.coins
-        print("✅ COIN UPDATE:", user.email, "change=", coins_change, "now=", user.coins)
+# 3b. 部分更新（JSON merge patch）：只送改了的字段，只 $set / $unset 那几个
+@router.patch("/tasks/{flutter_id}", tags=["Tasks"])
+async def patch_task(flutter_id: str, request: Request, patch: Dict[str, Any] = Body(...)):
+    return await idempotent(get_db(), request, "tasks.patch", flutter_id,
+                            lambda: _patch_task(flutter_id, patch))
 
-    # 5) 回传给 Flutter（关键：回 coins）
-    return {
-        "message": "Updated",
-        "coins_change": coins_change,
-        "coins": new_coins,   # 前端用这个直接更新 UI
-    }
+async def _patch_task(flutter_id: str, patch: Dict[str, Any]):
+    try:
+        update, changed = merge_patch(patch)
+    except PatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 一次 round trip：更新 + 拿回旧的 status（判断 coins），没有先读
+    before = await Task.get_motor_collection().find_one_and_update(
+        {"flutter_id": flutter_id}, update,
+        projection={"_id": 0, "user_email": 1, "status": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if touches_schedule(changed):
+        task = await Task.find_one(Task.flutter_id == flutter_id)
+        if task is not None:
+            await on_task_saved(task)
+    await publish([before["user_email"]], "task", {"op": "patched", "flutter_id": flutter_id, "patch": patch})
+
+    coins_change, new_coins = 0, None
+    if "status" in changed:
+        coins_change, new_coins = await _settle_coins(flutter_id, before["user_email"],
+                                                      before.get("status"), changed["status"] or "notStarted")
+    return {"message": "Updated", "changed": sorted(changed), "coins_change": coins_change, "coins": new_coins}
+
+# 3c. subtask：positional $ 只动那一个元素
+async def _subtask_update(flutter_id: str, sub_id: str, update: Dict[str, Any], op: str, data: Dict[str, Any]):
+    before = await Task.get_motor_collection().find_one_and_update(
+        {"flutter_id": flutter_id, "subtasks.id": sub_id}, update,
+        projection={"_id": 0, "user_email": 1},
+    )
+    if before is None:
+        raise HTTPException(status_code=404, detail="Task or subtask not found")
+    await publish([before["user_email"]], "task", {"op": op, "flutter_id": flutter_id, "subtask_id": sub_id, **data})
+    return {"message": "Updated"}
+
+@router.patch("/tasks/{flutter_id}/subtasks/{sub_id}", tags=["Tasks"])
+async def patch_subtask(flutter_id: str, sub_id: str, request: Request, patch: Dict[str, Any] = Body(...)):
+    try:
+        update = subtask_set(patch)
+    except PatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await idempotent(get_db(), request, "tasks.subtask.patch", f"{flutter_id}/{sub_id}",
+                            lambda: _subtask_update(flutter_id, sub_id, update, "subtask_patched", {"patch": patch}))
+
+class FocusMinutesIn(BaseModel):
+    minutes: int = Field(gt=0, le=24 * 60)
+
+@router.post("/tasks/{flutter_id}/subtasks/{sub_id}/focus", tags=["Tasks"])
+async def add_subtask_focus(flutter_id: str, sub_id: str, body: FocusMinutesIn, request: Request):
+    # $inc 不是幂等的：重试要带 Idempotency-Key
+    return await idempotent(get_db(), request, "tasks.subtask.focus", f"{flutter_id}/{sub_id}",
+                            lambda: _subtask_update(flutter_id, sub_id, subtask_inc_focus(body.minutes),
+                                                    "subtask_focus", {"minutes": body.minutes}))
+
+@router.post("/tasks/{flutter_id}/subtasks", tags=["Tasks"])
+async def add_subtask(flutter_id: str, sub: SubTask):
+    # filter 带 $ne：同一个 id 重送不会 push 两次
+    res = await Task.get_motor_collection().find_one_and_update(
+        {"flutter_id": flutter_id, "subtasks.id": {"$ne": sub.id}},
+        {"$push": {"subtasks": to_mongo(sub)}, "$set": {"updatedAt": datetime.now()}},
+        projection={"_id": 0, "user_email": 1},
+    )
+    if res is None:
+        if await Task.get_motor_collection().count_documents({"flutter_id": flutter_id}, limit=1):
+            return {"message": "Already exists"}
+        raise HTTPException(status_code=404, detail="Task not found")
+    await publish([res["user_email"]], "task", {"op": "subtask_added", "flutter_id": flutter_id, "subtask": sub})
+    return {"message": "Added"}
+
+@router.delete("/tasks/{flutter_id}/subtasks/{sub_id}", tags=["Tasks"])
+async def delete_subtask(flutter_id: str, sub_id: str):
+    res = await Task.get_motor_collection().find_one_and_update(
+        {"flutter_id": flutter_id, "subtasks.id": sub_id},
+        {"$pull": {"subtasks": {"id": sub_id}}, "$set": {"updatedAt": datetime.now()}},
+        projection={"_id": 0, "user_email": 1},
+    )
+    if res is None:
+        raise HTTPException(status_code=404, detail="Task or subtask not found")
+    await publish([res["user_email"]], "task", {"op": "subtask_deleted", "flutter_id": flutter_id, "subtask_id": sub_id})
+    return {"message": "Deleted"}
 
 # 4. 删除任务
 @router.delete("/tasks/{flutter_id}", tags=["Tasks"])
 async def delete_task(flutter_id: str):
-    existing_task = await Task.find_one(Task.flutter_id == flutter_id)
+    # 一次 round trip：删掉顺便拿回 user_email（push 用）
+    existing_task = await Task.get_motor_collection().find_one_and_delete(
+        {"flutter_id": flutter_id}, projection={"user_email": 1})
     if existing_task:
-        await existing_task.delete()
+        await on_task_deleted(flutter_id)
+        await publish([existing_task["user_email"]], "task", {"op": "deleted", "flutter_id": flutter_id})
         return {"message": "Deleted"}
     raise HTTPException(status_code=404, detail="Task not found")
\ No newline at end of file
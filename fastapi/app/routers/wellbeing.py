@@ -1,12 +1,18 @@
 # app/routers/wellbeing.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import Optional, Literal
 from datetime import datetime, date
+from zoneinfo import ZoneInfoNotFoundError
 from app.db import get_db
 from app.schemas.response import Envelope
 from app.utils.response_utils import ok, created
-from app.logic.risk_mongo import compute_stress_score, recommend_new_due_date, rollup_daily
+from app.logic.risk_mongo import (
+    compute_stress_score, recommend_due_dates, recommend_new_due_date, rollup_daily, rollup_range,
+)
+from app.logic.event_store import insert_event, insert_mood
+from app.logic.pet_state import apply_signal
+from app.logic.user_tz import get_user_timezone, local_today, set_user_timezone
 
 router = APIRouter(prefix="/wellbeing", tags=["wellbeing"])
 
@@ -36,22 +42,57 @@ class MoodIn(BaseModel):
 async def ingest_event(body: EventIn, db=Depends(get_db)):
     doc = body.model_dump()
     doc["ts"] = doc["ts"] or datetime.utcnow()
-    await db.events.insert_one(doc)
+    if not await insert_event(db, doc):  # 同一个 event_id 重送：不再写、不再加 pet 信号
+        return ok({"inserted": False, "event_id": body.event_id}, message="Duplicate event ignored")
+    await apply_signal(db, body.user_id, body.type)
     return created({"inserted": True, "event_id": body.event_id}, message="Event ingested")
 
 @router.post("/mood", response_model=Envelope[dict])
 async def log_mood(body: MoodIn, db=Depends(get_db)):
     doc = body.model_dump()
     doc["ts"] = doc["ts"] or datetime.utcnow()
-    await db.mood_logs.insert_one(doc)
+    if not await insert_mood(db, doc):
+        return ok({"inserted": False, "mood_id": body.mood_id}, message="Duplicate mood ignored")
+    await apply_signal(db, body.user_id, f"mood_{body.label}")
     return created({"inserted": True, "mood_id": body.mood_id}, message="Mood logged")
 
+# ---------- Timezone ----------
+class TimezoneIn(BaseModel):
+    timezone: str   # IANA 名字，比如 "Asia/Kuala_Lumpur"
+
+@router.put("/timezone/{user_id}", response_model=Envelope[dict])
+async def set_timezone(user_id: str, body: TimezoneIn, db=Depends(get_db)):
+    # 只影响之后 ingest 的数据；历史 local_day / local_hour 不重写
+    try:
+        tz = await set_user_timezone(db, user_id, body.timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=422, detail=f"Unknown timezone: {body.timezone}")
+    return ok({"user_id": user_id, "timezone": tz.key, "today": local_today(tz).isoformat()},
+              message="Timezone updated")
+
 # ---------- Daily rollup ----------
-@router.post("/rollup/{user_id}", response_model=Envelope[dict])
-async def do_rollup(user_id: str, day: Optional[date] = None, db=Depends(get_db)):
-    d = day or datetime.utcnow().date()
-    out = await rollup_daily(db, user_id, d)
-    return ok(out, message="Daily rollup")
+ROLLUP_MAX_RANGE_DAYS = 92
+
+@router.post("/rollup/{user_id}", response_model=Envelope[dict | list[dict]])
+async def do_rollup(
+    user_id: str,
+    day: Optional[date] = None,
+    from_: Optional[date] = Query(None, alias="from"),
+    to: Optional[date] = None,
+    db=Depends(get_db),
+):
+    # 日期都是 user 的本地日期；默认本地今天
+    today = local_today(await get_user_timezone(db, user_id))
+    if from_ is None and to is None:
+        out = await rollup_daily(db, user_id, day or today)
+        return ok(out, message="Daily rollup")
+
+    # ?from=&to=：一次 aggregation 算整段（缺一边就是单天 / 到今天）
+    first, last = from_ or to, to or today
+    if abs((last - first).days) >= ROLLUP_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=422, detail=f"Range too long (max {ROLLUP_MAX_RANGE_DAYS} days)")
+    rows = await rollup_range(db, user_id, first, last)
+    return ok(rows, message=f"Rollup {len(rows)} days")
 
 # ---------- Risk ----------
 @router.get("/risk/{user_id}", response_model=Envelope[dict])
@@ -60,6 +101,12 @@ async def risk(user_id: str, db=Depends(get_db)):
     return ok(s, message="Risk computed")
 
 # ---------- Due-date recommendation ----------
+@router.get("/tasks/recommend-due", response_model=Envelope[list[dict]])
+async def recommend_due_all(user_id: str, db=Depends(get_db)):
+    # 所有 open task 一次出（没有长期迟交模式的 task 不会出现）
+    items = await recommend_due_dates(db, user_id)
+    return ok(items, message=f"{len(items)} recommendations")
+
 @router.get("/tasks/{task_id}/recommend-due", response_model=Envelope[dict | None])
 async def recommend_due(task_id: str, user_id: str, db=Depends(get_db)):
     info = await recommend_new_due_date(db, user_id, task_id)
@@ -8,6 +8,7 @@ from passlib.exc import UnknownHashError
 from bson import ObjectId
 
 from app.db import get_db
+from app.logic import leaderboard
 from app.config import settings
 
 pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -105,8 +106,11 @@ async def register_user(email: str, password: str, display_name: Optional[str])
         "password_hash": _hash(password),  # canonical field name
         "token_version": 0,
         "created_at": datetime.now(timezone.utc),
+        "coins_v": 0,                            # 见 app/logic/leaderboard.py（重建 rank index 时用）
     }
+    doc["coins_at"] = doc["created_at"]
     res = await db.users.insert_one(doc)
+    await leaderboard.coins_changed(str(res.inserted_id), None, 0, 0, doc["coins_at"])   # 新 user 进 rank index（0 coins）
     return {"id": str(res.inserted_id), "email": email, "display_name": display_name or ""}
 
 
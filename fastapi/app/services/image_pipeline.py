@@ -0,0 +1,152 @@
+# app/services/image_pipeline.py
+"""
+Image-caption upload pipeline（bounded memory）：
+
+0) read_image_upload：自己 parse multipart（不用 File(...)）——Content-Length 超了直接 413，
+   没有 / 不老实的话读 request.stream() 读到上限就停，超大的 body 不会先被整个 spool 下来
+1) hash_upload_bounded：按 chunk 扫一遍 UploadFile，算 sha256，超过上限直接 413（不攒在内存里）
+2) caption cache：同一张图（sha256 一样）重复上传不再打模型
+3) prepare_image：在 worker thread 里直接从 upload 的（spooled）文件 decode + 缩到模型输入大小
+   （JPEG 用 draft 直接低分辨率解码，全分辨率的 bitmap 从来不会出现在内存里）
+4) 缩好的小图才交给 HuggingFaceClient.caption_image
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import io
+from typing import Any, AsyncIterator, BinaryIO, Dict, Tuple
+
+import httpx
+from fastapi import HTTPException, Request, UploadFile, status
+from starlette.datastructures import UploadFile as StarletteUpload
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.cache import LRUCache
+
+try:  # optional: 没装 Pillow 就把原图直接送去模型
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover
+    Image = None
+
+_caption_cache: LRUCache[str] = LRUCache(maxsize=settings.IMAGE_CAPTION_CACHE_SIZE)
+metrics.register("image_caption_cache", _caption_cache.snapshot)
+
+# multipart 的 boundary + part header 的余量；图本身的上限由 hash_upload_bounded 精确检查
+_MULTIPART_SLACK = 16 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        f"Image too large (max {max_bytes // (1024 * 1024)} MB).",
+    )
+
+
+class _BodyTooLarge(MultiPartException):
+    # MultiPartException 的子类：parser 出错时会把已经 spool 的 file 关掉
+    pass
+
+
+async def _capped(stream: AsyncIterator[bytes], limit: int) -> AsyncIterator[bytes]:
+    n = 0
+    async for chunk in stream:
+        n += len(chunk)
+        if n > limit:
+            raise _BodyTooLarge("body too large")
+        yield chunk
+
+
+async def read_image_upload(request: Request, field: str, max_bytes: int) -> StarletteUpload:
+    """parse multipart 之前就卡住上限；返回 field 对应的 UploadFile（用完要 close）"""
+    limit = max_bytes + _MULTIPART_SLACK
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limit:
+        raise _too_large(max_bytes)
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, "Expected multipart/form-data.")
+
+    parser = MultiPartParser(request.headers, _capped(request.stream(), limit), max_files=1, max_fields=16)
+    try:
+        form = await parser.parse()
+    except _BodyTooLarge:
+        raise _too_large(max_bytes)
+    except MultiPartException as e:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, str(e))
+    upload = None
+    for key, value in form.multi_items():
+        if key == field and isinstance(value, StarletteUpload):
+            upload = value
+        elif isinstance(value, StarletteUpload):
+            await value.close()
+    if upload is None:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Missing file field '{field}'.")
+    return upload
+
+
+async def hash_upload_bounded(file: UploadFile, max_bytes: int, chunk_size: int) -> Tuple[int, str]:
+    """按 chunk 扫一遍：返回 (size, sha256 hex)，超过 max_bytes 就 413；扫完 seek 回开头"""
+    too_large = _too_large(max_bytes)
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+
+    h = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        h.update(chunk)
+    await file.seek(0)
+    return size, h.hexdigest()
+
+
+def prepare_image(fp: BinaryIO, max_side: int) -> Tuple[bytes, str]:
+    """decode + 缩图（CPU + 文件 IO，放在 thread 跑）；返回 (bytes, content_type)"""
+    if Image is None:
+        return fp.read(), "application/octet-stream"
+    try:
+        img = Image.open(fp)
+        # JPEG：让 decoder 直接按 1/2、1/4、1/8 解码，不会先展开成全分辨率
+        img.draft("RGB", (max_side, max_side))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_side, max_side))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=85)
+        return out.getvalue(), "image/jpeg"
+    except (OSError, Image.DecompressionBombError) as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, f"Cannot decode image: {e}")
+
+
+async def caption_upload(file: UploadFile, hf) -> Dict[str, Any]:
+    _, digest = await hash_upload_bounded(
+        file, settings.IMAGE_MAX_UPLOAD_BYTES, settings.IMAGE_READ_CHUNK_BYTES
+    )
+    cached = _caption_cache.get(digest)
+    if cached is not None:
+        return {"caption": cached, "cached": True, "sha256": digest}
+
+    small, ctype = await asyncio.to_thread(prepare_image, file.file, settings.IMAGE_MODEL_MAX_SIDE)
+    try:
+        caption = await hf.caption_image(small, content_type=ctype)
+    except RuntimeError as e:  # 没配置 HF_TOKEN
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, str(e))
+    except httpx.TimeoutException:
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Image caption model timed out, try again shortly.")
+    except httpx.HTTPStatusError as e:
+        # HF 模型冷启动 / 过载时回 503（loading），这种让 client 稍后重试；其他的算 upstream 错
+        code = e.response.status_code
+        if code in (429, 503):
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Image caption model is busy, try again shortly.")
+        raise HTTPException(status.HTTP_502_BAD_GATEWAY, f"Image caption model failed ({code}).")
+    except httpx.HTTPError as e:
+        raise HTTPException(status.HTTP_502_BAD_GATEWAY, f"Image caption model unreachable: {e.__class__.__name__}")
+    if caption:
+        _caption_cache.set(digest, caption)
+    return {"caption": caption, "cached": False, "sha256": digest}
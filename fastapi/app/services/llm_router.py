@@ -0,0 +1,195 @@
+# app/services/llm_router.py
+"""
+LLM provider routing：circuit breaker + request deadline + hedged fallback。
+
+以前 Inworld 慢的话要等满 40s 才 fallback 到 Groq，Groq 再慢又是 40s。现在：
+
+    provider, reply = await first_answer(
+        [("inworld", lambda: iw.chat(...)), ("groq", lambda: hf.generate_reply(prompt))],
+        fallback=("local", lambda: local_reply(score)),
+    )
+
+- 按顺序一个一个开：前一个失败就马上开下一个；前一个 hedge_after 秒还没回，也开下一个（前一个不取消）
+- 谁先成功回谁，其余的 cancel；local fallback 是链上最后一个（本地算，立刻有结果）
+- deadline 到了全部 cancel；有 fallback 回 fallback，没有就 raise TimeoutError
+- 每个 provider 一个 CircuitBreaker：连续 failure_threshold 次失败（或慢到被 hedge 掉 / deadline 砍掉）
+  就 open，open 期间直接跳过它；reset_after 秒之后 half-open 放一个 probe，成功就 close
+- breaker 状态在 GET /metrics 的 "llm" 里
+
+单一 provider（没有 backup）用 call(name, fn, deadline)。breaker 是 per worker process 的。
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+from app.utils import metrics
+
+Call = Callable[[], Awaitable[str]]
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_after: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURES
+        self.reset_after = reset_after or settings.LLM_BREAKER_RESET_SECONDS
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "slow": 0, "rejected": 0, "opened": 0}
+        self._latency_ewma: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+            self._state = HALF_OPEN
+        return self._state
+
+    def allow(self) -> bool:
+        """能不能打这个 provider；half-open 时只放一个 probe"""
+        state = self.state
+        if state == CLOSED or (state == HALF_OPEN and not self._probing):
+            self._probing = state == HALF_OPEN
+            self.stats["calls"] += 1
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self, latency: float) -> None:
+        self.stats["successes"] += 1
+        self._failures = 0
+        self._probing = False
+        self._state = CLOSED
+        self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+    def record_failure(self, slow: bool = False) -> None:
+        self.stats["slow" if slow else "failures"] += 1
+        self._failures += 1
+        was_probe, self._probing = self._probing, False
+        if was_probe or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.stats["opened"] += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """被 cancel 但不算失败（比如别人先回了）：把 probe 名额还回去"""
+        self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "latency_ewma_ms": round(self._latency_ewma * 1000, 1) if self._latency_ewma is not None else None,
+            **self.stats,
+        }
+
+
+BREAKERS: Dict[str, CircuitBreaker] = {}
+_stats: Dict[str, Any] = {"requests": 0, "hedges": 0, "fallbacks": 0, "deadline_exceeded": 0, "wins": {}}
+
+
+def breaker(name: str) -> CircuitBreaker:
+    if name not in BREAKERS:
+        BREAKERS[name] = CircuitBreaker(name)
+    return BREAKERS[name]
+
+
+async def _guarded(b: CircuitBreaker, fn: Call, slow_after: float) -> str:
+    t0 = time.monotonic()
+    try:
+        out = await fn()
+        if not out:
+            raise ValueError("empty reply")
+    except asyncio.CancelledError:
+        # 被 hedge 掉 / deadline 砍掉：跑得比 slow_after 还久就算一次「慢」
+        if time.monotonic() - t0 >= slow_after:
+            b.record_failure(slow=True)
+        else:
+            b.release()
+        raise
+    except Exception:
+        b.record_failure()
+        raise
+    b.record_success(time.monotonic() - t0)
+    return out
+
+
+async def first_answer(
+    calls: Sequence[Tuple[str, Call]],
+    *,
+    fallback: Optional[Tuple[str, Callable[[], str]]] = None,
+    deadline: Optional[float] = None,
+    hedge_after: Optional[float] = None,
+) -> Tuple[str, str]:
+    """按顺序 + hedge 跑 calls，回 (provider, text)；全挂 / deadline 到了就回 fallback"""
+    deadline = settings.LLM_CHAT_DEADLINE_SECONDS if deadline is None else deadline
+    hedge_after = settings.LLM_HEDGE_AFTER_SECONDS if hedge_after is None else hedge_after
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    queue: List[Tuple[str, Call]] = list(calls)
+    running: Dict[asyncio.Task, str] = {}
+    _stats["requests"] += 1
+
+    def launch() -> bool:
+        while queue:
+            name, fn = queue.pop(0)
+            b = breaker(name)
+            if b.allow():
+                running[asyncio.create_task(_guarded(b, fn, hedge_after))] = name
+                return True
+        return False
+
+    def use_fallback() -> Tuple[str, str]:
+        if fallback is None:
+            raise TimeoutError("no LLM provider answered before the deadline")
+        _stats["fallbacks"] += 1
+        return fallback[0], fallback[1]()
+
+    try:
+        launch()
+        next_hedge = loop.time() + hedge_after
+        while True:
+            if not running and not launch():
+                return use_fallback()           # 全部失败 / breaker 全 open
+            now = loop.time()
+            if now >= end:
+                _stats["deadline_exceeded"] += 1
+                return use_fallback()
+            has_next = bool(queue) or fallback is not None
+            wait = min(end, next_hedge) - now if has_next else end - now
+            done, _ = await asyncio.wait(running, timeout=max(wait, 0), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                if not task.cancelled() and task.exception() is None:
+                    _stats["wins"][name] = _stats["wins"].get(name, 0) + 1
+                    return name, task.result()
+            if done:
+                # 有 provider 失败了：不等 hedge timer，马上开下一个
+                if launch():
+                    next_hedge = loop.time() + hedge_after
+            elif has_next and loop.time() >= next_hedge:
+                # 前一个太慢：开下一个 provider；没有了就用本地 fallback
+                _stats["hedges"] += 1
+                if not launch():
+                    return use_fallback()
+                next_hedge = loop.time() + hedge_after
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def call(name: str, fn: Call, deadline: float) -> str:
+    """只有一个 provider：breaker open 就直接 raise，不用等"""
+    b = breaker(name)
+    if not b.allow():
+        raise RuntimeError(f"{name} circuit open")
+    async with asyncio.timeout(deadline):
+        return await _guarded(b, fn, deadline)
+
+
+metrics.register("llm", lambda: {**_stats, "breakers": {n: b.snapshot() for n, b in BREAKERS.items()}})
@@ -1,7 +1,7 @@
 # app/services/pet_ai.py
 from __future__ import annotations
 import os, httpx, base64
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
@@ -13,13 +13,20 @@ _vader = SentimentIntensityAnalyzer()
 # --- Groq 配置 ---
 GROQ_API_KEY = (os.getenv("GROQ_API_KEY") or "").strip()
 GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_MODEL = "llama-3.1-8b-instant"
+
+# --- Hugging Face（只用来做 image caption） ---
+HF_TOKEN = (os.getenv("HF_TOKEN") or "").strip()
+HF_CAPTION_MODEL = (os.getenv("HF_CAPTION_MODEL") or "Salesforce/blip-image-captioning-large").strip()
+HF_CAPTION_URL = f"https://router.huggingface.co/hf-inference/models/{HF_CAPTION_MODEL}"
 
 
 class HuggingFaceClient:
     """
-    现在不再调用 Hugging Face Inference API：
+    现在大部分不再调用 Hugging Face Inference API：
     - analyze_sentiment 用本地 VADER
     - generate_reply 用 Groq（免费、低延迟）
+    - caption_image 才用 HF Inference（需要 HF_TOKEN）
     """
     def __init__(self):
         pass
@@ -38,19 +45,45 @@ class HuggingFaceClient:
         if not GROQ_API_KEY:
             # 没有 Groq Key 的兜底
             return "I’m here with you. Let’s take a tiny step together. 🌟"
+        return await groq_chat([{"role": "user", "content": prompt}], temperature=0.8, max_tokens=160)
 
-        headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
-        body = {
-            "model": "llama-3.1-8b-instant",
-            "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.8,
-            "max_tokens": 160
-        }
+    async def caption_image(self, image_bytes: bytes, content_type: str = "image/jpeg") -> str:
+        """image_bytes 最好已经缩到模型输入大小（见 app/services/image_pipeline.py）"""
+        if not HF_TOKEN:
+            raise RuntimeError("HF_TOKEN not set, image caption is disabled")
+        headers = {"Authorization": f"Bearer {HF_TOKEN}", "Content-Type": content_type}
         async with httpx.AsyncClient(timeout=40) as c:
-            r = await c.post(GROQ_URL, headers=headers, json=body)
+            r = await c.post(HF_CAPTION_URL, headers=headers, content=image_bytes)
             r.raise_for_status()
             data = r.json()
-            return data["choices"][0]["message"]["content"].strip()
+            if isinstance(data, list):
+                data = data[0] if data else {}
+            return str(data.get("generated_text") or "").strip()
+
+
+async def groq_chat(messages: List[Dict[str, str]], *, model: str = GROQ_MODEL,
+                    temperature: float = 0.8, max_tokens: Optional[int] = None) -> str:
+    """裸的 Groq chat completion；没 key / HTTP 出错都直接 raise（给 llm_router 算 breaker 用）"""
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY not set")
+    headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
+    body: Dict[str, Any] = {"model": model, "messages": messages, "temperature": temperature}
+    if max_tokens:
+        body["max_tokens"] = max_tokens
+    async with httpx.AsyncClient(timeout=40) as c:
+        r = await c.post(GROQ_URL, headers=headers, json=body)
+        r.raise_for_status()
+        data = r.json()
+        return data["choices"][0]["message"]["content"].strip()
+
+
+def local_reply(stress_score: float) -> str:
+    """provider 全挂 / 太慢时的本地回复：跟 persona 的三档建议一致"""
+    if stress_score >= 70:
+        return "You’ve been carrying a lot 🫂 Let’s take a 5-minute break, then move one task to tomorrow."
+    if stress_score >= 40:
+        return "How about 25 focused minutes on just one thing? Grab some water first 💧"
+    return "You’re doing great — keep the streak going! 🌟"
 
 
 # --- Inworld（可选：等你搭代理后再启用） ---
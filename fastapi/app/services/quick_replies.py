@@ -0,0 +1,131 @@
+# app/services/quick_replies.py
+"""
+Pet chat 的 fast path：很多消息是 "hi" / "thanks" / "I'm tired" / "done!" 这种，
+没必要每次都走一趟 LLM。
+
+    reply = lookup(user_id, text, senti["label"], risk["score"])     # None = 走 LLM
+    ...
+    remember(user_id, text, senti["label"], risk["score"], reply, llm_seconds)
+
+1. intent：短消息（<= CHAT_FASTPATH_MAX_WORDS 个词）规范化后对一下常见 intent，
+   命中就从 persona 风格的模板里挑一句（按 stress 档位选语气）
+2. cache：key = (user_id, 规范化文本, sentiment label, stress 档位)，复用这个 user 最近 LLM 的回复（LRU + TTL）；
+   LLM 的回复是拿这个 user 的对话记忆拼出来的，不能跨 user 复用（模板没有这个问题，所有人共用）；
+   也只收短消息 —— 长消息跟上下文关系更大
+3. 都没中才打 LLM；LLM 的平均耗时（EWMA）用来估算省了多少时间（GET /metrics 的 "chat_fastpath"）
+"""
+from __future__ import annotations
+import random
+import re
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.cache import LRUCache
+
+_PUNCT_RE = re.compile(r"[^\w\s']+")
+_REPEAT_RE = re.compile(r"(\w)\1{2,}")     # "hiiii" -> "hi"，"sooo" -> "so"
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    t = _PUNCT_RE.sub(" ", text.lower().replace("’", "'"))
+    t = _REPEAT_RE.sub(r"\1", t)
+    return _SPACE_RE.sub(" ", t).strip()
+
+
+def stress_bucket(score: float) -> str:
+    # 跟 persona 里的三档一样
+    return "high" if score >= 70 else ("mid" if score >= 40 else "low")
+
+
+# intent -> 规范化之后整句完全等于其中一个才算（短消息，不做模糊匹配，宁可漏也别答错）
+_INTENT_PHRASES: Dict[str, Tuple[str, ...]] = {
+    "greeting": ("hi", "hello", "hey", "hey dodo", "hi dodo", "hello dodo", "yo", "good morning",
+                 "morning", "good afternoon", "good evening", "hai", "hii"),
+    "thanks": ("thanks", "thank you", "thx", "ty", "thanks dodo", "thank you dodo", "tq", "thank u"),
+    "tired": ("tired", "i'm tired", "im tired", "so tired", "i am tired", "exhausted", "i'm exhausted",
+              "sleepy", "i'm sleepy", "im sleepy"),
+    "done": ("done", "finished", "i'm done", "im done", "i finished", "i did it", "did it",
+             "all done", "task done", "completed"),
+    "bye": ("bye", "goodbye", "bye dodo", "good night", "goodnight", "gn", "see you", "see ya", "night"),
+    "ack": ("ok", "okay", "k", "sure", "alright", "got it", "cool", "nice", "yes", "yep"),
+}
+_PHRASE_TO_INTENT = {p: intent for intent, phrases in _INTENT_PHRASES.items() for p in phrases}
+
+# (intent, stress 档位) -> 模板；没有档位专用的就用 "any"
+_TEMPLATES: Dict[Tuple[str, str], Tuple[str, ...]] = {
+    ("greeting", "any"): ("Hi hi! 👋 I’m right here. What are we doing today?",
+                          "Hello! 🐾 So happy to see you. Ready for one tiny step?"),
+    ("greeting", "high"): ("Hi 🫂 I’m here. Want to start with something really small today?",),
+    ("thanks", "any"): ("Anytime! 💛 I’m proud of you.", "You’re welcome! We make a good team 🐾"),
+    ("tired", "any"): ("Rest counts as progress too 🌙 Maybe a short break and some water?",
+                       "Let’s slow down a little 💧 A 5-minute stretch could help."),
+    ("tired", "high"): ("You’ve been carrying a lot 🫂 Take a proper break — we can move one task to tomorrow.",),
+    ("done", "any"): ("Yay, you did it! 🎉 That’s one more win for today.",
+                      "Amazing work! 🌟 Want to celebrate with a quick break?"),
+    ("bye", "any"): ("Bye for now! 👋 I’ll be here when you come back.", "Good night 🌙 Sleep well, you did enough today."),
+    ("ack", "any"): ("Okay! 🐾 I’m here if you need me.", "Got it 👍 One tiny step at a time."),
+}
+
+_cache: LRUCache[str] = LRUCache(maxsize=settings.CHAT_REPLY_CACHE_SIZE, ttl=settings.CHAT_REPLY_CACHE_TTL_SECONDS)
+_stats: Dict[str, float] = {"lookups": 0, "intent_hits": 0, "cache_hits": 0, "llm_calls": 0, "llm_seconds_ewma": 0.0}
+
+
+def match_intent(norm: str) -> Optional[str]:
+    return _PHRASE_TO_INTENT.get(norm)
+
+
+def _template(intent: str, bucket: str) -> str:
+    options = _TEMPLATES.get((intent, bucket)) or _TEMPLATES[(intent, "any")]
+    return random.choice(options)
+
+
+def _short(norm: str) -> bool:
+    return 0 < norm.count(" ") + 1 <= settings.CHAT_FASTPATH_MAX_WORDS
+
+
+def lookup(user_id: str, text: str, sentiment_label: str, stress_score: float) -> Optional[Tuple[str, str]]:
+    """命中回 (source, reply)，source = "intent" / "cache"；没中回 None"""
+    _stats["lookups"] += 1
+    norm = normalize(text)
+    if not _short(norm):
+        return None
+    bucket = stress_bucket(stress_score)
+    intent = match_intent(norm)
+    if intent is not None:
+        _stats["intent_hits"] += 1
+        return "intent", _template(intent, bucket)
+    cached = _cache.get((user_id, norm, sentiment_label, bucket))
+    if cached is not None:
+        _stats["cache_hits"] += 1
+        return "cache", cached
+    return None
+
+
+def remember(user_id: str, text: str, sentiment_label: str, stress_score: float, reply: str, llm_seconds: float) -> None:
+    """LLM 真的回了一次：记下耗时（估算省下的时间用），短消息的回复进 cache"""
+    a = 0.2
+    _stats["llm_calls"] += 1
+    _stats["llm_seconds_ewma"] = llm_seconds if _stats["llm_calls"] == 1 else (1 - a) * _stats["llm_seconds_ewma"] + a * llm_seconds
+    norm = normalize(text)
+    if _short(norm):
+        _cache.set((user_id, norm, sentiment_label, stress_bucket(stress_score)), reply)
+
+
+def snapshot() -> Dict[str, object]:
+    hits = _stats["intent_hits"] + _stats["cache_hits"]
+    lookups = _stats["lookups"]
+    return {
+        "lookups": int(lookups),
+        "intent_hits": int(_stats["intent_hits"]),
+        "cache_hits": int(_stats["cache_hits"]),
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "llm_calls": int(_stats["llm_calls"]),
+        "llm_avg_ms": round(_stats["llm_seconds_ewma"] * 1000, 1),
+        "estimated_ms_saved": round(hits * _stats["llm_seconds_ewma"] * 1000),
+        "cache": _cache.snapshot(),
+    }
+
+
+metrics.register("chat_fastpath", snapshot)
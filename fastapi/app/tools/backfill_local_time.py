@@ -0,0 +1,36 @@
+# app/tools/backfill_local_time.py
+"""
+给旧的 events / mood_logs（local_day 之前写进去的）补上 local_day / local_hour。
+
+    cd fastapi
+    python -m app.tools.backfill_local_time --batch 2000
+
+- 用 user「现在」的时区（users.preferences.timezone，没有就 DEFAULT_TIMEZONE）
+- 只处理还没有 local_day 的 document：已经打过的不会被重写，重跑是安全的
+- time-series layout 要 MongoDB 7.0+ 才能 update 非 meta 字段
+- 平时不用手动跑：init_db 启动时会自动补一次（event_store.ensure_local_time）；
+  这里是 dry-run / 只补一种 / 启动时补失败之后重跑用的
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+
+from app.db import init_db
+from app.logic.event_store import EVENTS, MOODS, backfill_local_time
+
+
+async def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Stamp local_day / local_hour on legacy events and mood logs")
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--only", choices=[EVENTS, MOODS])
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    db = await init_db(migrate=False)   # --dry-run 不能先被启动时的 migration 真的写了
+    for kind in ([args.only] if args.only else [EVENTS, MOODS]):
+        n = await backfill_local_time(db, kind, args.batch, args.dry_run)
+        print(f"✅ {kind}: {n} documents")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+# app/tools/explain_task_queries.py
+"""
+检查 GET /tasks/query 的每一种 filter 组合（x 每种 sort）和 GET /tasks/agenda 的 range query 都走 index。
+
+    cd fastapi
+    python -m app.tools.explain_task_queries            # 有 COLLSCAN 就 exit 1（CI 可以直接跑）
+    python -m app.tools.explain_task_queries --verbose  # 每个组合的 winning plan
+
+- 要连真的 Mongo（MONGO_URI）；init_db 会顺便把 task_query 的 index 建好
+- 只跑 explain（queryPlanner），不会读 / 写任何 task
+- 同样的检查也在 tests/test_task_query_indexes.py（MONGO_TEST_URI，连不上就 skip）
+- 「blocking SORT」只是提示：user 的 task 量级下内存排序没问题，但说明 sort 没用上 index 顺序
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import sys
+from datetime import date
+from typing import Any, Dict, List
+
+from app.db import init_db
+from app.logic.agenda import agenda_match
+from app.logic.task_query import build_query, filter_combinations
+
+
+def plan_stages(node: Any) -> List[Dict[str, Any]]:
+    """explain 输出里所有的 stage（classic 的 inputStage(s) / SBE 的 queryPlan 都走一遍）"""
+    out: List[Dict[str, Any]] = []
+    if isinstance(node, dict):
+        if "stage" in node:
+            out.append(node)
+        for v in node.values():
+            out += plan_stages(v)
+    elif isinstance(node, list):
+        for v in node:
+            out += plan_stages(v)
+    return out
+
+
+def summarize(explain: Dict[str, Any]) -> Dict[str, Any]:
+    stages = plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+    names = [s["stage"] for s in stages]
+    return {
+        "collscan": "COLLSCAN" in names,
+        "blocking_sort": "SORT" in names,
+        "indexes": sorted({s["indexName"] for s in stages if s.get("indexName")}),
+        "stages": names,
+    }
+
+
+async def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Assert every /tasks/query filter combination uses an index")
+    ap.add_argument("--user", default="explain@example.com", help="user_email to plan for (the data does not matter)")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    db = await init_db()
+    col = db.tasks
+    bad = sorts = 0
+    for name, kwargs in filter_combinations():
+        flt, order = build_query(args.user, **kwargs)
+        explain = await col.find(flt).sort(order).limit(51).explain()
+        s = summarize(explain)
+        bad += s["collscan"]
+        sorts += s["blocking_sort"]
+        if args.verbose or s["collscan"]:
+            mark = "❌" if s["collscan"] else ("⚠️ " if s["blocking_sort"] else "✅")
+            print(f"{mark} {name:<55} {','.join(s['indexes']) or '-':<45} {' > '.join(s['stages'])}")
+
+    # agenda：只看 $match（后面的 $project / $sort 不影响 index 选择）
+    s = summarize(await col.find(agenda_match(args.user, date(2025, 1, 1), date(2025, 1, 31))).explain())
+    bad += s["collscan"]
+    if args.verbose or s["collscan"]:
+        print(f"{'❌' if s['collscan'] else '✅'} {'agenda month':<55} {','.join(s['indexes']) or '-':<45} {' > '.join(s['stages'])}")
+
+    total = sum(1 for _ in filter_combinations()) + 1
+    print(f"\n{total} combinations: {total - bad} indexed, {bad} COLLSCAN, {sorts} with an in-memory SORT")
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
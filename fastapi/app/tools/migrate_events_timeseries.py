@@ -0,0 +1,80 @@
+# app/tools/migrate_events_timeseries.py
+"""
+把旧的 events / mood_logs 分批 copy 到 time-series collection（events_ts / mood_logs_ts）。
+
+    cd fastapi
+    EVENTS_STORAGE=timeseries python -m app.tools.migrate_events_timeseries --batch 2000
+
+- 按 _id 顺序分批读，insert_many(ordered=False)
+- 每批之后把 last _id 写进 `migrations` collection：中断后再跑会从断点继续
+- 原 collection 不删，确认没问题后再手动 drop
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+
+from pymongo.errors import OperationFailure
+
+from app.config import settings
+from app.db import init_db
+from app.logic.event_store import EVENTS, MOODS, timeseries_name, to_timeseries
+
+
+async def migrate(db, kind: str, batch: int, dry_run: bool = False) -> int:
+    src, dst = db[kind], db[timeseries_name(kind)]
+    ckpt_id = f"{kind}->{timeseries_name(kind)}"
+    ckpt = await db.migrations.find_one({"_id": ckpt_id}) or {}
+    last_id = ckpt.get("last_id")
+    copied = int(ckpt.get("copied", 0))
+    first_batch = True
+    t0 = time.perf_counter()
+
+    while True:
+        flt = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await src.find(flt).sort("_id", 1).limit(batch).to_list(length=batch)
+        if not docs:
+            break
+        # time-series 的 ts 必须是 date；没有 ts 的旧数据跳过
+        rows = [to_timeseries(kind, d) for d in docs if d.get("ts") is not None]
+        if not dry_run and rows:
+            if first_batch and last_id is not None:
+                # 上次可能在「insert 完、checkpoint 还没写」时中断：先删掉这一批，避免重复
+                try:
+                    await dst.delete_many({"_id": {"$in": [r["_id"] for r in rows]}})
+                except OperationFailure:
+                    pass  # MongoDB < 7.0 的 time-series 不支持按非 meta 字段删
+            await dst.insert_many(rows, ordered=False)
+            await db.migrations.update_one(
+                {"_id": ckpt_id},
+                {"$set": {"last_id": docs[-1]["_id"], "copied": copied + len(rows)}},
+                upsert=True,
+            )
+        first_batch = False
+        last_id = docs[-1]["_id"]
+        copied += len(rows)
+        rate = copied / max(time.perf_counter() - t0, 1e-9)
+        print(f"  {kind}: {copied} copied ({rate:.0f}/s)")
+    return copied
+
+
+async def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Copy events / mood_logs into time-series collections")
+    ap.add_argument("--batch", type=int, default=1000)
+    ap.add_argument("--only", choices=[EVENTS, MOODS])
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+
+    if settings.EVENTS_STORAGE != "timeseries":
+        print("⚠️  EVENTS_STORAGE is not 'timeseries' — collections are created anyway, "
+              "but the app keeps reading the standard layout until you switch.")
+        settings.EVENTS_STORAGE = "timeseries"  # 让 init_db 建好 time-series collection
+
+    db = await init_db()
+    for kind in ([args.only] if args.only else [EVENTS, MOODS]):
+        n = await migrate(db, kind, args.batch, args.dry_run)
+        print(f"✅ {kind}: {n} documents")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+# app/tools/nightly_rollup.py
+"""
+Nightly rollup 当 sidecar / cron 跑（web worker 里可以 SCHEDULER_ENABLED=false 关掉）。
+
+    cd fastapi
+    python -m app.tools.nightly_rollup --once     # 跑一轮就退出（cron）
+    python -m app.tools.nightly_rollup            # 常驻，和 app 里的 loop 一样
+
+跟 app 里的 scheduler 抢同一个 lease，同时开着也不会重复跑。
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+
+from app.db import init_db
+from app.logic.scheduler import run_once, scheduler_loop
+from app.utils.lease import MongoLease
+
+
+async def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Roll up yesterday (local time) for all active users")
+    ap.add_argument("--once", action="store_true", help="run a single pass and exit")
+    args = ap.parse_args(argv)
+
+    db = await init_db()
+    if not args.once:
+        await scheduler_loop(db)
+        return
+
+    lease = MongoLease(db, "nightly_rollup")
+    if not await lease.acquire():
+        print("⏭️  another worker holds the nightly_rollup lease")
+        return
+    try:
+        n = await run_once(db, lease)
+        print(f"✅ rolled up {n} users")
+    finally:
+        await lease.release()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
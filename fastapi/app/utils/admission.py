@@ -0,0 +1,137 @@
+# app/utils/admission.py
+"""
+Admission control for slow (LLM-backed) routes。
+
+每个 AdmissionGate = 一个 route 的并发上限 + 每个 client 一个 token bucket：
+- user 太频繁          -> 429 + Retry-After（bucket 补满一个 token 要多久）
+- 并发满了，排队也满了 -> 立刻 503 + Retry-After
+- 排队超过 queue_timeout -> 503 + Retry-After
+这样 AI 路由再怎么爆，也只占固定数量的 slot，/tasks、/balance 这些 CRUD 不会被饿死。
+注意：限制是 per-process 的（gunicorn -w 2 就是 2 倍）。
+
+用法：
+    CHAT_GATE = AdmissionGate("ai_pet_chat", max_concurrent=8)
+
+    async with CHAT_GATE.slot(request.client.host):   # key 不能用 client 自己填的 user_id（换一个就绕过了）
+        ...
+"""
+from __future__ import annotations
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.utils import metrics
+
+_GATES: Dict[str, "AdmissionGate"] = {}
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: Optional[float] = None) -> Tuple[bool, float]:
+        """拿一个 token；拿不到就返回还要等多少秒"""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class AdmissionGate:
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int = 32,
+        queue_timeout: float = 5.0,
+        user_rate_per_min: float = 20,
+        user_burst: int = 5,
+        max_tracked_users: int = 10_000,
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_rate = user_rate_per_min / 60.0
+        self.user_burst = user_burst
+        self.max_tracked_users = max_tracked_users
+
+        self._sem = asyncio.Semaphore(max_concurrent)
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        self.waiting = 0
+        self.stats = {"admitted": 0, "rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+        _GATES[name] = self
+
+    def _bucket(self, user_key: str) -> TokenBucket:
+        b = self._buckets.get(user_key)
+        if b is None:
+            b = TokenBucket(self.user_rate, self.user_burst)
+            self._buckets[user_key] = b
+            if len(self._buckets) > self.max_tracked_users:
+                self._buckets.popitem(last=False)  # 最久没来的 user 丢掉（等于重新给满 bucket）
+        else:
+            self._buckets.move_to_end(user_key)
+        return b
+
+    def _reject(self, code: int, reason: str, retry_after: float):
+        self.stats[reason] += 1
+        raise HTTPException(
+            status_code=code,
+            detail=f"{self.name}: too many requests, please retry later ({reason})",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    @asynccontextmanager
+    async def slot(self, user_key: Optional[str] = None):
+        if user_key and self.user_rate > 0:
+            allowed, wait = self._bucket(user_key).take()
+            if not allowed:
+                self._reject(status.HTTP_429_TOO_MANY_REQUESTS, "rate_limited", wait)
+
+        if self._sem.locked():
+            if self.waiting >= self.max_queue:
+                self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "queue_full", self.queue_timeout)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject(status.HTTP_503_SERVICE_UNAVAILABLE, "queue_timeout", self.queue_timeout)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._sem.acquire()
+
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._sem.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **self.stats,
+        }
+
+
+def gates() -> Dict[str, AdmissionGate]:
+    return dict(_GATES)
+
+
+metrics.register("admission", lambda: {n: g.snapshot() for n, g in _GATES.items()})
@@ -0,0 +1,189 @@
+# app/utils/compression.py
+"""
+Response compression (gzip / brotli)，按 Accept-Encoding 协商。
+
+- 小于 minimum_size 的 body 不压（压缩头 + CPU 不划算）
+- SSE（text/event-stream）、已经有 Content-Encoding 的、图片/压缩包这类本来就压过的，直接放行
+- body 大于 offload_size 时，压缩丢到 worker thread，不卡 event loop
+- StreamingResponse（比如 export）按 chunk 流式压缩
+"""
+from __future__ import annotations
+import zlib
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # optional: pip install brotli
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# 本来就是压缩格式，再压只会浪费 CPU
+_ALREADY_COMPRESSED_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+_ALREADY_COMPRESSED_TYPES = {
+    "application/gzip", "application/x-gzip", "application/zip", "application/x-brotli",
+    "application/zstd", "application/pdf", "application/octet-stream",
+}
+
+
+def choose_encoding(accept_encoding: str, *, brotli_enabled: bool = True) -> Optional[str]:
+    """解析 Accept-Encoding（含 q 值），返回 "br" / "gzip" / None；同分时优先 br"""
+    supported = ["br", "gzip"] if (brotli_enabled and brotli is not None) else ["gzip"]
+    q: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.strip().lower() == "q":
+                try:
+                    weight = float(v)
+                except ValueError:
+                    weight = 0.0
+        q[token] = weight
+
+    best, best_q = None, 0.0
+    for enc in supported:
+        w = q.get(enc, q.get("*", 0.0))
+        if w > best_q:
+            best, best_q = enc, w
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._c = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._c.finish()
+        return self._c.flush(zlib.Z_FINISH)
+
+    def oneshot(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.finish()
+        return self._c.compress(data) + self._c.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        offload_size: int = 64 * 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+        brotli_enabled: bool = True,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.offload_size = offload_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.brotli_enabled = brotli_enabled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), brotli_enabled=self.brotli_enabled
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressingResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    def __init__(self, mw: CompressionMiddleware, encoding: str, send: Send):
+        self.mw = mw
+        self.encoding = encoding
+        self._send = send
+        self._start: Optional[Message] = None
+        self._passthrough = False
+        self._streaming = False
+        self._compressor: Optional[_Compressor] = None
+
+    def _should_skip(self, start: Message) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304):
+            return True
+        headers = Headers(raw=start["headers"])
+        if "content-encoding" in headers:
+            return True
+        ctype = headers.get("content-type", "").split(";")[0].strip().lower()
+        if ctype == "text/event-stream":
+            return True
+        return ctype in _ALREADY_COMPRESSED_TYPES or ctype.startswith(_ALREADY_COMPRESSED_PREFIXES)
+
+    async def _run(self, fn, data: bytes) -> bytes:
+        if len(data) >= self.mw.offload_size:
+            return await anyio.to_thread.run_sync(fn, data)
+        return fn(data)
+
+    def _new_compressor(self) -> _Compressor:
+        return _Compressor(self.encoding, self.mw.gzip_level, self.mw.brotli_quality)
+
+    async def send(self, message: Message) -> None:
+        mtype = message["type"]
+        if mtype == "http.response.start":
+            self._start = message
+            self._passthrough = self._should_skip(message)
+            if self._passthrough:
+                await self._send(message)
+            return
+
+        if mtype != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self._streaming:
+            assert self._start is not None
+            headers = MutableHeaders(raw=self._start["headers"])
+
+            if not more_body:
+                # 普通 Response：整个 body 一次到
+                if len(body) < self.mw.minimum_size:
+                    await self._send(self._start)
+                    await self._send(message)
+                    return
+                compressed = await self._run(self._new_compressor().oneshot, body)
+                headers["Content-Encoding"] = self.encoding
+                headers["Content-Length"] = str(len(compressed))
+                headers.add_vary_header("Accept-Encoding")
+                await self._send(self._start)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # StreamingResponse：不知道总长度，按 chunk 流式压
+            self._streaming = True
+            self._compressor = self._new_compressor()
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self._send(self._start)
+
+        assert self._compressor is not None
+        out = await self._run(self._compressor.compress, body) if body else b""
+        if not more_body:
+            out += self._compressor.finish()
+        await self._send({"type": "http.response.body", "body": out, "more_body": more_body})
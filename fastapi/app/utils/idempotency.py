@@ -0,0 +1,145 @@
+# app/utils/idempotency.py
+"""
+Idempotency-Key：手机网络不稳会重试同一个 POST，同一个 key 只做一次，重试直接回上次的 response。
+
+    @router.post("/balance/earn")
+    async def earn_coins(req: EarnRequest, request: Request, user=Depends(get_current_user)):
+        return await idempotent(get_db(), request, "balance.earn", user.email, lambda: _earn(req, user))
+
+- `idempotency_keys` collection：{_id: "<scope>:<owner>:<key>", state, fp, status, body, expires_at}
+  expires_at 上有 TTL index（IDEMPOTENCY_TTL_HOURS 之后自动删）
+- 先 insert 一个 pending 占位（_id 唯一 = 抢 key），成功才真的去做；
+  撞 DuplicateKeyError 就按 _id 读一次：done -> 原样回放，pending -> 409（上一个还在跑）
+- 同一个 key 但 body 不一样（fp = sha256(body)）-> 422，不偷偷回放别的结果
+- 做的过程中抛 exception：把 pending 删掉，客户端可以用同一个 key 再试；
+  worker 直接挂掉留下的 pending 超过 PENDING_STALE_SECONDS 也会被放掉
+- 没带 header 的请求照旧（旧版 app）
+
+claim() / release() 给不走 HTTP 的去重用（time-series events 不能建 unique index，见 event_store.py）。
+"""
+from __future__ import annotations
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.response_utils import dumps
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+PENDING_STALE_SECONDS = 120   # pending 这么久还没 done = worker 挂了，放掉让客户端重试
+
+_stats: Dict[str, int] = {"executed": 0, "replayed": 0, "in_progress": 0, "mismatch": 0}
+
+
+def _col(db):
+    return db.idempotency_keys
+
+
+def _expires_at() -> datetime:
+    return datetime.utcnow() + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+
+
+async def ensure_indexes(db) -> None:
+    # _id 本身就是唯一 index；这里只要 TTL
+    await _col(db).create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+
+async def ensure_unique(col, keys, **kwargs) -> bool:
+    """建 unique index；旧数据里已经有重复的话只打 warning（不能让 startup 挂掉），返回有没有建成"""
+    try:
+        await col.create_index(keys, unique=True, **kwargs)
+        return True
+    except (DuplicateKeyError, OperationFailure) as e:
+        if getattr(e, "code", None) != 11000:
+            raise
+        print(f"⚠️  unique index on {col.name} {keys} not created, existing duplicates: {e}")
+        return False
+
+
+# ---------- 给 ingestion 用的去重 ----------
+async def claim(db, key: str) -> bool:
+    """第一次见到 key -> True；重复 -> False（一次 insert，没有先读）"""
+    try:
+        await _col(db).insert_one({"_id": key, "state": "done", "expires_at": _expires_at()})
+        return True
+    except DuplicateKeyError:
+        return False
+
+
+async def release(db, key: str) -> None:
+    await _col(db).delete_one({"_id": key})
+
+
+# ---------- HTTP ----------
+def _replay(doc: dict) -> Response:
+    return Response(
+        content=doc["body"],
+        status_code=doc["status"],
+        media_type=doc.get("media_type") or "application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _serialize(result: Any) -> tuple[int, bytes, str]:
+    if isinstance(result, Response):
+        return result.status_code, bytes(result.body), result.media_type or "application/json"
+    return 200, dumps(result), "application/json"
+
+
+async def idempotent(
+    db,
+    request: Request,
+    scope: str,
+    owner: str,
+    work: Callable[[], Awaitable[Any]],
+) -> Any:
+    key = request.headers.get(HEADER)
+    if not key:
+        return await work()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{HEADER} too long")
+
+    _id = f"{scope}:{owner}:{key}"
+    fp = hashlib.sha256(await request.body()).hexdigest()
+    col = _col(db)
+    try:
+        await col.insert_one({"_id": _id, "state": "pending", "fp": fp,
+                              "claimed_at": datetime.utcnow(), "expires_at": _expires_at()})
+    except DuplicateKeyError:
+        doc = await col.find_one({"_id": _id})
+        if doc is None:  # 刚好过期被删
+            raise HTTPException(status_code=409, detail="Retry the request")
+        if doc.get("fp") != fp:
+            _stats["mismatch"] += 1
+            raise HTTPException(status_code=422, detail=f"{HEADER} was already used with a different request body")
+        if doc.get("state") != "done":
+            _stats["in_progress"] += 1
+            if doc["claimed_at"] < datetime.utcnow() - timedelta(seconds=PENDING_STALE_SECONDS):
+                await col.delete_one({"_id": _id, "state": "pending", "claimed_at": doc["claimed_at"]})
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        _stats["replayed"] += 1
+        return _replay(doc)
+
+    try:
+        result = await work()
+    except BaseException:
+        await col.delete_one({"_id": _id, "state": "pending"})
+        raise
+
+    status, body, media_type = _serialize(result)
+    await col.update_one(
+        {"_id": _id},
+        {"$set": {"state": "done", "status": status, "body": body, "media_type": media_type}},
+    )
+    _stats["executed"] += 1
+    return result
+
+
+metrics.register("idempotency", lambda: dict(_stats))
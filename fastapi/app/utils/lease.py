@@ -0,0 +1,82 @@
+# app/utils/lease.py
+"""
+MongoDB lease：多个 gunicorn worker / 多台机器里，同一个后台 job 同时只让一个跑。
+
+    lease = MongoLease(db, "nightly_rollup")
+    if await lease.acquire():
+        ...                     # 长 job 里定期 await lease.keep_alive()
+        await lease.release()
+
+- `leases` collection，一个 job 一个 document：{_id: name, owner, expires_at}
+- acquire = find_one_and_update(过期了 或者 owner 是自己, upsert=True)：
+  别人还持有时 filter 不中 -> upsert 撞 _id -> DuplicateKeyError = 没抢到
+- 持有者挂掉不用管：expires_at 一过别人自然接手
+"""
+from __future__ import annotations
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.config import settings
+from app.utils import metrics
+
+_LEASES: Dict[str, "MongoLease"] = {}
+
+
+class MongoLease:
+    def __init__(self, db, name: str, ttl_seconds: int | None = None):
+        self.col = db.leases
+        self.name = name
+        self.ttl = ttl_seconds or settings.LEASE_TTL_SECONDS
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.held = False
+        self._renewed = 0.0  # monotonic
+        self.stats = {"acquired": 0, "lost": 0}
+        _LEASES[name] = self
+
+    async def acquire(self) -> bool:
+        """抢 / 续 lease；True = 现在是自己持有"""
+        now = datetime.utcnow()
+        try:
+            await self.col.find_one_and_update(
+                {"_id": self.name, "$or": [{"expires_at": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl), "renewed_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            if self.held:
+                self.stats["lost"] += 1
+            self.held = False
+            return False
+        if not self.held:
+            self.stats["acquired"] += 1
+        self.held = True
+        self._renewed = time.monotonic()
+        return True
+
+    async def keep_alive(self) -> bool:
+        """长 job 里随便调：过了 1/3 TTL 才真的去续，False = lease 已经被别人拿走，应该停"""
+        if self.held and time.monotonic() - self._renewed < self.ttl / 3:
+            return True
+        return await self.acquire()
+
+    async def release(self) -> None:
+        if self.held:
+            await self.col.update_one(
+                {"_id": self.name, "owner": self.owner},
+                {"$set": {"expires_at": datetime.utcnow()}},
+            )
+        self.held = False
+
+    def snapshot(self) -> dict:
+        return {"owner": self.owner, "held": self.held, **self.stats}
+
+
+metrics.register("leases", lambda: {name: l.snapshot() for name, l in _LEASES.items()})
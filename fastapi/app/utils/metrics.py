@@ -0,0 +1,22 @@
+# app/utils/metrics.py
+"""
+超简单的进程内 metrics registry：各模块 register 一个 snapshot 函数，
+GET /metrics 的时候全部调一遍（per worker process）。
+"""
+from typing import Any, Callable, Dict
+
+_PROVIDERS: Dict[str, Callable[[], Any]] = {}
+
+
+def register(name: str, fn: Callable[[], Any]) -> None:
+    _PROVIDERS[name] = fn
+
+
+def snapshot() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for name, fn in sorted(_PROVIDERS.items()):
+        try:
+            out[name] = fn()
+        except Exception as e:  # metrics 不能把请求搞挂
+            out[name] = {"error": str(e)}
+    return out
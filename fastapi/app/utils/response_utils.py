@@ -1,7 +1,20 @@
 # app/utils/response.py
+import json
+from decimal import Decimal
+from enum import Enum
+
+from bson import ObjectId
 from fastapi import status as http
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
 from app.schemas.response import Envelope  # or: from ..schemas.response import Envelope
 
+try:  # optional: 更快的 JSON encoder（没装就退回标准库）
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 def ok(data=None, message: str = "OK", status_code: int = http.HTTP_200_OK):
     return Envelope(status=status_code, message=message, data=data)
 
@@ -13,3 +26,42 @@ def no_content(message: str = "No Content"):
 
 def fail(message: str = "Error", status_code: int = http.HTTP_400_BAD_REQUEST, data=None):
     return Envelope(status=status_code, message=message, data=data)
+
+
+# ---------- Fast path (opt-in) ----------
+# 普通路径：route 回 Envelope -> FastAPI dump -> 再 validate 一次 response_model -> jsonable_encoder -> json.dumps
+# Fast path：直接回 Response，FastAPI 就跳过 response_model 的 validate，只用 orjson 序列化一次。
+# 只给「我们自己组出来的可信数据」用（DB 里读出来的 Task、算好的 metrics）。
+def json_default(obj):
+    """orjson 不认识的类型：Pydantic/Beanie model、ObjectId、set、Decimal"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(by_alias=True)
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        # OPT_UTC_Z：aware UTC datetime 输出 "Z"，和 Pydantic 的 JSON 输出一致
+        return orjson.dumps(content, default=json_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content, custom_encoder={ObjectId: str}),
+        ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """一次序列化到 bytes；content 可以是 dict / list / BaseModel / Beanie Document"""
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def fast_ok(data=None, message: str = "OK", status_code: int = http.HTTP_200_OK) -> FastJSONResponse:
+    return FastJSONResponse({"status": status_code, "message": message, "data": data})
+
+def fast_created(data=None, message: str = "Created") -> FastJSONResponse:
+    return FastJSONResponse({"status": http.HTTP_201_CREATED, "message": message, "data": data})
@@ -0,0 +1,59 @@
+# app/utils/singleflight.py
+"""
+Single-flight：同一个 key 同时只跑一次，其他并发的 caller 直接等同一个结果。
+
+App 一打开会几乎同时打 /wellbeing/risk、/ai/pet/chat、rollup，
+每个都跑一次 compute_stress_score / rollup_daily —— 用这个合并成一次。
+
+    RISK_FLIGHT = SingleFlight("risk")
+    result = await RISK_FLIGHT.do((user_id, day), lambda: _compute(...))
+
+- 计算放在独立的 Task 里：第一个 caller 断线（cancel）不会连累其他 caller
+- 只合并「正在跑」的；跑完就删 key，不做缓存
+"""
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.utils import metrics
+
+T = TypeVar("T")
+
+_FLIGHTS: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        _FLIGHTS[name] = self
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        # shield：某个 caller 被 cancel 时，不要把共享的计算也 cancel 掉
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # 标记已读取，避免所有 caller 都走了时的 "never retrieved" warning
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "deduplicated": self.calls - self.executions,
+            "in_flight": len(self._inflight),
+        }
+
+
+metrics.register("singleflight", lambda: {n: f.snapshot() for n, f in _FLIGHTS.items()})
@@ -0,0 +1,5 @@
+# benchmarks/__init__.py
+# 跑 benchmark 不需要真的 .env / Mongo：给 Settings 一个假的 MONGO_URI
+import os
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
@@ -0,0 +1,56 @@
+# benchmarks/bench_chat.py
+"""Pet chat：fast path lookup、token 估算 + 按预算裁 history（记忆满窗口时的成本）、llm_router 本身的开销"""
+from __future__ import annotations
+from datetime import datetime
+
+from app.config import settings
+from app.logic import chat_memory
+from app.services import llm_router, quick_replies
+
+from .data import SENTENCES
+from .harness import bench
+
+PERSONA = (
+    "You are 'DoDo', a gentle, playful virtual pet companion. "
+    "Speak in short, warm sentences with emojis occasionally. "
+    "Use positive reinforcement, tiny-steps coaching, and never shame. "
+    "User mood: NEGATIVE (p=0.62). Stress score: 58 with signals ['overdue_streak', 'late_night']. "
+    "If stress >=70: suggest micro-break & reschedule. If 40-69: suggest 25-min focus + water. "
+    "Otherwise: celebrate consistency."
+)
+# 窗口满的时候：MAX_TURNS 条原文 + 一段 summary
+FULL_MEMORY = {
+    "summary": chat_memory.truncate_tokens(" ".join(SENTENCES * 4), settings.CHAT_SUMMARY_MAX_TOKENS),
+    "turns": [
+        {"role": "user" if i % 2 == 0 else "pet", "text": SENTENCES[i % len(SENTENCES)], "ts": datetime(2025, 1, 1)}
+        for i in range(settings.CHAT_MEMORY_MAX_TURNS)
+    ],
+}
+TEXT = SENTENCES[0]
+
+
+# SENTENCES 一半是 intent（hi / thanks / done!），一半要走 LLM
+@bench("chat.quick_replies.lookup[mixed]")
+def _():
+    for text in SENTENCES:
+        quick_replies.lookup("bench-user", text, "NEUTRAL", 45)
+
+
+@bench("chat.estimate_tokens")
+def _():
+    chat_memory.estimate_tokens(PERSONA)
+
+
+@bench("chat.build_prompt[full-window]")
+def _():
+    chat_memory.build_prompt(PERSONA, FULL_MEMORY, TEXT)
+
+
+async def _instant() -> str:
+    return "ok"
+
+
+# provider 立刻回：测 breaker + task + wait 这一层自己的成本
+@bench("chat.llm_router.first_answer[instant]")
+async def _():
+    await llm_router.first_answer([("bench", _instant)], fallback=("local", lambda: "ok"))
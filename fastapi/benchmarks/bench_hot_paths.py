@@ -0,0 +1,87 @@
+# benchmarks/bench_hot_paths.py
+"""CPU-side hot paths：summary 统计、heuristic 文案、stress scoring、pet reaction、JWT、VADER、Envelope 序列化"""
+from __future__ import annotations
+from datetime import timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models.models import Task
+from app.routers import ai, ai_insights
+from app.logic.risk_mongo import compute_stress_score, choose_pet_reaction
+from app.logic.user_tz import local_today, zone
+from app.services.auth_service import _make_token, _decode
+from app.services.pet_service_ai import HuggingFaceClient
+from app.schemas.response import Envelope
+from app.utils.response_utils import ok
+
+from .data import SENTENCES, summary_tasks, task_docs
+from .fakes import beanie_mock_db, stress_db
+from .harness import bench
+
+beanie_mock_db()
+
+# ---------- fixed inputs ----------
+SUMMARY_TASKS_AI = [ai.TaskIn(**t) for t in summary_tasks(1000)]
+SUMMARY_TASKS_INSIGHTS = [ai_insights.TaskIn(**t) for t in summary_tasks(1000)]
+METRICS = ai._summary_metrics("bench", SUMMARY_TASKS_AI)
+TASKS_500 = [Task(**d) for d in task_docs(500)]
+SCORES = [i / 10 for i in range(1000)]
+# streak 会补齐缺的日子：canned rollup 必须是「user 本地今天」往回 7 天，不然每次都在测 backfill
+TODAY = local_today(zone(None))
+STRESS_DB = stress_db([(TODAY - timedelta(days=i)).isoformat() for i in range(7)])
+TOKEN = _make_token(user_id="665f1c2e9b1e8a3d4c5b6a79", email="bench@dodo.app", ver=3)
+HF = HuggingFaceClient()
+TASK_LIST_FIELD = create_model_field(name="Response_get_user_tasks", type_=Envelope[List[Task]], mode="serialization")
+
+
+# ---------- cases ----------
+@bench("summary.metrics.ai[1000]")
+def _():
+    ai._summary_metrics("bench", SUMMARY_TASKS_AI)
+
+
+@bench("summary.metrics.ai_insights[1000]")
+def _():
+    ai_insights._summary_metrics("bench", SUMMARY_TASKS_INSIGHTS)
+
+
+@bench("summary.heuristic_summarize")
+def _():
+    ai._heuristic_summarize(METRICS)
+
+
+@bench("risk.compute_stress_score[fake-db]")
+async def _():
+    await compute_stress_score(STRESS_DB, "bench")
+
+
+@bench("risk.choose_pet_reaction[1000]")
+def _():
+    for s in SCORES:
+        choose_pet_reaction(s)
+
+
+@bench("auth.make_token")
+def _():
+    _make_token(user_id="665f1c2e9b1e8a3d4c5b6a79", email="bench@dodo.app", ver=3)
+
+
+@bench("auth.decode")
+def _():
+    _decode(TOKEN)
+
+
+@bench("sentiment.vader[8 sentences]")
+async def _():
+    for s in SENTENCES:
+        await HF.analyze_sentiment(s)
+
+
+@bench("envelope.task_list[500]")
+async def _():
+    # 和 FastAPI 的 response_model 路径一样：dump -> validate -> serialize -> JSON
+    content = await serialize_response(field=TASK_LIST_FIELD, response_content=ok(TASKS_500))
+    JSONResponse(content).body
@@ -0,0 +1,57 @@
+# benchmarks/bench_push.py
+"""WebSocket push：一条消息的 encode 成本 + hub fan-out（fake socket，不走网络）"""
+from __future__ import annotations
+import asyncio
+
+from app.logic.push import PushHub, encode
+
+from .data import task_docs
+from .harness import bench
+
+
+class _FakeSocket:
+    __slots__ = ("sent",)
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_text(self, text: str) -> None:
+        self.sent += len(text)
+
+
+COINS = {"coins": 120, "delta": 10, "reason": "task:00000000-0000-4000-8000-000000000001"}
+TASK = task_docs(1)[0]
+
+# 一个 user 3 台 device；另外 1000 个 user 各 2 台在线
+HUB = PushHub()
+HUB.add(["665f1c2e9b1e8a3d4c5b6a79", "bench@dodo.app"], _FakeSocket())
+HUB.add(["665f1c2e9b1e8a3d4c5b6a79", "bench@dodo.app"], _FakeSocket())
+HUB.add(["665f1c2e9b1e8a3d4c5b6a79", "bench@dodo.app"], _FakeSocket())
+USERS = [f"user{i}@dodo.app" for i in range(1000)]
+for u in USERS:
+    HUB.add([u], _FakeSocket())
+    HUB.add([u], _FakeSocket())
+COINS_TEXT = encode("coins", COINS)
+
+
+@bench("push.encode.coins")
+def _():
+    encode("coins", COINS)
+
+
+@bench("push.encode.task")
+def _():
+    encode("task", {"op": "updated", "task": TASK})
+
+
+@bench("push.fanout.coins[1 user x3 devices]")
+async def _():
+    await HUB.deliver(["665f1c2e9b1e8a3d4c5b6a79", "bench@dodo.app"], COINS_TEXT)
+    await asyncio.sleep(0)   # 让每个 socket 的 writer 把队列发掉（算进成本里）
+
+
+@bench("push.fanout.coins[1000 users x2 devices]")
+async def _():
+    for u in USERS:
+        await HUB.deliver([u], COINS_TEXT)
+    await asyncio.sleep(0)
@@ -0,0 +1,55 @@
+# benchmarks/bench_reminders.py
+"""Reminder engine（纯内存，store=None）：NotificationPrefs -> next fire 的计算、heap schedule、到点 dispatch"""
+from __future__ import annotations
+from datetime import timedelta
+from typing import List
+
+from app.logic.reminders import ReminderEngine, next_fires
+from app.models.models import Task
+
+from .data import BASE_TS, task_docs
+from .fakes import beanie_mock_db
+from .harness import bench
+
+beanie_mock_db()
+
+NOW = BASE_TS - timedelta(days=30)          # 所有 task 都还没开始：每种 reminder 都会排上
+LATER = BASE_TS + timedelta(days=60)
+
+
+def reminder_tasks(n: int) -> List[Task]:
+    tasks = [Task(**d) for d in task_docs(n)]
+    for i, t in enumerate(tasks):
+        if i % 3 == 0:
+            t.notify.dailyHour, t.notify.dailyMinute = 8, 30
+    return tasks
+
+
+TASKS_1000 = reminder_tasks(1000)
+
+
+async def _noop(_r):
+    return None
+
+
+@bench("reminders.next_fires[1000 tasks]")
+def _():
+    for t in TASKS_1000:
+        next_fires(t, NOW)
+
+
+@bench("reminders.schedule[1000 tasks]")
+async def _():
+    engine = ReminderEngine(store=None, sink=_noop)
+    for t in TASKS_1000:
+        await engine.schedule_task(t, NOW)
+
+
+@bench("reminders.schedule+dispatch[1000 tasks]")
+async def _():
+    engine = ReminderEngine(store=None, sink=_noop)
+    for t in TASKS_1000:
+        await engine.schedule_task(t, NOW)
+    # daily 的发完会排下一天：只 dispatch 一轮，量的是 pop + fire + 重排
+    while await engine.dispatch_due(LATER, limit=10_000) and engine.stats["fired"] < 5000:
+        pass
@@ -0,0 +1,98 @@
+# benchmarks/bench_responses.py
+"""Envelope 序列化：标准 response_model 路径 vs FastJSONResponse；以及 task-list / summary 两条 route 端到端"""
+from __future__ import annotations
+import asyncio
+import os
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.testclient import TestClient
+from fastapi.utils import create_model_field
+
+from app.main import app
+from app.models.models import Task
+from app.routers import ai
+from app.schemas.response import Envelope
+from app.utils.response_utils import FastJSONResponse, fast_ok, ok
+
+from .data import summary_tasks, task_docs
+from .fakes import beanie_mock_db
+from .harness import bench
+
+# app.main / pet_service_ai 会 load_dotenv(override=True)；bench 不能真的去打 Groq
+os.environ["GROQ_API_KEY"] = ""
+
+beanie_mock_db()
+# 同一个 user 一直打 /ai/summary：bench 量的是吞吐，不要被 per-user rate limit 挡成 429
+ai.SUMMARY_GATE.user_rate = 0
+
+TASKS_500 = [Task(**d) for d in task_docs(500)]
+SUMMARY_OUT = ai.SummaryOut(
+    summary="bench",
+    metrics=ai._summary_metrics("bench", [ai.TaskIn(**t) for t in summary_tasks(1000)]),
+)
+TASK_LIST_FIELD = create_model_field(name="Response_get_user_tasks", type_=List[Task], mode="serialization")
+SUMMARY_FIELD = create_model_field(name="Response_summarize_tasks", type_=Envelope[ai.SummaryOut], mode="serialization")
+
+
+async def _seed_tasks():
+    await Task.find(Task.user_email == "bench@dodo.app").delete()
+    await Task.insert_many([Task(**d) for d in task_docs(500)])
+
+asyncio.run(_seed_tasks())
+
+CLIENT = TestClient(app)  # 不用 `with`：不跑 startup（不连真 Mongo）
+SUMMARY_BODY = {"user_id": "bench", "tasks": [
+    {k: (v.isoformat() if hasattr(v, "isoformat") else v) for k, v in t.items()} for t in summary_tasks(1000)
+]}
+
+
+# ---------- serialization only ----------
+@bench("envelope.task_list[500].standard")
+async def _():
+    content = await serialize_response(field=TASK_LIST_FIELD, response_content=TASKS_500)
+    JSONResponse(content).body
+
+
+@bench("envelope.task_list[500].fast")
+def _():
+    FastJSONResponse(TASKS_500).body
+
+
+@bench("envelope.summary[1000].standard")
+async def _():
+    content = await serialize_response(field=SUMMARY_FIELD, response_content=ok(SUMMARY_OUT))
+    JSONResponse(content).body
+
+
+@bench("envelope.summary[1000].fast")
+def _():
+    fast_ok(SUMMARY_OUT).body
+
+
+# ---------- end-to-end (TestClient + mongomock) ----------
+@bench("route.get_user_tasks[500]")
+def _():
+    r = CLIENT.get("/tasks/bench@dodo.app")
+    assert r.status_code == 200
+
+
+# 列表页只要 title / status / 截止时间：projection 推到 Mongo，不过 Pydantic
+@bench("route.get_user_tasks[500,fields=title,status,dueDateTime]")
+def _():
+    r = CLIENT.get("/tasks/bench@dodo.app?fields=title,status,dueDateTime")
+    assert r.status_code == 200
+
+
+# 月视图：index range + 分天 / bucket，只回窗口里的小字段（对比上面拉整个 list）
+@bench("route.get_tasks_agenda[500,6 weeks]")
+def _():
+    r = CLIENT.get("/tasks/agenda?user_email=bench@dodo.app&from=2024-05-13&to=2024-06-23")
+    assert r.status_code == 200
+
+
+@bench("route.ai_summary[1000]")
+def _():
+    r = CLIENT.post("/ai/summary", json=SUMMARY_BODY)
+    assert r.status_code == 200
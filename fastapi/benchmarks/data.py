@@ -0,0 +1,74 @@
+# benchmarks/data.py
+"""固定 seed 的合成数据，保证每次跑的输入完全一样"""
+from __future__ import annotations
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+SEED = 20240601
+BASE_TS = datetime(2024, 6, 1, 9, 0, 0)
+
+CATEGORIES = ["Study", "Work", "Health", "Chores", "Social", "Hobby", None]
+STATUSES = ["notStarted", "inProgress", "completed", "late", "archived"]
+PRIORITIES = ["low", "medium", "high", "urgent"]
+
+SENTENCES = [
+    "I finished my assignment early today, feeling great!",
+    "ugh so tired, nothing is going right",
+    "thanks dodo",
+    "I have three exams next week and I haven't started revising",
+    "hi",
+    "I'm a bit anxious about the presentation but I think it will be ok",
+    "done!",
+    "I really hate how much work there is, I can't sleep",
+]
+
+
+def summary_tasks(n: int) -> List[Dict[str, Any]]:
+    """/ai/summary 的 TaskIn 形状"""
+    rnd = random.Random(SEED)
+    out = []
+    for i in range(n):
+        due = BASE_TS + timedelta(days=rnd.randint(-20, 20), minutes=rnd.randint(0, 600))
+        status = rnd.choice(STATUSES)
+        out.append({
+            "id": f"t{i}",
+            "title": f"Task {i}",
+            "category": rnd.choice(CATEGORIES),
+            "status": status,
+            "type": "singleDay",
+            "dueDateTime": due,
+            "priority": rnd.choice(PRIORITIES),
+            "completedAt": (due + timedelta(minutes=rnd.randint(-600, 600))) if status == "completed" else None,
+        })
+    return out
+
+
+def task_docs(n: int, user_email: str = "bench@dodo.app") -> List[Dict[str, Any]]:
+    """Task Document 的完整形状（subtasks / focusPrefs / notify 都带上）"""
+    rnd = random.Random(SEED + 1)
+    out = []
+    for i in range(n):
+        due = BASE_TS + timedelta(days=rnd.randint(-20, 20))
+        out.append({
+            "flutter_id": f"00000000-0000-4000-8000-{i:012d}",
+            "user_email": user_email,
+            "title": f"Task {i}: revise chapter {rnd.randint(1, 12)}",
+            "description": "Read notes, do practice questions, summarise key points." * rnd.randint(0, 2),
+            "type": rnd.choice(["singleDay", "ranged"]),
+            "dueDateTime": due,
+            "startDate": due - timedelta(days=rnd.randint(0, 5)),
+            "dueDate": due,
+            "category": rnd.choice(CATEGORIES),
+            "tags": rnd.sample(["exam", "group", "urgent", "reading", "lab", "gym"], k=rnd.randint(0, 3)),
+            "status": rnd.choice(STATUSES[:4]),
+            "subtasks": [
+                {"id": f"s{i}-{j}", "title": f"Step {j}", "estimatedMinutes": 25, "focusMinutesSpent": rnd.randint(0, 50)}
+                for j in range(rnd.randint(0, 5))
+            ],
+            "priority": rnd.choice(PRIORITIES),
+            "estimatedMinutes": rnd.choice([None, 30, 60, 90]),
+            "createdAt": BASE_TS,
+            "updatedAt": BASE_TS,
+        })
+    return out
@@ -0,0 +1,119 @@
+# benchmarks/event_storage.py
+"""
+events：standard collection vs time-series collection（需要真的 MongoDB ≥ 6.3）
+
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.event_storage --users 200 --days 30
+
+- 两种 layout 各写入同一份合成数据（每个 user 每天 ~40 条 event）
+- 报告 storageSize / totalIndexSize（collStats）
+- 计时 rollup 用到的 range query：单日 count_documents、单日 late-night aggregate、7 天 range
+用独立的 database（dodotask_bench），跑完会 drop。
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+
+from app.config import settings
+from app.logic import event_store
+
+TYPES = ["app_open", "focus_start", "focus_tick", "break_start", "break_end", "hydrate", "task_complete", "overdue"]
+START = datetime(2024, 5, 1)
+
+
+def _events(users: int, days: int, per_day: int):
+    rnd = random.Random(42)
+    for u in range(users):
+        for d in range(days):
+            day = START + timedelta(days=d)
+            for i in range(per_day):
+                yield {
+                    "event_id": f"{u}-{d}-{i}",
+                    "user_id": f"user{u}",
+                    "type": rnd.choice(TYPES),
+                    "ts": day + timedelta(seconds=rnd.randint(0, 86399)),
+                    "context": {"minutes": rnd.randint(1, 50)} if rnd.random() < 0.2 else {},
+                }
+
+
+async def _timed(fn, repeat: int = 30) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - t0) * 1e3)
+    return round(statistics.median(samples), 3)
+
+
+async def _queries(col, user: str) -> dict:
+    day = START + timedelta(days=10)
+    one = {"$gte": day, "$lt": day + timedelta(days=1)}
+    week = {"$gte": day, "$lt": day + timedelta(days=7)}
+    q = event_store.q_events
+    return {
+        "count_type_1day_ms": await _timed(lambda: col.count_documents(q({"user_id": user, "type": "hydrate", "ts": one}))),
+        "late_night_1day_ms": await _timed(lambda: col.aggregate([
+            {"$match": q({"user_id": user, "ts": one})},
+            {"$project": {"hour": {"$hour": "$ts"}}},
+            {"$match": {"hour": {"$lte": 5}}}, {"$count": "n"}]).to_list(1)),
+        "group_by_type_7days_ms": await _timed(lambda: col.aggregate([
+            {"$match": q({"user_id": user, "ts": week})},
+            {"$group": {"_id": "$" + event_store.field("events", "type"), "n": {"$sum": 1}}}]).to_list(None)),
+    }
+
+
+async def main(argv=None) -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--per-day", type=int, default=40)
+    ap.add_argument("--batch", type=int, default=5000)
+    args = ap.parse_args(argv)
+
+    client = AsyncIOMotorClient(os.getenv("MONGO_URI") or settings.MONGO_URI)
+    db = client["dodotask_bench"]
+    await client.drop_database("dodotask_bench")
+    report = {"users": args.users, "days": args.days, "per_day": args.per_day}
+
+    for layout in ("standard", "timeseries"):
+        settings.EVENTS_STORAGE = layout
+        await event_store.ensure_collections(db)
+        col = event_store.events(db)
+        t0 = time.perf_counter()
+        batch = []
+        for doc in _events(args.users, args.days, args.per_day):
+            batch.append(event_store.to_timeseries("events", doc) if layout == "timeseries" else doc)
+            if len(batch) >= args.batch:
+                await col.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await col.insert_many(batch, ordered=False)
+        load_s = time.perf_counter() - t0
+
+        stats = await db.command("collStats", col.name)
+        report[layout] = {
+            "load_seconds": round(load_s, 2),
+            "storage_size_mb": round(stats.get("storageSize", 0) / 2**20, 2),
+            "index_size_mb": round(stats.get("totalIndexSize", 0) / 2**20, 2),
+            **await _queries(col, "user7"),
+        }
+        print(layout, json.dumps(report[layout], indent=2))
+
+    await client.drop_database("dodotask_bench")
+    path = Path(__file__).resolve().parent / "results" / "event_storage.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    print(f"Results -> {path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
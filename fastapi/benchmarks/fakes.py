@@ -0,0 +1,130 @@
+# benchmarks/fakes.py
+"""
+Canned Mongo fakes：只返回固定结果，不做真正的查询。
+这样计时只包含我们自己的 Python 代码（scoring / 序列化），不受网络或 mongomock 影响。
+"""
+from __future__ import annotations
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+from bson import ObjectId
+
+
+class _Result:
+    def __init__(self, **kw: Any):
+        self.__dict__.update(kw)
+
+
+class FakeCursor:
+    def __init__(self, rows: Iterable[Dict[str, Any]]):
+        self._rows = [dict(r) for r in rows]
+
+    def sort(self, *a, **k) -> "FakeCursor":
+        return self
+
+    def limit(self, *a, **k) -> "FakeCursor":
+        return self
+
+    def skip(self, *a, **k) -> "FakeCursor":
+        return self
+
+    def batch_size(self, *a, **k) -> "FakeCursor":
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._rows if length is None else self._rows[:length]
+
+    def __aiter__(self):
+        self._it = iter(self._rows)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """
+    rows     -> find() / find_one() 的结果
+    agg_rows -> aggregate() 的结果（同一 collection 的所有 pipeline 共用）
+    count    -> count_documents() 的结果
+    """
+    def __init__(self, rows=(), agg_rows=(), count: int = 0):
+        self.rows = list(rows)
+        self.agg_rows = list(agg_rows)
+        self.count = count
+        self.writes = 0
+
+    def find(self, *a, **k) -> FakeCursor:
+        return FakeCursor(self.rows)
+
+    async def find_one(self, *a, **k):
+        return dict(self.rows[0]) if self.rows else None
+
+    def aggregate(self, pipeline, **k) -> FakeCursor:
+        return FakeCursor(self.agg_rows)
+
+    async def count_documents(self, *a, **k) -> int:
+        return self.count
+
+    async def insert_one(self, doc, **k):
+        self.writes += 1
+        return _Result(inserted_id=ObjectId())
+
+    async def update_one(self, *a, **k):
+        self.writes += 1
+        return _Result(matched_count=1, modified_count=1, upserted_id=None)
+
+    async def bulk_write(self, ops, **k):
+        self.writes += len(ops)
+        return _Result(matched_count=len(ops), modified_count=len(ops), upserted_count=0)
+
+
+class FakeDB:
+    """db.<name> / db[<name>] 都返回同一个 FakeCollection（没配置的就是空的）"""
+    def __init__(self, **collections: FakeCollection):
+        self._cols: Dict[str, FakeCollection] = dict(collections)
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self._cols.setdefault(name, FakeCollection())
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+def stress_db(day_iso_list: List[str]) -> FakeDB:
+    """compute_stress_score 用的固定数据：一周 rollup + 今天的若干信号"""
+    return FakeDB(
+        tasks=FakeCollection(agg_rows=[{"_id": None, "count": 3, "avg_prio": 2.0}]),
+        focus_sessions=FakeCollection(agg_rows=[{"_id": None, "m": 95}]),
+        events=FakeCollection(agg_rows=[{"_id": None, "mins": 330, "n": 2}], count=2),
+        mood_logs=FakeCollection(count=3),
+        usage_stats_daily=FakeCollection(
+            rows=[{"user_id": "bench", "date": d, "overdue_count": 1 if i < 3 else 0}
+                  for i, d in enumerate(day_iso_list)]
+        ),
+    )
+
+
+_MOCK_DB = None
+
+
+def beanie_mock_db():
+    """
+    Task / User 是 Beanie Document，构造前必须 init_beanie。
+    这里用 mongomock（真正能查的 fake）代替 Mongo，只初始化一次。
+    """
+    global _MOCK_DB
+    if _MOCK_DB is None:
+        from beanie import init_beanie
+        from mongomock_motor import AsyncMongoMockClient
+        from app.models.models import Task
+        from app.models.user import User
+
+        db = AsyncMongoMockClient()["bench"]
+        asyncio.run(init_beanie(database=db, document_models=[User, Task]))
+        _MOCK_DB = db
+    return _MOCK_DB
@@ -0,0 +1,122 @@
+# benchmarks/harness.py
+"""
+极简 micro-benchmark 框架：
+- @bench("name") 注册一个 case（sync 或 async 都可以）
+- run() 自动校准每轮次数，跑多轮，取 per-op 的 median / min（微秒）
+- 结果写 JSON，并可以和 baseline.json 对比
+"""
+from __future__ import annotations
+import asyncio
+import inspect
+import json
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+_CASES: Dict[str, Callable[[], Any]] = {}
+
+
+def bench(name: str):
+    def deco(fn: Callable[[], Any]):
+        _CASES[name] = fn
+        return fn
+    return deco
+
+
+def cases() -> Dict[str, Callable[[], Any]]:
+    return dict(_CASES)
+
+
+async def _time_async(fn, number: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(number):
+        await fn()
+    return time.perf_counter() - t0
+
+
+def _time_sync(fn, number: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - t0
+
+
+def measure(fn: Callable[[], Any], *, rounds: int = 5, min_round_s: float = 0.05,
+            loop: Optional[asyncio.AbstractEventLoop] = None) -> Dict[str, Any]:
+    is_async = inspect.iscoroutinefunction(fn)
+
+    def timed(n: int) -> float:
+        if is_async:
+            return loop.run_until_complete(_time_async(fn, n))
+        return _time_sync(fn, n)
+
+    timed(1)  # warm-up（import / cache / JIT-ish 的东西）
+
+    # 校准：每轮至少 min_round_s 秒
+    number = 1
+    while True:
+        took = timed(number)
+        if took >= min_round_s or number >= 1_000_000:
+            break
+        number *= 2 if took <= 0 else max(2, int(min_round_s / took) + 1)
+
+    per_op = [timed(number) / number * 1e6 for _ in range(rounds)]
+    return {
+        "number": number,
+        "rounds": rounds,
+        "median_us": round(statistics.median(per_op), 3),
+        "min_us": round(min(per_op), 3),
+    }
+
+
+def run(only: Optional[List[str]] = None, rounds: int = 5, min_round_s: float = 0.05) -> Dict[str, Any]:
+    loop = asyncio.new_event_loop()
+    results: Dict[str, Any] = {}
+    try:
+        for name, fn in sorted(_CASES.items()):
+            if only and not any(o in name for o in only):
+                continue
+            results[name] = measure(fn, rounds=rounds, min_round_s=min_round_s, loop=loop)
+            print(f"  {name:<40} median {results[name]['median_us']:>12.3f} us")
+    finally:
+        # case 里开的背景 task（比如 push 的 socket writer）先 cancel 掉，跟 asyncio.run 一样
+        pending = asyncio.all_tasks(loop)
+        if pending:
+            for t in pending:
+                t.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "ts": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+
+def save(report: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, sort_keys=True))
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """返回变慢超过 threshold（比例，比如 0.25 = 25%）的 case 描述"""
+    regressions = []
+    base = baseline.get("results", {})
+    for name, r in report["results"].items():
+        b = base.get(name)
+        if not b:
+            print(f"  {name:<40} (new, no baseline)")
+            continue
+        ratio = r["median_us"] / b["median_us"] if b["median_us"] else 1.0
+        flag = "SLOWER" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "ok")
+        print(f"  {name:<40} {b['median_us']:>12.3f} -> {r['median_us']:>12.3f} us  x{ratio:.2f}  {flag}")
+        if flag == "SLOWER":
+            regressions.append(f"{name}: x{ratio:.2f}")
+    return regressions
@@ -0,0 +1,144 @@
+# benchmarks/image_memory.py
+"""
+Image-caption upload：每个请求的 peak RSS
+
+    python -m benchmarks.image_memory
+
+每种 mode 在独立子进程里跑，处理请求前重置 peak RSS（Linux /proc/self/clear_refs），
+报告 warm-up 之后「再处理一个请求」让 peak RSS 比请求前涨了多少，以及 Python heap 的 peak（tracemalloc）。
+RSS 会被 warm-up 释放掉、可以复用的内存抵消一部分；Pillow 的 bitmap 不在 tracemalloc 里。两个一起看：
+- read_all      ：旧写法，await file.read() 整个读进来
+- naive_decode  ：整个读进来 + 全分辨率 decode 再缩图
+- pipeline      ：app.services.image_pipeline.caption_upload（chunk 读 + draft decode + 缩图）
+输入是合成的 4032x3024 JPEG（手机原图大小）。需要 Pillow。
+"""
+from __future__ import annotations
+import asyncio
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+MODES = ["read_all", "naive_decode", "pipeline"]
+W, H = 4032, 3024
+
+
+def _make_jpeg() -> bytes:
+    """带噪点的渐变图，JPEG 大小接近真实手机照片（几 MB）"""
+    from PIL import Image
+    noise = Image.effect_noise((W, H), 40)
+    grad = Image.linear_gradient("L").resize((W, H))
+    img = Image.merge("RGB", (noise, grad, Image.blend(noise, grad, 0.5)))
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=92)
+    return out.getvalue()
+
+
+def _upload(data: bytes):
+    from starlette.datastructures import Headers, UploadFile
+    f = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)  # 和 starlette multipart 一样：>1MB 落盘
+    f.write(data)
+    f.seek(0)
+    return UploadFile(f, size=len(data), filename="photo.jpg", headers=Headers({"content-type": "image/jpeg"}))
+
+
+class _FakeHF:
+    async def caption_image(self, image_bytes: bytes, content_type: str = "image/jpeg") -> str:
+        return f"a photo ({len(image_bytes)} bytes)"
+
+
+def _status_kb(field: str) -> int:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1])
+    raise KeyError(field)
+
+
+def _reset_peak() -> int:
+    """Linux：写 5 到 clear_refs 会把 VmHWM（peak RSS）重置成当前 RSS；返回当前 RSS（KB）"""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return _status_kb("VmRSS")
+    except OSError:  # 非 Linux：只能用 ru_maxrss（会被之前的 peak 盖住，数字偏小）
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _peak_kb() -> int:
+    try:
+        return _status_kb("VmHWM")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def _run(mode: str, data: bytes) -> int:
+    # 先跑一次 warm-up（thread pool、malloc arena、libjpeg buffer 这些一次性开销不算进「每个请求」）；
+    # 末尾多一个 byte：JPEG decoder 会忽略，但 sha256 不一样，不会命中 caption cache
+    await _handle(mode, _upload(data + b"\0"))
+
+    upload = _upload(data)
+    del data
+    tracemalloc.start()
+    before = _reset_peak()
+    await _handle(mode, upload)
+    rss = _peak_kb() - before
+    _, py_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rss, py_peak // 1024
+
+
+async def _handle(mode: str, upload) -> None:
+    from PIL import Image
+    from app.services.image_pipeline import caption_upload
+
+    if mode == "read_all":
+        raw = await upload.read()
+        await _FakeHF().caption_image(raw)
+    elif mode == "naive_decode":
+        raw = await upload.read()
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+        img.thumbnail((384, 384))
+        out = io.BytesIO()
+        img.save(out, format="JPEG")
+        await _FakeHF().caption_image(out.getvalue())
+    else:
+        await caption_upload(upload, _FakeHF())
+
+
+def _child(mode: str, path: str) -> None:
+    import benchmarks  # noqa: F401  (MONGO_URI 默认值)
+    data = Path(path).read_bytes()  # 图在父进程生成，子进程的 peak RSS 里不会有生成图的开销
+    rss, py_peak = asyncio.run(_run(mode, data))
+    print(json.dumps({"mode": mode, "upload_bytes": len(data), "peak_rss_delta_kb": rss, "python_heap_peak_kb": py_peak}))
+
+
+def main() -> None:
+    rows = []
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as tmp:
+        tmp.write(_make_jpeg())
+        tmp.flush()
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.image_memory", "--child", mode, tmp.name],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            rows.append(json.loads(out))
+    print(f"upload: {W}x{H} JPEG, {rows[0]['upload_bytes'] / 1024:.0f} KB")
+    for r in rows:
+        print(f"  {r['mode']:<13} peak RSS +{r['peak_rss_delta_kb'] / 1024:8.1f} MB"
+              f"   python heap peak {r['python_heap_peak_kb'] / 1024:8.1f} MB")
+    path = Path(__file__).resolve().parent / "results" / "image_memory.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(rows, indent=2))
+    print(f"Results -> {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3])
+    else:
+        main()
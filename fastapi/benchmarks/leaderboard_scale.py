@@ -0,0 +1,130 @@
+# benchmarks/leaderboard_scale.py
+"""
+排行榜撑不撑得住一百万 user：RankIndex（Fenwick）vs 每个 request scan + sort。
+
+    cd fastapi
+    python -m benchmarks.leaderboard_scale --users 1000000
+
+- build：从 {coins: 人数} 建 index 的时间 + 内存（tracemalloc）
+- move / rank：coins 变化 & 「我的名次」每次多少 µs
+- naive：每个 request 扫一遍所有 user 算名次 / 排序拿 top-K（没有 index 的时候 route 要做的事）
+结果同时写到 benchmarks/results/leaderboard_scale.json
+"""
+from __future__ import annotations
+import argparse
+import heapq
+import json
+import random
+import time
+import tracemalloc
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+from app.logic.leaderboard import RankIndex
+
+from .data import SEED
+from .harness import bench
+
+
+def synthetic_coins(n: int) -> List[int]:
+    """长尾：大部分人几十到几百 coins，少数几万以上"""
+    rnd = random.Random(SEED + 50)
+    return [min(int(rnd.paretovariate(1.3) * 20) - 20, 2_000_000) for _ in range(n)]
+
+
+def _per_op_us(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    fn(n)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Leaderboard rank index at scale")
+    ap.add_argument("--users", type=int, default=1_000_000)
+    ap.add_argument("--ops", type=int, default=100_000)
+    args = ap.parse_args(argv)
+
+    coins = synthetic_coins(args.users)
+    counts = Counter(coins)
+
+    tracemalloc.start()
+    probe = RankIndex.from_counts(counts)
+    mem, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del probe
+
+    t0 = time.perf_counter()
+    idx = RankIndex.from_counts(counts)
+    build_s = time.perf_counter() - t0
+    print(f"build    : {idx.total:,} users, {idx.size:,} slots in {build_s * 1000:.0f} ms, {mem / 1024 / 1024:.1f} MiB")
+
+    rnd = random.Random(SEED)
+    who = [rnd.randrange(args.users) for _ in range(args.ops)]
+    deltas = [rnd.choice([10, -10, 5, 25, -30]) for _ in range(args.ops)]
+
+    def moves(n):
+        for i in range(n):
+            u = who[i]
+            old = coins[u]
+            coins[u] = old + deltas[i]
+            idx.move(old, coins[u])
+
+    def ranks(n):
+        for i in range(n):
+            idx.rank(coins[who[i]])
+
+    move_us = _per_op_us(moves, args.ops)
+    rank_us = _per_op_us(ranks, args.ops)
+    print(f"move     : {move_us:.2f} µs/op   rank: {rank_us:.2f} µs/op")
+
+    # 对一下 brute force（抽几个）
+    for u in who[:5]:
+        c = coins[u]
+        assert idx.rank(c) == 1 + sum(1 for x in coins if max(x, 0) > max(c, 0))
+
+    naive_n = 5
+    naive_rank_ms = _per_op_us(lambda n: [1 + sum(1 for x in coins if x > coins[who[i]]) for i in range(n)], naive_n) / 1000
+    naive_top_ms = _per_op_us(lambda n: [heapq.nlargest(100, coins) for _ in range(n)], naive_n) / 1000
+    naive_sort_ms = _per_op_us(lambda n: [sorted(coins, reverse=True)[:100] for _ in range(n)], naive_n) / 1000
+    print(f"naive    : my rank {naive_rank_ms:.0f} ms/request, top-100 {naive_top_ms:.0f} ms (heap) / {naive_sort_ms:.0f} ms (sort)")
+    print(f"speedup  : my rank x{naive_rank_ms * 1000 / rank_us:,.0f}")
+
+    report = {
+        "users": idx.total,
+        "slots": idx.size,
+        "build_ms": round(build_s * 1000, 1),
+        "memory_mib": round(mem / 1024 / 1024, 1),
+        "move_us": round(move_us, 2),
+        "rank_us": round(rank_us, 2),
+        "naive_rank_ms": round(naive_rank_ms, 1),
+        "naive_top100_heap_ms": round(naive_top_ms, 1),
+        "naive_top100_sort_ms": round(naive_sort_ms, 1),
+    }
+    out_path = Path(__file__).resolve().parent / "results" / "leaderboard_scale.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2))
+    print(f"\nResults -> {out_path}")
+
+
+# run.py 里的 regression case：10 万 user 的 index（一百万的 build 太久，不放进每次都跑的 suite）
+_COINS = array("q", synthetic_coins(100_000))
+_INDEX = RankIndex.from_counts(Counter(_COINS))
+_rnd = random.Random(SEED)
+
+
+@bench("leaderboard.rank_index.rank[100k users]")
+def _():
+    _INDEX.rank(_COINS[_rnd.randrange(100_000)])
+
+
+@bench("leaderboard.rank_index.move[100k users]")
+def _():
+    c = _COINS[_rnd.randrange(100_000)]
+    _INDEX.move(c, c + 10)
+    _INDEX.move(c + 10, c)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# benchmarks/reminder_scale.py
+"""
+一个 node 放几十万条 pending reminder 撑不撑得住：内存（tracemalloc）+ schedule / dispatch 吞吐。
+
+    cd fastapi
+    python -m benchmarks.reminder_scale --tasks 50000     # 约 20 万条 reminder
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from app.logic.reminders import ReminderEngine
+
+from .bench_reminders import LATER, NOW, reminder_tasks
+
+
+async def _noop(_r):
+    return None
+
+
+async def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Reminder engine scale check (in-memory)")
+    ap.add_argument("--tasks", type=int, default=50_000)
+    args = ap.parse_args(argv)
+
+    tasks = reminder_tasks(args.tasks)
+
+    # 内存单独量一遍（tracemalloc 开着会把时间拖慢好几倍）
+    tracemalloc.start()
+    probe = ReminderEngine(store=None, sink=_noop)
+    for t in tasks:
+        await probe.schedule_task(t, NOW)
+    mem, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del probe
+
+    engine = ReminderEngine(store=None, sink=_noop)
+    t0 = time.perf_counter()
+    for t in tasks:
+        await engine.schedule_task(t, NOW)
+    took = time.perf_counter() - t0
+    n = engine.snapshot()["pending_in_memory"]
+    print(f"schedule : {n} reminders from {args.tasks} tasks in {took:.2f}s "
+          f"({n / took:,.0f}/s), {mem / 1024 / 1024:.1f} MiB ({mem / max(n, 1):.0f} B/reminder)")
+
+    t0 = time.perf_counter()
+    fired = 0
+    while fired < n:
+        done = await engine.dispatch_due(LATER, limit=10_000)
+        if not done:
+            break
+        fired += done
+    took = time.perf_counter() - t0
+    print(f"dispatch : {fired} reminders in {took:.2f}s ({fired / took:,.0f}/s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
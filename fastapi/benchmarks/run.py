@@ -0,0 +1,62 @@
+# benchmarks/run.py
+"""
+用法（在 fastapi/ 目录下）：
+    python -m benchmarks.run                   # 跑全部，结果写 benchmarks/results/latest.json，并和 baseline 对比
+    python -m benchmarks.run --only auth risk  # 只跑名字包含 auth / risk 的 case
+    python -m benchmarks.run --save-baseline   # 把这次结果存成 benchmarks/baseline.json（配合 --only 时只更新那几个 case）
+"""
+from __future__ import annotations
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from . import harness
+from . import bench_chat, bench_hot_paths, bench_push, bench_reminders, bench_responses, leaderboard_scale, slow_link, task_patch  # noqa: F401  (注册 cases)
+
+HERE = Path(__file__).resolve().parent
+BASELINE = HERE / "baseline.json"
+LATEST = HERE / "results" / "latest.json"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="DoDoTask micro-benchmarks")
+    ap.add_argument("--only", nargs="*", help="substring filter on case names")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--min-round", type=float, default=0.05, help="seconds per round (auto-calibrated)")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (0.25 = 25%%)")
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--out", type=Path, default=LATEST)
+    args = ap.parse_args(argv)
+
+    print("Running benchmarks ...")
+    report = harness.run(only=args.only, rounds=args.rounds, min_round_s=args.min_round)
+    harness.save(report, args.out)
+    print(f"Results -> {args.out}")
+
+    if args.save_baseline:
+        if args.only and BASELINE.exists():
+            # 只跑了一部分：合并进旧 baseline，不要把别的 case 冲掉
+            merged = json.loads(BASELINE.read_text())
+            merged["results"].update(report["results"])
+            merged["meta"] = report["meta"]
+            report = merged
+        harness.save(report, BASELINE)
+        print(f"Baseline saved -> {BASELINE}")
+        return 0
+
+    if not BASELINE.exists():
+        print("No baseline.json yet (run with --save-baseline).")
+        return 0
+
+    print(f"Compare with {BASELINE.name} (threshold {args.threshold:.0%}):")
+    regressions = harness.compare(report, json.loads(BASELINE.read_text()), args.threshold)
+    if regressions:
+        print("❌ Regressions:\n  " + "\n  ".join(regressions))
+        return 1
+    print("✅ No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
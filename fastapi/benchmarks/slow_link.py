@@ -0,0 +1,81 @@
+# benchmarks/slow_link.py
+"""
+CompressionMiddleware：带宽 / 延迟估算（模拟慢速手机网络）
+
+    python -m benchmarks.slow_link
+
+每个 payload × 每种 encoding：
+- 压缩后大小、压缩耗时（真的跑一次压缩）
+- 在几种 link 上的下载时间 = RTT + 压缩耗时 + size / bandwidth
+结果同时写到 benchmarks/results/slow_link.json
+"""
+from __future__ import annotations
+import json
+import time
+from pathlib import Path
+
+from app.utils.compression import _Compressor, brotli
+from app.utils.response_utils import dumps, fast_ok
+
+from .bench_responses import SUMMARY_OUT, TASKS_500
+from .harness import bench
+
+# (name, bandwidth bits/s, RTT seconds)
+LINKS = [
+    ("3G (1.6 Mbps, 300ms)", 1.6e6, 0.300),
+    ("slow 4G (5 Mbps, 150ms)", 5e6, 0.150),
+    ("4G (20 Mbps, 60ms)", 20e6, 0.060),
+]
+ENCODINGS = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+PAYLOADS = {
+    "GET /tasks (500 tasks)": dumps(TASKS_500),
+    "POST /ai/summary (1000 tasks)": fast_ok(SUMMARY_OUT).body,
+}
+
+
+def _compress(encoding: str, body: bytes):
+    if encoding == "identity":
+        return body, 0.0
+    t0 = time.perf_counter()
+    out = _Compressor(encoding, gzip_level=6, brotli_quality=5).oneshot(body)
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    report = []
+    for pname, body in PAYLOADS.items():
+        print(f"\n{pname}")
+        print(f"  {'encoding':<9} {'bytes':>9} {'ratio':>6} {'cpu ms':>7}   " + "   ".join(f"{l[0]:>24}" for l in LINKS))
+        for enc in ENCODINGS:
+            out, cpu = _compress(enc, body)
+            times = [rtt + cpu + len(out) * 8 / bw for _, bw, rtt in LINKS]
+            print(f"  {enc:<9} {len(out):>9} {len(body) / len(out):>6.1f} {cpu * 1e3:>7.2f}   "
+                  + "   ".join(f"{t * 1e3:>21.0f} ms" for t in times))
+            report.append({
+                "payload": pname, "encoding": enc, "bytes": len(out), "raw_bytes": len(body),
+                "compress_ms": round(cpu * 1e3, 3),
+                "transfer_ms": {l[0]: round(t * 1e3, 1) for l, t in zip(LINKS, times)},
+            })
+    out_path = Path(__file__).resolve().parent / "results" / "slow_link.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2))
+    print(f"\nResults -> {out_path}")
+
+
+# 压缩 CPU 也进 micro-benchmark（防止有人把 level 调太高）
+_TASKS_BODY = PAYLOADS["GET /tasks (500 tasks)"]
+
+
+@bench("compress.gzip.task_list[500]")
+def _():
+    _Compressor("gzip", 6, 5).oneshot(_TASKS_BODY)
+
+
+if brotli is not None:
+    @bench("compress.br.task_list[500]")
+    def _():
+        _Compressor("br", 6, 5).oneshot(_TASKS_BODY)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/task_patch.py
+"""
+PUT（整个 Task）vs PATCH（merge patch / subtask op）：payload + 写放大
+
+    python -m benchmarks.task_patch
+
+每个场景（一个带 5 个 subtask 的 task）：
+- request body：app 要上传多少 bytes
+- update spec：送给 Mongo 的 update document 多大（BSON），$set / $unset / $inc 了几个 path
+  （PUT 是 $set 整份 model_dump：每个字段都重写一次，oplog / replication 也跟着大）
+结果同时写到 benchmarks/results/task_patch.json
+"""
+from __future__ import annotations
+import json
+from pathlib import Path
+
+import bson
+
+from app.logic.task_patch import merge_patch, subtask_inc_focus, subtask_set, to_mongo
+from app.models.models import Task
+from app.utils.response_utils import dumps
+
+from .data import task_docs
+from .fakes import beanie_mock_db
+from .harness import bench
+
+beanie_mock_db()
+
+# 挑一个有 5 个 subtask 的
+_DOC = next(d for d in task_docs(50) if len(d["subtasks"]) == 5)
+TASK = Task(**_DOC)
+SUB_ID = TASK.subtasks[2].id
+
+
+def _put(mutate) -> Task:
+    t = TASK.model_copy(deep=True)
+    mutate(t)
+    return t
+
+
+def _tick(t: Task) -> None:
+    t.subtasks[2].status = "completed"
+
+
+def _focus(t: Task) -> None:
+    t.subtasks[2].focusMinutesSpent += 25
+
+
+def _complete(t: Task) -> None:
+    t.status = "completed"
+
+
+def _notify(t: Task) -> None:
+    t.notify.remindOnDue = False
+
+
+# (场景, PUT 的改法, PATCH 的 (url, body), PATCH 的 update spec)
+SCENARIOS = [
+    ("tick one subtask", _tick,
+     (f"/tasks/{{id}}/subtasks/{SUB_ID}", {"status": "completed"}), lambda: subtask_set({"status": "completed"})),
+    ("+25 focus minutes on a subtask", _focus,
+     (f"/tasks/{{id}}/subtasks/{SUB_ID}/focus", {"minutes": 25}), lambda: subtask_inc_focus(25)),
+    ("complete the task", _complete,
+     ("/tasks/{id}", {"status": "completed"}), lambda: merge_patch({"status": "completed"})[0]),
+    ("turn off due reminder", _notify,
+     ("/tasks/{id}", {"notify": {"remindOnDue": False}}), lambda: merge_patch({"notify": {"remindOnDue": False}})[0]),
+]
+
+
+def _paths(update: dict) -> int:
+    return sum(len(v) for k, v in update.items() if k.startswith("$"))
+
+
+def main() -> None:
+    report = []
+    print(f"{'scenario':<32} {'PUT body':>9} {'PATCH body':>11} {'PUT spec':>9} {'PATCH spec':>11} {'PUT paths':>10} {'PATCH paths':>12}")
+    for name, mutate, (_, patch_body), spec in SCENARIOS:
+        t = _put(mutate)
+        put_body = len(dumps(t))
+        put_update = {"$set": t.model_dump(exclude={"id"})}
+        put_spec = len(bson.encode(to_mongo(put_update)))
+        patch_update = spec()
+        patch_spec = len(bson.encode(patch_update))
+        patch_len = len(dumps(patch_body))
+        print(f"{name:<32} {put_body:>9} {patch_len:>11} {put_spec:>9} {patch_spec:>11} "
+              f"{_paths(put_update):>10} {_paths(patch_update):>12}")
+        report.append({
+            "scenario": name,
+            "request_bytes": {"put": put_body, "patch": patch_len},
+            "update_spec_bytes": {"put": put_spec, "patch": patch_spec},
+            "paths_written": {"put": _paths(put_update), "patch": _paths(patch_update)},
+        })
+    out_path = Path(__file__).resolve().parent / "results" / "task_patch.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(report, indent=2))
+    print(f"\nResults -> {out_path}")
+
+
+# 服务端那一侧的 CPU：PUT 要 validate 整个 Task + model_dump；PATCH 只 validate 送来的字段
+_PUT_JSON = dumps(_put(_complete))
+
+
+@bench("task.update_spec.put[full Task]")
+def _():
+    {"$set": Task.model_validate_json(_PUT_JSON).model_dump(exclude={"id"})}
+
+
+@bench("task.update_spec.patch[status+notify]")
+def _():
+    merge_patch({"status": "completed", "notify": {"remindOnDue": False}})
+
+
+if __name__ == "__main__":
+    main()
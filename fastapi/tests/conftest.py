@@ -0,0 +1,4 @@
+import os
+
+# app.config 的 Settings 要 MONGO_URI；test 自己用 MONGO_TEST_URI 连库，这里只是让 import 过
+os.environ.setdefault("MONGO_URI", "mongodb://unused")
@@ -0,0 +1,64 @@
+# tests/test_task_query_indexes.py
+"""
+GET /tasks/query 的每一种 filter 组合（x 每种 sort）和 GET /tasks/agenda 都不能 COLLSCAN。
+
+    cd fastapi
+    MONGO_TEST_URI=mongodb://localhost:27017 python -m pytest -q
+
+- 要真的 Mongo（mongomock 没有 query planner）；连不上就整个 module skip
+- 故意不用 MONGO_URI：每次在一个临时 database 里建 index、跑 explain，跑完 drop 掉
+"""
+import asyncio
+import os
+import uuid
+from datetime import date
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from app.logic import task_query
+from app.logic.agenda import agenda_match
+from app.logic.task_query import build_query, filter_combinations
+from app.tools.explain_task_queries import summarize
+
+MONGO_TEST_URI = os.environ.get("MONGO_TEST_URI", "mongodb://localhost:27017")
+USER = "explain@example.com"
+AGENDA = "agenda month"
+
+
+async def _explain_all():
+    """{组合名: summarize(explain)}；连不上 Mongo 返回 None"""
+    client = AsyncIOMotorClient(MONGO_TEST_URI, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        return None
+    db = client[f"test_task_query_{uuid.uuid4().hex[:8]}"]
+    try:
+        await task_query.ensure_indexes(db)
+        out = {}
+        for name, kwargs in filter_combinations():
+            flt, order = build_query(USER, **kwargs)
+            out[name] = summarize(await db.tasks.find(flt).sort(order).limit(51).explain())
+        out[AGENDA] = summarize(await db.tasks.find(agenda_match(USER, date(2025, 1, 1), date(2025, 1, 31))).explain())
+        return out
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+@pytest.fixture(scope="module")
+def plans():
+    out = asyncio.run(_explain_all())
+    if out is None:
+        pytest.skip(f"no MongoDB reachable at {MONGO_TEST_URI}")
+    return out
+
+
+@pytest.mark.parametrize("name", [name for name, _ in filter_combinations()] + [AGENDA])
+def test_uses_index(plans, name):
+    s = plans[name]
+    assert not s["collscan"], f"{name}: {' > '.join(s['stages'])}"
+    assert s["indexes"], f"{name}: no index in the winning plan"